@@ -0,0 +1,136 @@
+"""
+Benchmark ask_many() vs pętla ask(): przepustowość (zapytania/min) przy symulowanych opóźnieniach LLM
+i embeddingów (fałszywe chainy, bez API i bez indeksu) + liczba wywołań embeddingu i wyszukiwań.
+
+Użycie:
+  python benchmarks/bench_ask_many.py
+  python benchmarks/bench_ask_many.py --queries 40 --llm-ms 150 --concurrency 8
+"""
+
+import argparse
+import asyncio
+import io
+import os
+import sys
+import time
+from contextlib import redirect_stdout
+from unittest.mock import AsyncMock, MagicMock, patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENROUTER_API_KEY", "bench")
+
+from langchain_core.documents import Document
+
+import workflow
+
+TOPICS = ["volumes", "ports", "networks", "compose", "images", "logs", "env vars", "healthcheck"]
+
+
+def _make_queries(n: int) -> list[str]:
+    """Zapytania z powtórzeniami (jak w jobie FAQ) – co czwarte to duplikat wcześniejszego."""
+    queries = [f"How do I configure {TOPICS[i % len(TOPICS)]} for service {i}?" for i in range(n)]
+    return [queries[i - 3] if i % 4 == 3 else q for i, q in enumerate(queries)]
+
+
+def _expansion(query: str) -> str:
+    """Sub-queries częściowo wspólne między zapytaniami o ten sam temat."""
+    topic = next(t for t in TOPICS if t in query)
+    return f"docker {topic}\ndocker {topic} example\n{query}"
+
+
+class _Counters:
+    def __init__(self):
+        self.embed_calls = 0
+        self.embedded_texts = 0
+        self.searches = 0
+
+
+def _patches(llm_s: float, embed_s: float, counters: _Counters):
+    def chain(content_fn):
+        async def ainvoke(inputs):
+            await asyncio.sleep(llm_s)
+            return MagicMock(content=content_fn(inputs))
+
+        def invoke(inputs):
+            time.sleep(llm_s)
+            return MagicMock(content=content_fn(inputs))
+
+        c = MagicMock()
+        c.ainvoke = AsyncMock(side_effect=ainvoke)
+        c.invoke = MagicMock(side_effect=invoke)
+        return c
+
+    def embed_sync(queries, stats=None):
+        time.sleep(embed_s)
+        counters.embed_calls += 1
+        counters.embedded_texts += len(queries)
+        if stats is not None:
+            stats.update({"hits": 0, "misses": len(queries), "api_calls": 1})
+        return [[1.0, float(len(q))] for q in queries]
+
+    async def embed_async(queries, stats=None):
+        await asyncio.sleep(embed_s)
+        counters.embed_calls += 1
+        counters.embedded_texts += len(queries)
+        if stats is not None:
+            stats.update({"hits": 0, "misses": len(queries), "api_calls": 1})
+        return [[1.0, float(len(q))] for q in queries]
+
+    def search(vector, k):
+        counters.searches += 1
+        return [(Document(page_content=f"chunk {vector[1]}", metadata={"title": "Docker"}), 0.2)]
+
+    return [
+        patch("workflow.SEMANTIC_CACHE_ENABLED", False),
+        patch("workflow._graph", None),
+        patch("workflow._async_graph", None),
+        patch("workflow._pre_retrieval_chain", side_effect=lambda: chain(lambda i: _expansion(i["query"]))),
+        patch("workflow._check_and_refine_chain", side_effect=lambda: chain(lambda i: "SCORE: 0.90\nREFINED: same")),
+        patch("workflow._generate_chain", side_effect=lambda: chain(lambda i: f"answer: {i['query']}")),
+        patch("workflow.embed_queries", side_effect=embed_sync),
+        patch("workflow.aembed_queries", side_effect=embed_async),
+        patch("workflow.search_by_vector_with_scores", side_effect=search),
+        patch("workflow.lexical_search_with_scores", return_value=[]),
+        patch("workflow.get_chunk_embeddings", return_value={}),
+    ]
+
+
+def _run(label: str, fn, queries: list[str], args) -> None:
+    counters = _Counters()
+    patches = _patches(args.llm_ms / 1000, args.embed_ms / 1000, counters)
+    for p in patches:
+        p.start()
+    try:
+        start = time.perf_counter()
+        with redirect_stdout(io.StringIO()):  # logi [DEBUG ...] z węzłów grafu
+            fn(queries)
+        elapsed = time.perf_counter() - start
+    finally:
+        for p in reversed(patches):
+            p.stop()
+    print(
+        f"  {label:<28} {elapsed:7.2f} s  {len(queries) / elapsed * 60:8.0f} zapytań/min  "
+        f"embed: {counters.embed_calls:3d} wywołań / {counters.embedded_texts:3d} tekstów  "
+        f"wyszukiwania dense: {counters.searches}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=24)
+    parser.add_argument("--llm-ms", type=float, default=100.0, help="Symulowane opóźnienie jednego wywołania LLM")
+    parser.add_argument("--embed-ms", type=float, default=30.0, help="Symulowane opóźnienie jednego batcha embeddingów")
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    queries = _make_queries(args.queries)
+    print(
+        f"{len(queries)} zapytań ({len(set(queries))} unikalnych), LLM {args.llm_ms:.0f} ms, "
+        f"embedding {args.embed_ms:.0f} ms, max_concurrency={args.concurrency}"
+    )
+    _run("pętla ask()", lambda qs: [workflow.ask(q) for q in qs], queries, args)
+    _run("ask_many()", lambda qs: workflow.ask_many(qs, max_concurrency=args.concurrency), queries, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmark sklejania sąsiednich chunków (chunk_stitching.py): tokeny kontekstu i liczba bloków przed
+i po sklejeniu (z dobieraniem brakującego środkowego chunka i bez).
+
+Korpus syntetyczny: strony dzielone jak w build_index (chunk 400 / nakładka 100 tokenów – tu po znakach,
+~4 znaki/token, bez pobierania kodowania tiktoken). Wybór retrieval symulowany: na zapytanie 2 strony
+z 2–3 kolejnymi chunkami (środkowy pominięty z prawdopodobieństwem --gap) i 2 chunki z innych stron.
+Tokeny liczone enkoderem context_builder bez limitu budżetu. Bez API.
+
+Użycie:
+  python benchmarks/bench_chunk_stitching.py
+  python benchmarks/bench_chunk_stitching.py --queries 200 --gap 0.5
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from chunk_stitching import stitch_adjacent
+from context_builder import build_context, get_encoder
+
+WORDS = (
+    "container image volume network bridge overlay compose service build cache layer registry daemon "
+    "engine socket port publish mount bind secret config healthcheck restart policy label context"
+).split()
+
+
+def _pages(count: int, rng: np.random.Generator) -> list[list[Document]]:
+    splitter = RecursiveCharacterTextSplitter(chunk_size=1600, chunk_overlap=400)
+    pages = []
+    for p in range(count):
+        text = "\n\n".join(
+            " ".join(" ".join(rng.choice(WORDS, rng.integers(8, 16))).capitalize() + "." for _ in range(4)) for _ in range(12)
+        )
+        chunks = [
+            Document(id=f"p{p}-{i}", page_content=t, metadata={"title": f"page {p}", "source_id": f"p{p}", "chunk_index": i})
+            for i, t in enumerate(splitter.split_text(text))
+        ]
+        for d, following in zip(chunks, chunks[1:]):
+            d.metadata["next_chunk_id"] = following.id
+        pages.append(chunks)
+    return pages
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--gap", type=float, default=0.3, help="Prawdopodobieństwo braku środkowego chunka serii")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    pages = _pages(50, rng)
+    by_id = {d.id: d for chunks in pages for d in chunks}
+    fetch = lambda ids: [by_id[i] for i in ids if i in by_id]  # noqa: E731
+    encoder = get_encoder()
+
+    totals = {"przed": [0, 0], "sklejone": [0, 0], "sklejone + środkowe": [0, 0]}
+    elapsed = 0.0
+    for _ in range(args.queries):
+        picked = []
+        for p in rng.choice(len(pages), 4, replace=False)[:2]:
+            chunks = pages[p]
+            start = int(rng.integers(0, len(chunks) - 2))
+            run = chunks[start : start + int(rng.integers(2, 4))]
+            if len(run) == 3 and rng.random() < args.gap:
+                run = [run[0], run[2]]
+            picked += run
+        for p in rng.choice(len(pages), 2, replace=False):
+            picked.append(pages[p][int(rng.integers(0, len(pages[p])))])
+        picked = [picked[i] for i in rng.permutation(len(picked))]  # kolejność rankingu
+        for label, docs in (
+            ("przed", picked),
+            ("sklejone", stitch_adjacent(picked)[0]),
+            ("sklejone + środkowe", stitch_adjacent(picked, fetch)[0]),
+        ):
+            _, stats = build_context(docs, 10**9, encoder)
+            totals[label][0] += stats["tokens"]
+            totals[label][1] += stats["chunks"]
+        start = time.perf_counter()
+        stitch_adjacent(picked, fetch)
+        elapsed += time.perf_counter() - start
+
+    print(f"{args.queries} zapytań, luka w serii z p={args.gap}, enkoder: {type(encoder).__name__}")
+    print(f"{'wariant':<20} {'tokeny / zapytanie':>19} {'bloki / zapytanie':>18}")
+    base = totals["przed"][0]
+    for label, (tokens, blocks) in totals.items():
+        change = f" ({tokens / base - 1:+.0%})" if label != "przed" else ""
+        print(f"{label:<20} {tokens / args.queries:>12,.0f}{change:>7} {blocks / args.queries:>18.1f}")
+    print(f"czas sklejania: {elapsed / args.queries * 1000:.3f} ms / zapytanie")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Benchmark kompresji kontekstu (context_compression.py) na pytaniach eval_dataset.EXAMPLES:
+redukcja tokenów kontekstu (context_builder, ten sam budżet co post_retrieval) vs zachowanie
+oczekiwanych słów kluczowych (expected_keywords obecne w kontekście przed kompresją i nadal po niej).
+
+Chunki kontekstu: top-8 z indeksu BM25 (LEXICAL_INDEX_DIR, gdy zbudowany – prawdziwe chunki dokumentacji,
+IDF z indeksu jako wagi) albo syntetyczne strony dokumentacji: front-matter, nawigacja, akapity
+niezwiązane z pytaniem, akapit z expected_answer i blok kodu; do tego strony innych pytań jako szum.
+Bez API.
+
+Użycie:
+  python benchmarks/bench_context_compression.py
+  python benchmarks/bench_context_compression.py --synthetic --budget 1500
+"""
+
+import argparse
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.documents import Document
+
+from config import CONTEXT_TOKEN_BUDGET, LEXICAL_INDEX_DIR
+from context_builder import build_context, get_encoder
+from context_compression import compress_documents, query_terms
+from eval_dataset import EXAMPLES
+from lexical_index import LexicalIndex
+
+FILLER = [
+    "Docker Desktop is available for Mac, Windows and Linux. Sign in with your Docker ID to get started.",
+    "This page describes features that may change in future releases. Give feedback on GitHub.",
+    "Docker Engine supports multiple storage drivers. The overlay2 driver is the default on most Linux distributions.",
+    "Docker Scout analyzes image contents and generates a report of packages and vulnerabilities.",
+    "To report a bug, open an issue in the repository and include the output of docker version and docker info.",
+    "Build cache is shared between builds on the same builder. Use cache mounts to speed up package installs.",
+    "Swarm mode is an advanced feature for managing a cluster of Docker daemons.",
+    "Registry mirrors reduce network traffic when many hosts pull the same images.",
+]
+NAVIGATION = "Home / Manuals / Docker Engine\nTable of contents\nEdit this page\nRequest changes"
+
+
+def _command(answer: str) -> str:
+    match = re.search(r"docker [a-z]+(?: [a-z]+)?(?: -{1,2}[a-z]+)?(?: [\w:.]+)?", answer)
+    return match.group() if match else "docker --help"
+
+
+def _synthetic_page(i: int, example: dict) -> str:
+    title = example["query"].rstrip("?")
+    return (
+        f"---\ntitle: {title}\ndescription: {title}\nkeywords: docker, docs\n---\n\n{NAVIGATION}\n\n"
+        f"{FILLER[i % len(FILLER)]} {FILLER[(i + 3) % len(FILLER)]}\n\n"
+        f"{example['expected_answer']} See the reference for all options.\n\n"
+        f"```console\n$ {_command(example['expected_answer'])}\n```\n\n"
+        f"{FILLER[(i + 5) % len(FILLER)]} {FILLER[(i + 6) % len(FILLER)]}"
+    )
+
+
+def _synthetic_contexts() -> list[list[Document]]:
+    pages = [Document(page_content=_synthetic_page(i, e), metadata={"title": e["query"]}) for i, e in enumerate(EXAMPLES)]
+    return [[pages[i]] + [p for j, p in enumerate(pages) if j != i][:5] for i in range(len(EXAMPLES))]
+
+
+def _present(keywords: list[str], text: str) -> set[str]:
+    text = text.lower()
+    return {k for k in keywords if k.lower() in text}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--budget", type=int, default=CONTEXT_TOKEN_BUDGET)
+    parser.add_argument("--synthetic", action="store_true", help="Syntetyczne strony zamiast indeksu BM25")
+    args = parser.parse_args()
+
+    index = None if args.synthetic else LexicalIndex.load(LEXICAL_INDEX_DIR)
+    if index is not None:
+        contexts = [[d for d, _ in index.search(e["query"], k=8)] for e in EXAMPLES]
+        source = f"indeks BM25 ({LEXICAL_INDEX_DIR}), top-8"
+    else:
+        contexts = _synthetic_contexts()
+        source = "syntetyczne strony dokumentacji (brak indeksu BM25 albo --synthetic)"
+    encoder = get_encoder()
+    print(f"{len(EXAMPLES)} pytań, chunki: {source}, budżet {args.budget} tokenów, enkoder: {type(encoder).__name__}")
+    print(f"{'min_score':>9} {'tokeny przed':>13} {'tokeny po':>10} {'redukcja':>9} {'słowa kluczowe':>15}")
+
+    for ratio in (0.3, 0.5, 0.7, 1.0):
+        before = after = found_before = found_after = 0
+        for example, docs in zip(EXAMPLES, contexts):
+            context, stats = build_context(docs, args.budget, encoder)
+            weights = None
+            if index is not None:
+                weights = {t: float(index.idf[index.vocab[t]]) for t in query_terms([example["query"]]) if t in index.vocab}
+            compressed, _ = compress_documents(docs, [example["query"]], weights, ratio)
+            compressed_context, compressed_stats = build_context([d for d in compressed if d.page_content], args.budget, encoder)
+            present = _present(example["expected_keywords"], context)
+            before += stats["tokens"]
+            after += compressed_stats["tokens"]
+            found_before += len(present)
+            found_after += len(present & _present(example["expected_keywords"], compressed_context))
+        retained = found_after / found_before if found_before else 1.0
+        print(f"{ratio:>9.1f} {before:>13,} {after:>10,} {1 - after / before:>8.0%} {retained:>14.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Benchmark _df_to_docs (build_index.py): operacje na kolumnach vs poprzednia pętla df.iterrows()
+na syntetycznej ramce (domyślnie 100k wierszy, jak duży zrzut dokumentacji).
+
+Użycie:
+  python benchmarks/bench_df_to_docs.py
+  python benchmarks/bench_df_to_docs.py --rows 200000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+from langchain_core.documents import Document
+
+from build_index import _chroma_safe_metadata_value, _df_to_docs
+
+
+def _df_to_docs_iterrows(df: pd.DataFrame):
+    """Poprzednia implementacja (referencja)."""
+    docs = []
+    for _, row in df.iterrows():
+        content = row.get("content", "")
+        if not content or (isinstance(content, str) and not content.strip()):
+            content = f"{row.get('title', '')}\n\n{row.get('description', '')}".strip() or "(brak treści)"
+        metadata = {
+            "file_path": _chroma_safe_metadata_value(row.get("file_path", "")),
+            "title": _chroma_safe_metadata_value(row.get("title", "")),
+        }
+        for key in ("tags", "keywords", "aliases"):
+            if key in row and row[key] is not None:
+                metadata[key] = _chroma_safe_metadata_value(row[key])
+        docs.append(Document(page_content=content, metadata=metadata))
+    return docs
+
+
+def _frame(rows: int) -> pd.DataFrame:
+    """Jak parquet z Kaggle: tekst, listy tagów (np.ndarray), co 10. wiersz bez treści."""
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "content": ["" if i % 10 == 0 else f"Docker page {i}: " + "run the container " * 20 for i in range(rows)],
+        "title": [f"Page {i}" for i in range(rows)],
+        "description": [f"Description {i}" for i in range(rows)],
+        "file_path": [f"content/manuals/page_{i}.md" for i in range(rows)],
+        "tags": [np.array(["docker", f"t{j}"]) for j in rng.integers(0, 50, rows)],
+        "keywords": [f"docker, k{i % 7}" for i in range(rows)],
+        "aliases": [np.array([], dtype=object) if i % 3 else np.array([f"/alias/{i}/"]) for i in range(rows)],
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    df = _frame(args.rows)
+    start = time.perf_counter()
+    new = _df_to_docs(df)
+    new_s = time.perf_counter() - start
+    start = time.perf_counter()
+    old = _df_to_docs_iterrows(df)
+    old_s = time.perf_counter() - start
+
+    same = [repr((d.page_content, d.metadata)) for d in new] == [repr((d.page_content, d.metadata)) for d in old]
+    print(f"_df_to_docs: {args.rows:,} wierszy")
+    print(f"  kolumnowo:       {new_s:7.2f} s")
+    print(f"  df.iterrows():   {old_s:7.2f} s")
+    print(f"  przyspieszenie:  {old_s / new_s:7.1f}×")
+    print(f"  identyczny wynik: {same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark magazynu embeddingów (embedding_store.py) w embed_and_upsert: pełna przebudowa do nowej
+kolekcji (np. REBUILD_INDEX=1 albo eksperyment z innymi metadanymi) bez magazynu, z pustym
+magazynem i z magazynem po poprzednim buildzie, w którym zmieniło się --changed % chunków.
+Opóźnienie API symulowane (bez sieci). Wektory trafiają do InMemoryVectorStore (--chroma: Chroma
+w pamięci); czas zapisu do magazynu wektorów mierzony osobno i odjęty – kolumna "embedding" to sam
+etap embeddingu (API + odczyt/zapis magazynu embeddingów), którego dotyczy porównanie.
+
+Użycie:
+  python benchmarks/bench_embedding_store.py
+  python benchmarks/bench_embedding_store.py --chunks 10000 --changed 5 --latency-ms 1000
+  python benchmarks/bench_embedding_store.py --chroma
+"""
+
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import chromadb
+from langchain_core.documents import Document
+
+from bench_index_embedding import _SlowEmbedding
+from build_index import embed_and_upsert
+from embedding_store import EmbeddingStore
+from vector_store import ChromaVectorStore, InMemoryVectorStore, VectorStore
+
+
+def _time_upserts(vector_store: VectorStore) -> dict:
+    """Podmienia upsert instancji na wersję sumującą czas zapisu; zwraca licznik {"seconds"}."""
+    timer = {"seconds": 0.0}
+    upsert = vector_store.upsert
+
+    def timed(docs, embeddings):
+        start = time.perf_counter()
+        upsert(docs, embeddings)
+        timer["seconds"] += time.perf_counter() - start
+
+    vector_store.upsert = timed
+    return timer
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=4000)
+    parser.add_argument("--changed", type=float, default=5.0, help="Procent chunków ze zmienioną treścią między buildami")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--latency-ms", type=float, default=1000.0, help="Symulowany czas jednego żądania embeddingu")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--chroma", action="store_true", help="Zapis do Chroma w pamięci zamiast InMemoryVectorStore")
+    args = parser.parse_args()
+
+    def docs(version: int) -> list[Document]:
+        every = max(1, round(100 / args.changed)) if args.changed else 0
+        return [
+            Document(
+                page_content=f"chunk {i} v{version if every and i % every == 0 else 0} " + "docker " * 60,
+                metadata={"n": i},
+                id=f"id{i}",
+            )
+            for i in range(args.chunks)
+        ]
+
+    embedding = _SlowEmbedding(args.dim, args.latency_ms / 1000)
+    client = chromadb.EphemeralClient() if args.chroma else None
+
+    def open_store(name: str) -> VectorStore:
+        return ChromaVectorStore.open(collection_name=name, client=client) if args.chroma else InMemoryVectorStore()
+
+    print(
+        f"{args.chunks:,} chunków, zmienione {args.changed:g}%, opóźnienie API {args.latency_ms:.0f} ms, dim {args.dim}, "
+        f"magazyn wektorów: {'Chroma' if args.chroma else 'w pamięci'}"
+    )
+    print(f"  {'':<30} {'embedding':>9} {'zapis':>7} {'razem':>7}")
+    with tempfile.TemporaryDirectory() as tmp:
+        store = EmbeddingStore(os.path.join(tmp, "store.sqlite"), "bench")
+        with redirect_stdout(io.StringIO()):
+            warmup = open_store("bench_store_warmup")
+            embed_and_upsert(warmup, embedding, docs(0), embedding_store=store)
+        cases = [
+            ("bez magazynu", docs(1), None),
+            ("pusty magazyn", docs(1), EmbeddingStore(os.path.join(tmp, "empty.sqlite"), "bench")),
+            ("magazyn z poprzedniego buildu", docs(1), store),
+        ]
+        for n, (label, version_docs, case_store) in enumerate(cases):
+            vector_store = open_store(f"bench_store_{n}")
+            write = _time_upserts(vector_store)
+            with redirect_stdout(io.StringIO()):  # pasek postępu
+                stats = embed_and_upsert(
+                    vector_store, embedding, version_docs, batch_size=args.batch_size, embedding_store=case_store
+                )
+            print(
+                f"  {label:<30} {stats['seconds'] - write['seconds']:7.2f} s {write['seconds']:5.2f} s "
+                f"{stats['seconds']:5.2f} s  {stats['api_calls']:4} wywołań API  {stats['reused']:6,} wektorów z magazynu"
+            )
+            if args.chroma:
+                client.delete_collection(vector_store.collection.name)
+        print(f"  rozmiar magazynu: {os.path.getsize(store.path) / 2**20:.1f} MB ({len(store):,} wektorów)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Benchmark embed_and_upsert (build_index.py): przepustowość (chunki/s) przy różnej liczbie
+równoległych żądań embeddingu. Opóźnienie API symulowane (bez sieci), Chroma w pamięci.
+
+Użycie:
+  python benchmarks/bench_index_embedding.py
+  python benchmarks/bench_index_embedding.py --chunks 5000 --batch-size 256 --latency-ms 300
+"""
+
+import argparse
+import io
+import os
+import sys
+import time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import chromadb
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from build_index import embed_and_upsert
+from vector_store import ChromaVectorStore
+
+
+class _SlowEmbedding(Embeddings):
+    """Losowe wektory ze stałym opóźnieniem na żądanie (jak round-trip do API)."""
+
+    def __init__(self, dim: int, latency_s: float):
+        self.dim = dim
+        self.latency_s = latency_s
+
+    def embed_documents(self, texts):
+        time.sleep(self.latency_s)
+        return np.random.default_rng(len(texts)).standard_normal((len(texts), self.dim), dtype=np.float32).tolist()
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--latency-ms", type=float, default=1000.0, help="Symulowany czas jednego żądania embeddingu (~256 chunków × 400 tokenów)")
+    parser.add_argument("--dim", type=int, default=256)
+    args = parser.parse_args()
+
+    docs = [Document(page_content=f"chunk {i}", metadata={"n": i}, id=f"id{i}") for i in range(args.chunks)]
+    embedding = _SlowEmbedding(args.dim, args.latency_ms / 1000)
+    client = chromadb.EphemeralClient()
+    print(f"{args.chunks:,} chunków, batch {args.batch_size}, opóźnienie API {args.latency_ms:.0f} ms")
+    for concurrency in (1, 2, 4, 8):
+        vector_store = ChromaVectorStore.open(collection_name=f"bench_concurrency_{concurrency}", client=client)
+        with redirect_stdout(io.StringIO()):  # pasek postępu
+            stats = embed_and_upsert(vector_store, embedding, docs, batch_size=args.batch_size, concurrency=concurrency)
+        print(
+            f"  concurrency={concurrency}:  {stats['seconds']:6.2f} s  "
+            f"{stats['embedded'] / stats['seconds']:8.0f} chunków/s  ({stats['api_calls']} wywołań API)"
+        )
+        client.delete_collection(vector_store.collection.name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Benchmark indeksu BM25: czas budowy, czas wczytania z dysku i latencja zapytań (bez API).
+
+Użycie:
+  python benchmarks/bench_lexical_index.py
+  python benchmarks/bench_lexical_index.py --chunks 100000
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.documents import Document
+
+from lexical_index import LexicalIndex
+
+WORDS = (
+    "docker container image volume network compose build run expose port mount bind prune swarm "
+    "service registry tag push pull layer cache buildx context daemon engine desktop logs exec"
+).split()
+FLAGS = ["--network", "-p", "-d", "--rm", "--mount", "-v", "EXPOSE", "ENTRYPOINT", "CMD"]
+QUERIES = ["docker run --network host", "EXPOSE port", "docker image prune", "bind mount volume", "compose build cache"]
+
+
+def _synthetic_docs(n: int, words_per_chunk: int = 300) -> list[Document]:
+    rng = random.Random(0)
+    vocab = WORDS + FLAGS + [f"term{i}" for i in range(20_000)]
+    return [
+        Document(page_content=" ".join(rng.choices(vocab, k=words_per_chunk)), metadata={"title": f"Doc {i}"})
+        for i in range(n)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=30_000, help="Liczba syntetycznych chunków")
+    parser.add_argument("--repeat", type=int, default=50, help="Powtórzeń każdego zapytania")
+    args = parser.parse_args()
+
+    docs = _synthetic_docs(args.chunks)
+    start = time.perf_counter()
+    index = LexicalIndex.build(docs)
+    build_s = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index.save(tmp)
+        start = time.perf_counter()
+        loaded = LexicalIndex.load(tmp)
+        load_ms = (time.perf_counter() - start) * 1000
+
+        timings = []
+        for query in QUERIES:
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                loaded.search(query, k=6)
+            timings.append((time.perf_counter() - start) / args.repeat * 1000)
+
+    print(f"BM25 nad {args.chunks:,} chunkami:")
+    print(f"  build (tokenizacja + postingi): {build_s:8.2f} s")
+    print(f"  load z dysku:                   {load_ms:8.2f} ms")
+    for query, ms in zip(QUERIES, timings):
+        print(f"  search {query!r:32} {ms:8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Benchmark pre-filtra metadanych (metadata_index.py): opóźnienie wyszukiwania dense bez filtra,
+z filtrem `where` (pełny skan metadanych / filtr Chroma) i z kandydatami z odwróconego indeksu
+(VectorStore.search(ids=...)) – dla Chroma, indeksu NumPy (int8) i magazynu w pamięci.
+
+Każdy chunk ma 1–2 tagi z --tags (tag tematu + losowy), filtr to jeden tag (~2/tags korpusu).
+Dwa zestawy zapytań: z tematu filtra (typowe – filtr pasuje do pytania) i losowe (najbliższe chunki
+zwykle spoza filtra – Chroma wraca wtedy do filtra `ids` w zapytaniu). Osobno mały filtr
+(≤ CHROMA_EXACT_CANDIDATES kandydatów – dystanse w procesie). Czas filtrowanych zapytań obejmuje
+rozwiązanie filtra w indeksie metadanych. Embeddingi syntetyczne, bez API.
+
+Użycie:
+  python benchmarks/bench_metadata_filter.py
+  python benchmarks/bench_metadata_filter.py --chunks 50000 --dim 1536 --tags 40 --queries 100
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from langchain_core.documents import Document
+
+from build_index import export_vector_index
+from metadata_index import MetadataIndex
+from vector_index import VectorIndex
+from vector_store import CHROMA_EXACT_CANDIDATES, ChromaVectorStore, InMemoryVectorStore, NumpyVectorStore
+
+
+def _corpus(chunks: int, dim: int, tags: int) -> tuple[list[Document], np.ndarray]:
+    rng = np.random.default_rng(0)
+    topics = rng.integers(0, tags, chunks)
+    centers = rng.standard_normal((tags, dim)).astype(np.float32)
+    vectors = centers[topics] + 1.5 * rng.standard_normal((chunks, dim)).astype(np.float32)
+    extra = rng.integers(0, tags, chunks)
+    docs = [
+        Document(
+            id=f"id{i}",
+            page_content=f"chunk {i}",
+            metadata={
+                "tags": json.dumps(sorted({f"tag{topics[i]}", f"tag{extra[i]}"} | ({"rare"} if i % 500 == 0 else set()))),
+                "topic": f"tag{topics[i]}",
+            },
+        )
+        for i in range(chunks)
+    ]
+    return docs, vectors
+
+
+def _p50(fn, queries: np.ndarray) -> float:
+    fn(queries[0].tolist())  # rozgrzewka
+    latencies = []
+    for vector in queries:
+        vector = vector.tolist()
+        start = time.perf_counter()
+        fn(vector)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return float(np.percentile(latencies, 50))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--tags", type=int, default=40)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=6)
+    args = parser.parse_args()
+
+    docs, vectors = _corpus(args.chunks, args.dim, args.tags)
+    rng = np.random.default_rng(1)
+    topic_rows = np.array([i for i, d in enumerate(docs) if d.metadata["topic"] == "tag3"])
+    query_sets = {
+        "z tematu filtra": vectors[rng.choice(topic_rows, args.queries)],
+        "losowe": vectors[rng.integers(0, args.chunks, args.queries)],
+    }
+    metadata_index = MetadataIndex.build(docs)
+    filters = {"tags": ["tag3"]}
+    rows = metadata_index.rows(filters)
+    rare = metadata_index.rows({"tags": ["rare"]})
+    print(
+        f"{args.chunks:,} chunków × {args.dim} wymiarów, {args.tags} tagów, filtr {filters} → "
+        f"{len(rows):,} kandydatów ({len(rows) / args.chunks:.1%}), mały filtr {{'tags': ['rare']}} → {len(rare)} "
+        f"(≤ {CHROMA_EXACT_CANDIDATES}), k={args.k}"
+    )
+    start = time.perf_counter()
+    for _ in range(100):
+        metadata_index.chunk_ids(metadata_index.rows(filters))
+    print(f"rozwiązanie filtra w indeksie metadanych: {(time.perf_counter() - start) * 10:.3f} ms")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        chroma = ChromaVectorStore.open(os.path.join(tmp, "chroma"), "bench_metadata_filter")
+        memory = InMemoryVectorStore()
+        for start in range(0, args.chunks, 2000):
+            chroma.upsert(docs[start : start + 2000], vectors[start : start + 2000].tolist())
+            memory.upsert(docs[start : start + 2000], vectors[start : start + 2000])
+        export_vector_index(chroma, os.path.join(tmp, "int8"), dtype="int8")
+        numpy_store = NumpyVectorStore(VectorIndex.load(os.path.join(tmp, "int8")))
+
+        for name, queries in query_sets.items():
+            print(f"\nzapytania {name}")
+            print(f"{'backend':<16} {'bez filtra':>11} {'where':>11} {'pre-filtr':>11} {'mały filtr':>11} {'pre-filtr/bez':>14}")
+            for label, store in (("chroma (HNSW)", chroma), ("numpy (int8)", numpy_store), ("memory (float32)", memory)):
+                plain = _p50(lambda v: store.search(v, k=args.k), queries)
+                # where na polu skalarnym – tagi z JSON nie dają się tak filtrować, to górna granica dotychczasowych możliwości
+                where = _p50(lambda v: store.search(v, k=args.k, where={"topic": "tag3"}), queries)
+                prefiltered = _p50(
+                    lambda v: store.search(v, k=args.k, ids=metadata_index.chunk_ids(metadata_index.rows(filters))), queries
+                )
+                small = _p50(lambda v: store.search(v, k=args.k, ids=metadata_index.chunk_ids(metadata_index.rows({"tags": ["rare"]}))), queries)
+                print(
+                    f"{label:<16} {plain:>8.2f} ms {where:>8.2f} ms {prefiltered:>8.2f} ms {small:>8.2f} ms "
+                    f"{prefiltered / plain:>13.1f}×"
+                )
+
+
+if __name__ == "__main__":
+    main()
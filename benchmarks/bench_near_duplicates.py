@@ -0,0 +1,98 @@
+"""
+Benchmark deduplikacji prawie-duplikatów (near_duplicates.py): koszt sygnatury MinHash przy buildzie,
+opóźnienie scalania kandydatów w retrieval (sygnatury z metadanych vs liczone z treści) i liczba
+duplikatów wykrytych w korpusie, w którym ten sam akapit jest kopiowany na wiele stron.
+
+Korpus syntetyczny: strony z akapitów (część akapitów wspólna dla wielu stron, z drobnymi zmianami
+formatowania), dzielone na chunki z nakładaniem jak w build_index (RecursiveCharacterTextSplitter
+po znakach, ~4 znaki/token – bez pobierania kodowania tiktoken). Bez API.
+
+Użycie:
+  python benchmarks/bench_near_duplicates.py
+  python benchmarks/bench_near_duplicates.py --pages 2000 --candidates 60 --threshold 0.8
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from near_duplicates import NearDuplicateFilter, add_signature, near_duplicate_of
+
+WORDS = (
+    "container image volume network bridge overlay compose service build cache layer registry daemon "
+    "engine socket port publish mount bind secret config healthcheck restart policy label context "
+    "stage target platform manifest tag digest push pull run exec logs inspect prune driver plugin"
+).split()
+
+
+def _paragraph(rng: np.random.Generator) -> str:
+    sentences = [" ".join(rng.choice(WORDS, rng.integers(8, 16))).capitalize() + "." for _ in range(rng.integers(3, 6))]
+    return " ".join(sentences)
+
+
+def _corpus(pages: int) -> list[Document]:
+    rng = np.random.default_rng(0)
+    # Sekcje wspólne dla wielu stron (wstawki: wymagania, ostrzeżenia, instrukcje instalacji) – ~1 chunk każda
+    shared = ["\n\n".join(_paragraph(rng) for _ in range(4)) for _ in range(40)]
+    docs = []
+    for i in range(pages):
+        sections = ["\n\n".join(_paragraph(rng) for _ in range(rng.integers(2, 6)))]
+        if rng.random() < 0.5:
+            copy = shared[rng.integers(0, len(shared))]
+            sections.append(copy.replace(". ", ".  ") if rng.random() < 0.5 else copy)  # drobna różnica formatowania
+        docs.append(Document(page_content="\n\n".join(sections), metadata={"title": f"page {i}"}))
+    return docs
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--candidates", type=int, default=60, help="Kandydatów po RRF (6 zapytań × dense/BM25 × top-6)")
+    parser.add_argument("--threshold", type=float, default=0.8)
+    args = parser.parse_args()
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=1600, chunk_overlap=400)
+    chunks = splitter.split_documents(_corpus(args.pages))
+    start = time.perf_counter()
+    for d in chunks:
+        add_signature(d)
+    signature_ms = (time.perf_counter() - start) * 1000
+    print(f"{len(chunks):,} chunków z {args.pages:,} stron; sygnatury MinHash: {signature_ms / len(chunks):.3f} ms/chunk")
+
+    dedup = NearDuplicateFilter(args.threshold)
+    start = time.perf_counter()
+    kept = sum(not dedup.is_duplicate(d) for d in chunks)
+    print(
+        f"build (LSH, próg {args.threshold}): {dedup.dropped:,} prawie-duplikatów ({dedup.dropped / len(chunks):.1%}), "
+        f"{kept:,} chunków zostaje, {(time.perf_counter() - start) * 1000:.0f} ms"
+    )
+    prefix_duplicates = len(chunks) - len({d.page_content[:200] for d in chunks})
+    print(f"dla porównania klucz hash(page_content[:200]): {prefix_duplicates:,} duplikatów")
+
+    rng = np.random.default_rng(1)
+    stored_ms, computed_ms, merged = [], [], 0
+    for _ in range(50):
+        candidates = [chunks[i] for i in rng.choice(len(chunks), args.candidates, replace=False)]
+        start = time.perf_counter()
+        owner = near_duplicate_of(candidates, args.threshold)
+        stored_ms.append((time.perf_counter() - start) * 1000)
+        merged += sum(o != i for i, o in enumerate(owner))
+        bare = [Document(page_content=d.page_content) for d in candidates]
+        start = time.perf_counter()
+        near_duplicate_of(bare, args.threshold)
+        computed_ms.append((time.perf_counter() - start) * 1000)
+    print(
+        f"retrieval ({args.candidates} kandydatów, p50): sygnatury z metadanych {np.percentile(stored_ms, 50):.2f} ms, "
+        f"liczone z treści {np.percentile(computed_ms, 50):.2f} ms; scalono średnio {merged / 50:.1f} kandydatów"
+    )
+
+
+if __name__ == "__main__":
+    main()
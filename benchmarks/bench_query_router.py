@@ -0,0 +1,116 @@
+"""
+Benchmark lokalnego routingu (query_router.py): jaka część zapytań jest rozstrzygana regułami słów
+kluczowych (bez embeddingu i bez LLM), trafność tych decyzji i czas klasyfikacji.
+
+Zapytania: eval_dataset.EXAMPLES (RAG, poza pytaniami "What is ...") i ręcznie oznaczone pytania
+ogólne / szczegółowe w stylu użytkowników. Zapytania bez decyzji reguł idą w workflow do centroidu
+embeddingów (jedno wywołanie embeddings, często z cache) i dopiero przy małym marginesie do LLM.
+Bez API.
+
+--calibrate (wymaga OPENROUTER_API_KEY – embeddingi EMBEDDING_MODEL, przez cache embeddingów): margines
+centroidu dla ROUTER_CENTROID_MARGIN. Wszystkie oznaczone pytania (bez reguł) porównane z centroidami
+ROUTE_EXAMPLES; dla każdego progu – ile pytań rozstrzyga centroid, z jaką trafnością, ile idzie do LLM.
+Proponowany próg: najmniejszy, przy którym trafność decyzji centroidu ≥ --target.
+
+Użycie:
+  python benchmarks/bench_query_router.py
+  python benchmarks/bench_query_router.py --calibrate --target 1.0
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from eval_dataset import EXAMPLES
+from query_router import ROUTE_EXAMPLES, build_centroids, keyword_route, nearest_centroid
+
+MARGINS = (0.0, 0.01, 0.02, 0.03, 0.04, 0.05, 0.06, 0.08, 0.10, 0.12, 0.15)
+
+LABELED = [(e["query"], "direct" if e["query"].lower().startswith("what is") else "rag") for e in EXAMPLES] + [
+    ("What is a Dockerfile?", "direct"),
+    ("What are containers used for?", "direct"),
+    ("Why use Docker instead of a VM?", "direct"),
+    ("Co to jest obraz Dockera?", "direct"),
+    ("Czym są wolumeny?", "direct"),
+    ("Explain the Docker architecture", "direct"),
+    ("What is the difference between CMD and ENTRYPOINT?", "direct"),
+    ("Is Docker free?", "direct"),
+    ("docker compose up fails with port is already allocated", "rag"),
+    ("How can I pass environment variables to a container?", "rag"),
+    ("Set up a private registry", "rag"),
+    ("Jak ograniczyć pamięć kontenera?", "rag"),
+    ("healthcheck options in compose.yaml", "rag"),
+    ("permission denied while trying to connect to the Docker daemon socket", "rag"),
+    ("What does docker system prune -a remove?", "rag"),
+    ("Copy files from a container to the host", "rag"),
+    ("Difference between bind mounts and volumes for databases", "rag"),
+    ("Build a multi-platform image with buildx", "rag"),
+    ("docker logs --follow for a compose service", "rag"),
+    ("Which storage driver should I use on Ubuntu?", "rag"),
+]
+
+
+def calibrate(target: float) -> None:
+    from config import EMBEDDING_MODEL, ROUTER_CENTROID_MARGIN
+    from retriever import embed_queries
+
+    examples = [(route, q) for route, queries in ROUTE_EXAMPLES.items() for q in queries]
+    vectors = embed_queries([q for _, q in examples] + [q for q, _ in LABELED])
+    grouped: dict[str, list] = {}
+    for (route, _), vector in zip(examples, vectors):
+        grouped.setdefault(route, []).append(vector)
+    centroids = build_centroids(grouped)
+    decisions = [(*nearest_centroid(vector, centroids), label, query) for vector, (query, label) in zip(vectors[len(examples):], LABELED)]
+
+    print(f"kalibracja ROUTER_CENTROID_MARGIN ({EMBEDDING_MODEL}, obecnie {ROUTER_CENTROID_MARGIN}): {len(LABELED)} pytań, bez reguł")
+    print(f"{'margines':>8} {'centroid':>9} {'trafnie':>8} {'→ LLM':>6}")
+    proposed = None
+    for margin in MARGINS:
+        decided = [(route, label) for route, m, label, _ in decisions if m >= margin]
+        accuracy = sum(route == label for route, label in decided) / len(decided) if decided else 1.0
+        print(f"{margin:>8.2f} {len(decided):>9} {accuracy:>7.0%} {len(LABELED) - len(decided):>6}")
+        if proposed is None and accuracy >= target:
+            proposed = margin
+    print("błędne decyzje centroidu (margines):")
+    for route, m, label, query in sorted(decisions, key=lambda d: -d[1]):
+        if route != label:
+            print(f"  {m:.3f}  {label} → {route}: {query}")
+    if proposed is None:
+        print(f"żaden próg nie daje trafności ≥ {target:.0%} – routing zostaw wyłączony (QUERY_ROUTING=0)")
+    else:
+        print(f"proponowany próg: ROUTER_CENTROID_MARGIN={proposed} (trafność ≥ {target:.0%})")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calibrate", action="store_true", help="Kalibracja marginesu centroidu (embeddingi przez API)")
+    parser.add_argument("--target", type=float, default=0.95, help="Wymagana trafność decyzji centroidu")
+    args = parser.parse_args()
+    if args.calibrate:
+        calibrate(args.target)
+        return
+
+    decided = correct = 0
+    undecided = []
+    start = time.perf_counter()
+    for _ in range(100):
+        decisions = [keyword_route(q)[0] for q, _ in LABELED]
+    elapsed_us = (time.perf_counter() - start) / (100 * len(LABELED)) * 1e6
+    for (query, label), route in zip(LABELED, decisions):
+        if route is None:
+            undecided.append(query)
+            continue
+        decided += 1
+        correct += route == label
+    print(f"{len(LABELED)} zapytań; reguły rozstrzygają {decided} ({decided / len(LABELED):.0%}), trafnie {correct}/{decided}")
+    print(f"czas reguł: {elapsed_us:.1f} µs / zapytanie (routing LLM: jedno wywołanie SMART_LLM ≈ setki ms)")
+    print("bez decyzji reguł (→ centroid embeddingów, ewentualnie LLM):")
+    for query in undecided:
+        print(f"  - {query}")
+
+
+if __name__ == "__main__":
+    main()
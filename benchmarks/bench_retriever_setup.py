@@ -0,0 +1,87 @@
+"""
+Benchmark: czas przygotowania retrieverów na jedno zapytanie (bez wywołań API).
+
+Porównuje:
+  - before: każdy worker tworzy nowy OpenAIEmbeddings + otwiera Chroma z dysku,
+  - after:  workery dostają współdzielone uchwyty z rejestru w retriever.py.
+
+Użycie:
+  python benchmarks/bench_retriever_setup.py
+  python benchmarks/bench_retriever_setup.py --requests 50 --workers 3
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENROUTER_API_KEY", "sk-bench")  # klient nie wysyła żadnych requestów
+os.environ.setdefault("EMBEDDING_CACHE", "0")  # mierzymy tylko otwieranie klienta i indeksu
+
+from langchain_chroma import Chroma
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+import retriever
+from config import COLLECTION_NAME
+from vector_store import ChromaVectorStore
+
+
+def _seed_store(persist_dir: str) -> None:
+    """Tworzy małą kolekcję w tymczasowym katalogu (fałszywe embeddingi, bez API)."""
+    Chroma.from_texts(
+        [f"Docker chunk {i}" for i in range(200)],
+        DeterministicFakeEmbedding(size=64),
+        collection_name=COLLECTION_NAME,
+        persist_directory=persist_dir,
+    )
+
+
+def _setup_before(workers: int, persist_dir: str) -> None:
+    for _ in range(workers):
+        embeddings = retriever._create_embeddings()
+        vs = Chroma(
+            collection_name=COLLECTION_NAME,
+            embedding_function=embeddings,
+            persist_directory=persist_dir,
+        )
+        vs.as_retriever(search_kwargs={"k": 6})
+
+
+def _setup_after(workers: int) -> None:
+    for _ in range(workers):
+        retriever.get_retriever(k=6)
+
+
+def _measure(fn, requests: int, workers: int) -> float:
+    start = time.perf_counter()
+    for _ in range(requests):
+        fn(workers)
+    return (time.perf_counter() - start) / requests * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=30, help="Liczba symulowanych zapytań")
+    parser.add_argument("--workers", type=int, default=3, help="Retrieverów na zapytanie (expanded queries)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        _seed_store(tmp)
+        retriever.open_vector_store = lambda *_: ChromaVectorStore.open(directory=tmp)
+        retriever.reload_vector_store()
+
+        before_ms = _measure(lambda workers: _setup_before(workers, tmp), args.requests, args.workers)
+        retriever.get_vector_store()  # pierwsze otwarcie – poza pomiarem (raz na proces)
+        after_ms = _measure(_setup_after, args.requests, args.workers)
+        retriever.reload_vector_store()
+
+    print(f"Setup retrieverów na zapytanie ({args.workers} workery, {args.requests} zapytań):")
+    print(f"  before (nowy klient + Chroma per worker): {before_ms:8.3f} ms")
+    print(f"  after  (współdzielony rejestr):           {after_ms:8.3f} ms")
+    print(f"  speedup: {before_ms / max(after_ms, 1e-9):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark spekulatywnego retrieval (pre_retrieval + retrieval w workflow.py): czas od startu ekspansji
+do gotowych list rankingowych bez spekulacji, ze spekulacją (wyniki oryginalnego zapytania dołączone)
+i ze spekulacją, gdy wyniki są pewne (ekspansja pominięta).
+
+Opóźnienia etapów symulowane (bez API): wywołanie LLM ekspansji, embedding (jedno wywołanie na batch),
+wyszukiwanie dense i BM25. Opóźnienia podaje się w ms; domyślne – typowe wartości z flow_trace.
+
+Użycie:
+  python benchmarks/bench_speculative_retrieval.py
+  python benchmarks/bench_speculative_retrieval.py --llm-ms 1500 --embed-ms 150 --search-ms 40
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.documents import Document
+
+import workflow
+
+DOC = Document(id="c1", page_content="docker run -p 8080:80 publishes container port 80 on host port 8080", metadata={"title": "Ports"})
+
+
+def _run(args, speculative: bool, confident: bool) -> tuple[float, dict]:
+    def expansion(inputs):
+        time.sleep(args.llm_ms / 1000)
+        return MagicMock(content="publish container port\ndocker run -p\nEXPOSE instruction")
+
+    def embed(queries, stats=None):
+        time.sleep(args.embed_ms / 1000)
+        if stats is not None:
+            stats.update({"hits": 0, "misses": len(queries), "api_calls": 1})
+        return [[1.0, 0.0] for _ in queries]
+
+    def search(vector, k=6, **kwargs):
+        time.sleep(args.search_ms / 1000)
+        return [(DOC, 0.2)]
+
+    chain = MagicMock()
+    chain.invoke.side_effect = expansion
+    state = {"query": "How to expose ports?", "trace": True, "flow_log": []}
+    with patch("workflow._pre_retrieval_chain", return_value=chain), \
+            patch("workflow.embed_queries", side_effect=embed), \
+            patch("workflow.search_by_vector_with_scores", side_effect=search), \
+            patch("workflow.lexical_search_with_scores", return_value=[(DOC, 5.0)]), \
+            patch("workflow.get_chunk_embeddings", return_value={"c1": [1.0, 0.0] if confident else [0.3, 0.95]}), \
+            patch("workflow.SPECULATIVE_RETRIEVAL_ENABLED", speculative), \
+            contextlib.redirect_stdout(io.StringIO()):  # [DEBUG ...] z węzłów
+        start = time.perf_counter()
+        pre = workflow.pre_retrieval(state)
+        workflow.retrieval({**state, **pre, "flow_log": []})
+        elapsed = time.perf_counter() - start
+    return elapsed * 1000, pre["flow_log"][0]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--llm-ms", type=float, default=900)
+    parser.add_argument("--embed-ms", type=float, default=120)
+    parser.add_argument("--search-ms", type=float, default=30)
+    args = parser.parse_args()
+
+    print(f"symulowane opóźnienia: LLM ekspansji {args.llm_ms:.0f} ms, embedding {args.embed_ms:.0f} ms, wyszukiwanie {args.search_ms:.0f} ms")
+    print(f"{'wariant':<34} {'pre_retrieval + retrieval':>26}")
+    base, _ = _run(args, speculative=False, confident=False)
+    print(f"{'bez spekulacji':<34} {base:>23.0f} ms")
+    for label, confident in (("spekulacja, ekspansja użyta", False), ("spekulacja, ekspansja pominięta", True)):
+        elapsed, entry = _run(args, speculative=True, confident=confident)
+        print(f"{label:<34} {elapsed:>23.0f} ms ({elapsed / base - 1:+.0%})")
+        print(f"   trace: {entry['detail']}")
+
+
+if __name__ == "__main__":
+    main()
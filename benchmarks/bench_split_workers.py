@@ -0,0 +1,75 @@
+"""
+Benchmark iter_chunks (build_index.py): dzielenie na chunki w puli procesów vs w jednym procesie.
+
+Domyślnie splitter tiktoken (jak w build_index); gdy enkodera nie da się załadować (brak sieci
+i cache), liczenie tokenów zastępuje tokenizacja regexem o podobnym koszcie CPU.
+Przyspieszenie zależy od liczby rdzeni (os.cpu_count()).
+
+Użycie:
+  python benchmarks/bench_split_workers.py
+  python benchmarks/bench_split_workers.py --docs 5000 --workers 1 2 4 8
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+from functools import partial
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from build_index import iter_chunks
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def _regex_token_len(text: str) -> int:
+    return len(_TOKEN_RE.findall(text))
+
+
+def _make_splitter_factory():
+    try:
+        import tiktoken
+
+        tiktoken.get_encoding("cl100k_base")
+        return "tiktoken", partial(RecursiveCharacterTextSplitter.from_tiktoken_encoder, chunk_size=400, chunk_overlap=100)
+    except Exception:
+        return "regex (bez tiktoken)", partial(
+            RecursiveCharacterTextSplitter, chunk_size=400, chunk_overlap=100, length_function=_regex_token_len
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=3000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    sentence = "Run docker compose up -d to start services defined in compose.yaml on port 8080. "
+    df = pd.DataFrame({
+        "content": [f"# Page {i}\n\n" + "\n\n".join(sentence * 4 for _ in range(3 + i % 10)) for i in range(args.docs)],
+        "title": [f"Page {i}" for i in range(args.docs)],
+        "file_path": [f"docs/page_{i}.md" for i in range(args.docs)],
+    })
+    frames = [df[start : start + 1000] for start in range(0, len(df), 1000)]
+    name, make_splitter = _make_splitter_factory()
+    print(f"{args.docs:,} dokumentów, splitter: {name}, CPU: {os.cpu_count()}")
+
+    reference = None
+    for workers in args.workers:
+        start = time.perf_counter()
+        chunks = [(d.id, d.page_content) for d in iter_chunks(frames, make_splitter, workers=workers)]
+        seconds = time.perf_counter() - start
+        reference = reference or chunks
+        print(
+            f"  workers={workers}:  {seconds:6.2f} s  {len(chunks) / seconds:8.0f} chunków/s  "
+            f"identyczny wynik: {chunks == reference}"
+        )
+
+
+if __name__ == "__main__":
+    main()
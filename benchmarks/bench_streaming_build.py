@@ -0,0 +1,152 @@
+"""
+Benchmark pamięci budowy indeksu: całość w pamięci (read_parquet → lista chunków → BM25)
+vs strumień (iter_parquet_frames → LexicalIndexWriter → embed_and_upsert). Obie ścieżki dzielą
+dokumenty tym samym iter_chunks (id, pozycja w dokumencie, sygnatura MinHash) – różnią się tylko tym,
+czy plik i chunki są materializowane w całości.
+
+Każdy pomiar w osobnym procesie: RSS po importach (baza), szczytowe RSS z getrusage i przyrost
+szczytu ponad bazę – to on rośnie z rozmiarem korpusu. Embedding symulowany (stały wektor),
+zapis do Chroma pominięty – mierzona jest sama ścieżka danych build_index. Splitter znakowy
+(~400 tokenów) zamiast tiktoken, żeby nie pobierać enkodera. Plik ma grupy wierszy po
+--row-group wierszy: pyarrow dekoduje całą grupę naraz, więc to ona (a nie rozmiar pliku)
+wyznacza pamięć ścieżki strumieniowej.
+
+Użycie:
+  python benchmarks/bench_streaming_build.py
+  python benchmarks/bench_streaming_build.py --rows 2000 10000 40000
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+from langchain_core.embeddings import Embeddings
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from vector_store import InMemoryVectorStore
+
+WORDS = "docker container image volume network compose build run port expose service swarm registry".split()
+
+
+class _ConstEmbedding(Embeddings):
+    def embed_documents(self, texts):
+        return [[0.0] * 8 for _ in texts]
+
+    def embed_query(self, text):
+        return [0.0] * 8
+
+
+class _NullVectorStore(InMemoryVectorStore):
+    """Zamiast Chroma: pomiar dotyczy potoku danych, nie magazynu wektorów."""
+
+    def upsert(self, docs, embeddings):
+        pass
+
+
+def _write_parquet(path: str, rows: int, row_group: int) -> None:
+    rng = np.random.default_rng(0)
+    words = np.array(WORDS)
+    pd.DataFrame({
+        "content": [" ".join(words[rng.integers(0, len(words), 250)]) for _ in range(rows)],
+        "title": [f"Page {i}" for i in range(rows)],
+        "file_path": [f"docs/page_{i}.md" for i in range(rows)],
+        "tags": [["docker", f"t{i % 50}"] for i in range(rows)],
+    }).to_parquet(path, row_group_size=row_group)
+
+
+def _splitter():
+    return RecursiveCharacterTextSplitter(chunk_size=1600, chunk_overlap=400)
+
+
+def _run_full(path: str, out_dir: str) -> int:
+    from build_index import _batches, iter_chunks
+    from lexical_index import LexicalIndex
+
+    doc_splits = list(iter_chunks([pd.read_parquet(path)], _splitter))
+    embedding = _ConstEmbedding()
+    for batch in _batches(doc_splits, 256):
+        embedding.embed_documents([d.page_content for d in batch])
+    LexicalIndex.build(doc_splits).save(out_dir)
+    return len(doc_splits)
+
+
+def _run_stream(path: str, out_dir: str) -> int:
+    from build_index import _tee_to_indexes, embed_and_upsert, iter_chunks, iter_parquet_frames
+    from lexical_index import LexicalIndexWriter
+
+    lexical = LexicalIndexWriter(out_dir)
+    chunks = iter_chunks(iter_parquet_frames(path), _splitter)
+    with open(os.devnull, "w") as devnull:
+        stdout, sys.stdout = sys.stdout, devnull  # pasek postępu
+        try:
+            embed_and_upsert(_NullVectorStore(), _ConstEmbedding(), _tee_to_indexes(chunks, lexical), concurrency=2)
+        finally:
+            sys.stdout = stdout
+    lexical.finish()
+    return len(lexical)
+
+
+def _rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        return next(int(line.split()[1]) for line in f if line.startswith("VmRSS:")) / 1024  # KiB
+
+
+def _worker(mode: str, path: str) -> None:
+    import build_index  # noqa: F401 – importy poza pomiarem przyrostu
+    import lexical_index  # noqa: F401
+
+    base_mb = _rss_mb()
+    with tempfile.TemporaryDirectory() as out_dir:
+        start = time.perf_counter()
+        chunks = (_run_full if mode == "full" else _run_stream)(path, out_dir)
+        seconds = time.perf_counter() - start
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # Linux: KiB
+    print(json.dumps({"chunks": chunks, "seconds": seconds, "base_mb": base_mb, "peak_mb": peak_mb}))
+
+
+def _rss(result: dict) -> str:
+    return f"{result['peak_mb']:.0f} MB (+{result['peak_mb'] - result['base_mb']:.0f} MB)"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[2000, 8000, 32000])
+    parser.add_argument("--row-group", type=int, default=2000, help="Wierszy na grupę (row group) w pliku parquet")
+    parser.add_argument("--worker", nargs=2, metavar=("MODE", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        _worker(*args.worker)
+        return
+
+    print("RSS: szczyt (przyrost ponad bazę po importach)")
+    print(f"{'wiersze':>8} {'chunki':>8} | {'całość: RSS':>20} {'czas':>7} | {'strumień: RSS':>20} {'czas':>7}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.rows:
+            path = os.path.join(tmp, f"docs_{rows}.parquet")
+            _write_parquet(path, rows, args.row_group)
+            results = {}
+            for mode in ("full", "stream"):
+                out = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), "--worker", mode, path],
+                    capture_output=True, text=True, check=True,
+                ).stdout
+                results[mode] = json.loads(out.strip().splitlines()[-1])
+            full, stream = results["full"], results["stream"]
+            assert full["chunks"] == stream["chunks"], (full["chunks"], stream["chunks"])
+            print(
+                f"{rows:>8,} {stream['chunks']:>8,} | {_rss(full):>20} {full['seconds']:>6.1f}s | "
+                f"{_rss(stream):>20} {stream['seconds']:>6.1f}s"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Benchmark backendów magazynu wektorów (vector_store.py): Chroma (HNSW, persist_directory), indeks NumPy
+(vector_index.py: int8 / float16 na dysku, float32 w pamięci, iloczyn macierz × wektor + argpartition) i magazyn w pamięci
+(float32, wczytywany z Chroma przy otwarciu).
+
+Mierzone: czas otwarcia indeksu, opóźnienie zapytania (p50 / p95), szczytowe RSS procesu i recall@k
+względem dokładnego wyszukiwania na float32. Każdy backend w osobnym procesie (szczytowe RSS z VmHWM
+w /proc/self/status – ru_maxrss z getrusage dziedziczy szczyt procesu rodzica sprzed exec).
+Embeddingi syntetyczne, skupione wokół tematów (jak prawdziwe chunki dokumentacji), bez API.
+
+Użycie:
+  python benchmarks/bench_vector_backend.py
+  python benchmarks/bench_vector_backend.py --chunks 50000 --dim 1536 --queries 200 --k 6
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+COLLECTION = "bench_vector_backend"
+
+
+def _corpus(chunks: int, dim: int, queries: int) -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(0)
+    topics = rng.standard_normal((max(1, chunks // 50), dim)).astype(np.float32)
+    vectors = topics[rng.integers(0, len(topics), chunks)] + 0.6 * rng.standard_normal((chunks, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    picked = vectors[rng.integers(0, chunks, queries)]
+    query_vectors = picked + 0.5 * rng.standard_normal(picked.shape).astype(np.float32) / np.sqrt(dim) * 4
+    return vectors, query_vectors / np.linalg.norm(query_vectors, axis=1, keepdims=True)
+
+
+def _prepare(tmp: str, vectors: np.ndarray) -> None:
+    from langchain_core.documents import Document
+
+    from build_index import export_vector_index
+    from vector_store import ChromaVectorStore
+
+    store = ChromaVectorStore.open(os.path.join(tmp, "chroma"), COLLECTION)
+    for start in range(0, len(vectors), 2000):
+        part = vectors[start : start + 2000]
+        store.upsert([Document(id=f"id{i}", page_content=f"chunk {i}", metadata={"n": 0}) for i in range(start, start + len(part))], part)
+    for dtype in ("int8", "float16"):
+        export_vector_index(store, os.path.join(tmp, dtype), dtype=dtype)
+
+
+def _worker(mode: str, tmp: str, k: int) -> None:
+    queries = np.load(os.path.join(tmp, "queries.npy"))
+    start = time.perf_counter()
+    from vector_index import VectorIndex
+    from vector_store import ChromaVectorStore, InMemoryVectorStore, NumpyVectorStore
+
+    if mode in ("chroma", "memory"):
+        store = ChromaVectorStore.open(os.path.join(tmp, "chroma"), COLLECTION)
+        if mode == "memory":
+            chroma, store = store, InMemoryVectorStore()
+            for docs, vectors in chroma.scan(include_embeddings=True):
+                store.upsert(docs, vectors)
+    else:
+        store = NumpyVectorStore(VectorIndex.load(os.path.join(tmp, mode)))
+    search = lambda v: store.search(v, k=k)  # noqa: E731
+    open_ms = (time.perf_counter() - start) * 1000
+    search(queries[0].tolist())  # rozgrzewka (pierwsze strony z dysku / HNSW w pamięci)
+    latencies, found = [], []
+    for vector in queries:
+        vector = vector.tolist()
+        start = time.perf_counter()
+        results = search(vector)
+        latencies.append((time.perf_counter() - start) * 1000)
+        found.append([int(doc.id[2:]) for doc, _ in results])
+    with open("/proc/self/status") as f:
+        peak_mb = next(int(line.split()[1]) for line in f if line.startswith("VmHWM:")) / 1024  # KiB
+    print(json.dumps({"open_ms": open_ms, "latencies": latencies, "found": found, "peak_mb": peak_mb}))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=6)
+    parser.add_argument("--worker", nargs=2, metavar=("MODE", "DIR"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        _worker(*args.worker, args.k)
+        return
+
+    vectors, queries = _corpus(args.chunks, args.dim, args.queries)
+    exact = np.argsort(-(queries @ vectors.T), axis=1)[:, : args.k]
+    print(f"{args.chunks:,} chunków × {args.dim} wymiarów, {args.queries} zapytań, k={args.k}")
+    with tempfile.TemporaryDirectory() as tmp:
+        np.save(os.path.join(tmp, "queries.npy"), queries)
+        _prepare(tmp, vectors)
+        print(f"{'backend':<16} {'otwarcie':>9} {'p50':>8} {'p95':>8} {'RSS':>8} {f'recall@{args.k}':>10}")
+        for mode in ("chroma", "int8", "float16", "memory"):
+            out = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--worker", mode, tmp, "--k", str(args.k)],
+                capture_output=True, text=True, check=True,
+            ).stdout
+            result = json.loads(out.strip().splitlines()[-1])
+            recall = np.mean([len(set(f) & set(e)) / args.k for f, e in zip(result["found"], exact.tolist())])
+            p50, p95 = np.percentile(result["latencies"], [50, 95])
+            label = {"chroma": "chroma (HNSW)", "memory": "memory (float32)"}.get(mode, f"numpy ({mode})")
+            print(
+                f"{label:<16} {result['open_ms']:>6.0f} ms {p50:>5.2f} ms {p95:>5.2f} ms "
+                f"{result['peak_mb']:>5.0f} MB {recall:>10.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
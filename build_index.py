@@ -1,24 +1,69 @@
 """Build Docker docs index on demand. Run: python build_index.py"""
 
 import os
+import hashlib
 import json
+import math
+import random
 import shutil
+import time
+import uuid
+from collections import Counter, deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+from functools import partial
+from itertools import islice
 
 from dotenv import load_dotenv
 
 load_dotenv(override=True)
 
+import numpy as np
+import openai
 import pandas as pd
+import pyarrow.parquet as pq
 from langchain_core.documents import Document
-from langchain_chroma import Chroma
 from langchain_openai import OpenAIEmbeddings
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from langchain_text_splitters import RecursiveCharacterTextSplitter, TextSplitter
 
-from config import CHROMA_DIR, COLLECTION_NAME, EMBEDDING_MODEL, OPENROUTER_API_KEY, OPENROUTER_BASE_URL
+from config import (
+    CHROMA_DIR,
+    EMBEDDING_MODEL,
+    INDEX_CHECKPOINT_PATH,
+    INDEX_DROP_NEAR_DUPLICATES,
+    INDEX_EMBED_BACKOFF_S,
+    INDEX_EMBED_BATCH_SIZE,
+    INDEX_EMBED_CONCURRENCY,
+    INDEX_EMBED_MAX_RETRIES,
+    INDEX_EMBEDDING_STORE_ENABLED,
+    INDEX_EMBEDDING_STORE_PATH,
+    INDEX_PARQUET_BATCH_ROWS,
+    INDEX_SPLIT_WORKERS,
+    INDEX_VERSION_PATH,
+    LEXICAL_INDEX_DIR,
+    METADATA_INDEX_PATH,
+    NEAR_DUPLICATE_THRESHOLD,
+    OPENROUTER_API_KEY,
+    OPENROUTER_BASE_URL,
+    TIKTOKEN_ENCODING,
+    VECTOR_BACKEND,
+    VECTOR_INDEX_DIR,
+    VECTOR_INDEX_DTYPE,
+)
+from embedding_store import EmbeddingStore
+from lexical_index import LexicalIndexWriter
+from metadata_index import MetadataIndexWriter
+from near_duplicates import NearDuplicateFilter, add_signature
+from vector_index import VectorIndex, VectorIndexWriter
+from vector_store import VectorStore, open_vector_store
 
 PARQUET_FILENAME = "docker_docs_rag.parquet"
 PARQUET_PATH = os.path.join(os.path.dirname(__file__), PARQUET_FILENAME)
 DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+# Dokumentów na jedno zadanie dzielenia na chunki (pula procesów w iter_chunks)
+SPLIT_TASK_DOCS = 64
+# Błędy przejściowe API embeddingów – batch jest ponawiany z backoffem
+RETRYABLE_EMBEDDING_ERRORS = (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError)
 
 
 def _download_from_kaggle():
@@ -38,26 +83,48 @@ def _download_from_kaggle():
     return None
 
 
-def _load_dataframe():
-    """Wczytuje DataFrame z parquet (lokalnie lub Kaggle)."""
-    df = pd.DataFrame()
-    if os.path.isfile(PARQUET_PATH):
-        df = pd.read_parquet(PARQUET_PATH)
-        print("✅ Dataset wczytany z pliku parquet")
-    if df.empty:
-        local_path = os.path.join(DATA_DIR, PARQUET_FILENAME)
-        if os.path.isfile(local_path):
-            df = pd.read_parquet(local_path)
-            print("✅ Dataset wczytany z pliku parquet (data/)")
-        else:
-            print("📥 Próba pobrania z Kaggle...")
-            downloaded = _download_from_kaggle()
-            if downloaded:
-                df = pd.read_parquet(downloaded)
-                print("✅ Dataset pobrany z Kaggle")
-            else:
-                print("❌ Nie znaleziono pliku parquet.")
-    return df
+def _find_parquet() -> str | None:
+    """Ścieżka do parquet (lokalnie, data/ lub Kaggle); pusty plik w katalogu projektu jest pomijany."""
+    if os.path.isfile(PARQUET_PATH) and pq.ParquetFile(PARQUET_PATH).metadata.num_rows:
+        print("✅ Dataset: plik parquet")
+        return PARQUET_PATH
+    local_path = os.path.join(DATA_DIR, PARQUET_FILENAME)
+    if os.path.isfile(local_path):
+        print("✅ Dataset: plik parquet (data/)")
+        return local_path
+    print("📥 Próba pobrania z Kaggle...")
+    downloaded = _download_from_kaggle()
+    if downloaded:
+        print("✅ Dataset pobrany z Kaggle")
+        return downloaded
+    print("❌ Nie znaleziono pliku parquet.")
+    return None
+
+
+def _source_parquet() -> str:
+    """
+    Plik parquet z co najmniej jednym wierszem – inaczej błąd przed jakimkolwiek zapisem. Synchronizacja
+    z pustym źródłem usunęłaby z istniejącego indeksu wszystkie chunki (zostałby tylko chunk zastępczy).
+    """
+    path = _find_parquet()
+    if path is None:
+        raise FileNotFoundError(
+            f"Brak źródła dokumentów: {PARQUET_FILENAME} (katalog projektu, data/ ani Kaggle) – istniejący indeks bez zmian"
+        )
+    if not pq.ParquetFile(path).metadata.num_rows:
+        raise ValueError(f"Pusty plik parquet: {path} – istniejący indeks bez zmian")
+    return path
+
+
+def iter_parquet_frames(path: str | None, batch_rows: int = INDEX_PARQUET_BATCH_ROWS) -> Iterator[pd.DataFrame]:
+    """
+    Parquet czytany partiami (pyarrow record batches) – w pamięci jedna partia wierszy plus
+    zdekodowana grupa wierszy (row group) pliku, z której pochodzi.
+    """
+    if not path:
+        return
+    for record_batch in pq.ParquetFile(path, buffer_size=1 << 20, pre_buffer=False).iter_batches(batch_size=batch_rows):
+        yield record_batch.to_pandas()
 
 
 def _chroma_safe_metadata_value(value):
@@ -76,59 +143,547 @@ def _chroma_safe_metadata_value(value):
         return str(value)
 
 
+def _safe_metadata_column(values: pd.Series) -> list:
+    """_chroma_safe_metadata_value dla całej kolumny; kolumny tekstowe i liczbowe przechodzą bez zmian."""
+    if values.dtype.kind in "biuf":  # astype(object) → skalary Pythona (jak wcześniej w iterrows)
+        return values.astype(object).tolist()
+    values = values.astype(object)
+    if pd.api.types.infer_dtype(values, skipna=False) in ("string", "empty"):
+        return values.tolist()
+    plain = (str, bool, int, float, type(None))
+    encode = json.JSONEncoder(ensure_ascii=False).encode  # jak json.dumps, bez tworzenia enkodera per komórka
+
+    def convert(value):
+        if isinstance(value, plain):
+            return value
+        if isinstance(value, np.ndarray):  # listy z parquet (tags/aliases)
+            value = value.tolist()
+            return encode(value) if value else ""
+        return _chroma_safe_metadata_value(value)
+
+    return [convert(v) for v in values.tolist()]
+
+
 def _df_to_docs(df: pd.DataFrame):
-    """Zamienia DataFrame na listę Document."""
+    """
+    Zamienia DataFrame na listę Document (operacje na całych kolumnach zamiast df.iterrows()).
+
+    Pusta treść → "title\n\ndescription" (albo "(brak treści)"); tags/keywords/aliases
+    serializowane do typów Chroma, pomijane w metadanych, gdy wartość to None.
+    """
+    df = df.reset_index(drop=True)
+    n = len(df)
+
+    def column(name: str) -> pd.Series:
+        return df[name].astype(object) if name in df.columns else pd.Series([""] * n, dtype=object)
+
+    content = column("content")
+    is_str = content.map(type).eq(str)
+    empty = pd.Series(False, index=content.index)
+    empty[is_str] = content[is_str].str.strip().eq("")
+    if not is_str.all():
+        # null (NaN w kolumnach tekstowych pandas) też jak pusta treść – wcześniej kończyło się błędem Document
+        other = content[~is_str]
+        empty[~is_str] = other.isna() | other.map(lambda c: not c)
+    if empty.any():
+        fallback = (column("title")[empty].map(str) + "\n\n" + column("description")[empty].map(str)).str.strip()
+        content[empty] = fallback.mask(fallback.eq(""), "(brak treści)")
+
+    optional = [key for key in ("tags", "keywords", "aliases") if key in df.columns]
+    rows = zip(
+        content.tolist(),
+        _safe_metadata_column(column("file_path")),
+        _safe_metadata_column(column("title")),
+        *(_safe_metadata_column(df[key]) for key in optional),
+    )
     docs = []
-    for _, row in df.iterrows():
-        content = row.get("content", "")
-        if not content or (isinstance(content, str) and not content.strip()):
-            title = row.get("title", "")
-            desc = row.get("description", "")
-            content = f"{title}\n\n{desc}".strip() or "(brak treści)"
-        if isinstance(content, str) and not content.strip():
-            continue
-        metadata = {
-            "file_path": _chroma_safe_metadata_value(row.get("file_path", "")),
-            "title": _chroma_safe_metadata_value(row.get("title", "")),
-        }
-        for key in ("tags", "keywords", "aliases"):
-            if key in row and row[key] is not None:
-                metadata[key] = _chroma_safe_metadata_value(row[key])
-        docs.append(Document(page_content=content, metadata=metadata))
+    for text, file_path, title, *extra in rows:
+        metadata = {"file_path": file_path, "title": title}
+        for key, value in zip(optional, extra):
+            if value is not None:
+                metadata[key] = value
+        docs.append(Document(page_content=text, metadata=metadata))
     return docs
 
 
-def build_index():
-    """Buduje indeks Chroma z dokumentacji Docker. Zapisuje do CHROMA_DIR."""
-    force_rebuild = os.environ.get("REBUILD_INDEX", "").lower() in ("1", "true", "yes")
-    if force_rebuild and os.path.isdir(CHROMA_DIR):
-        shutil.rmtree(CHROMA_DIR)
-        print("🔄 REBUILD_INDEX=1 — usunięto stary indeks, budowanie od zera...")
-
-    df = _load_dataframe()
-    docs = _df_to_docs(df)
-    text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-        chunk_size=400,
-        chunk_overlap=100,
+def _assign_chunk_ids(doc_splits: list[Document], seen: Counter | None = None) -> None:
+    """
+    Stabilne id chunka: sha256(file_path + treść) – ta sama treść w tym samym pliku ma to samo id
+    między buildami (powtórzenia w pliku dostają sufiks -2, -3, ...). metadata_hash wykrywa
+    zmianę samych metadanych (tytuł, tagi) bez zmiany treści. `seen` – licznik powtórzeń
+    współdzielony między partiami strumienia. Chunk z następnym chunkiem tego samego dokumentu
+    (source_id, chunk_index + 1) dostaje jego id w next_chunk_id – stitching w post_retrieval
+    dobiera po nim brakujący środkowy chunk.
+    """
+    seen = Counter() if seen is None else seen
+    for d in doc_splits:
+        file_path = d.metadata.get("file_path") or ""
+        base = hashlib.sha256(f"{file_path}\0{d.page_content}".encode("utf-8")).hexdigest()
+        seen[base] += 1
+        d.id = base if seen[base] == 1 else f"{base}-{seen[base]}"
+    for d, following in zip(doc_splits, doc_splits[1:]):
+        index = d.metadata.get("chunk_index")
+        if (
+            index is not None
+            and d.metadata.get("source_id") is not None
+            and following.metadata.get("source_id") == d.metadata.get("source_id")
+            and following.metadata.get("chunk_index") == index + 1
+        ):
+            d.metadata["next_chunk_id"] = following.id
+    for d in doc_splits:
+        metadata = {k: v for k, v in d.metadata.items() if k != "metadata_hash"}
+        d.metadata["metadata_hash"] = hashlib.sha256(
+            json.dumps(metadata, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")
+        ).hexdigest()[:16]
+
+
+# Splitter procesu roboczego – tworzony raz w _init_split_worker (enkoder tiktoken ładowany raz na proces)
+_worker_splitter = None
+
+
+def _init_split_worker(make_splitter: Callable[[], TextSplitter]) -> None:
+    global _worker_splitter
+    _worker_splitter = make_splitter()
+
+
+def _split_documents(splitter: TextSplitter, docs: list[Document]) -> list[Document]:
+    """
+    Chunki dokumentów z pozycją w dokumencie źródłowym (source_id = hash file_path i treści wiersza,
+    chunk_index = numer chunka) i sygnaturą MinHash (near_duplicates.py) – liczone raz, razem z podziałem.
+    Treść w source_id rozdziela wiersze parquet o tym samym file_path; wiersz bez file_path nie dostaje
+    source_id (jego chunków nie łączy stitching w post_retrieval).
+    """
+    splits = []
+    for doc in docs:
+        file_path = doc.metadata.get("file_path")
+        source_id = None
+        if file_path:
+            source_id = hashlib.sha256(f"{file_path}\0{doc.page_content}".encode("utf-8")).hexdigest()[:16]
+        for ordinal, d in enumerate(splitter.split_documents([doc])):
+            if source_id is not None:
+                d.metadata["source_id"] = source_id
+            d.metadata["chunk_index"] = ordinal
+            add_signature(d)
+            splits.append(d)
+    return splits
+
+
+def _split_in_worker(docs: list[Document]) -> list[Document]:
+    return _split_documents(_worker_splitter, docs)
+
+
+def _split_tasks(
+    frames: Iterable[pd.DataFrame], make_splitter: Callable[[], TextSplitter], workers: int
+) -> Iterator[list[Document]]:
+    """
+    Chunki kolejnych zadań (po SPLIT_TASK_DOCS dokumentów) w kolejności wejścia.
+    workers > 1 → pula procesów; w locie najwyżej 2 × workers zadań, wyniki odbierane po kolei (deterministycznie).
+    """
+    tasks = (
+        docs[start : start + SPLIT_TASK_DOCS]
+        for df in frames
+        for docs in [_df_to_docs(df)]
+        for start in range(0, len(docs), SPLIT_TASK_DOCS)
     )
-    doc_splits = text_splitter.split_documents(docs) if docs else []
+    if workers <= 1:
+        splitter = make_splitter()
+        for task in tasks:
+            yield _split_documents(splitter, task)
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_split_worker, initargs=(make_splitter,)) as pool:
+        window: deque = deque()
+        for task in tasks:
+            window.append(pool.submit(_split_in_worker, task))
+            if len(window) >= 2 * workers:
+                yield window.popleft().result()
+        while window:
+            yield window.popleft().result()
+
+
+def iter_chunks(
+    frames: Iterable[pd.DataFrame], make_splitter: Callable[[], TextSplitter], workers: int = 1
+) -> Iterator[Document]:
+    """
+    Generator: partia wierszy → Document → chunki ze stabilnymi id; pusty korpus → jeden chunk zastępczy.
+    Dzielenie na chunki w `workers` procesach; id nadawane w procesie głównym, więc wynik nie zależy od liczby workerów.
+    """
+    seen: Counter = Counter()
+    empty = True
+    for doc_splits in _split_tasks(frames, make_splitter, workers):
+        _assign_chunk_ids(doc_splits, seen)
+        empty = empty and not doc_splits
+        yield from doc_splits
+    if empty:
+        placeholder = [Document(page_content="(brak dokumentów)", metadata={})]
+        _assign_chunk_ids(placeholder)
+        yield from placeholder
+
+
+def _drop_near_duplicates(chunks: Iterable[Document], dedup: NearDuplicateFilter) -> Iterator[Document]:
+    """Pomija chunki, które są prawie-duplikatami wcześniejszych (ten sam akapit na wielu stronach)."""
+    for d in chunks:
+        if not dedup.is_duplicate(d):
+            yield d
+
+
+def _tee_to_indexes(chunks: Iterable[Document], *writers) -> Iterator[Document]:
+    """Przekazuje chunki dalej, dopisując każdy do indeksów budowanych obok (BM25, metadane) – ta sama kolejność wierszy."""
+    for d in chunks:
+        for writer in writers:
+            writer.add([d])
+        yield d
+
+
+def _batches(items: list, size: int):
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+CHECKPOINT_MODES = ("sync", "rebuild")
+
+
+def _checkpoint_header(mode: str) -> str:
+    return f"# {EMBEDDING_MODEL} {mode}"
 
-    if not doc_splits:
-        doc_splits = [Document(page_content="(brak dokumentów)", metadata={})]
 
+def _read_checkpoint(path: str | None, mode: str | None = None) -> set[str] | None:
+    """
+    Id chunków zapisanych w magazynie wektorów przez przerwany build. None – brak checkpointu, checkpoint
+    innego modelu embeddingów albo (gdy podano `mode`) innego trybu buildu – nagłówek w pierwszej linii:
+    "# model tryb"; checkpoint bez trybu (starszy format) to "sync".
+    """
+    if not path or not os.path.isfile(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    header = lines[0] if lines else ""
+    if header == f"# {EMBEDDING_MODEL}":  # starszy format bez trybu
+        header = _checkpoint_header("sync")
+    if header not in map(_checkpoint_header, CHECKPOINT_MODES) or (mode is not None and header != _checkpoint_header(mode)):
+        return None
+    return set(lines[1:])
+
+
+def _embed_with_retry(embeddings, texts: list[str], max_retries: int, backoff_s: float) -> tuple[list[list[float]], int]:
+    """Embedding jednego batcha; błędy przejściowe ponawiane z wykładniczym backoffem. Zwraca (wektory, liczba retry)."""
+    for attempt in range(max_retries + 1):
+        try:
+            return embeddings.embed_documents(texts), attempt
+        except RETRYABLE_EMBEDDING_ERRORS as e:
+            if attempt == max_retries:
+                raise
+            delay = backoff_s * 2**attempt + random.uniform(0, backoff_s)
+            print(f"\n⚠️ {type(e).__name__} – ponowienie batcha za {delay:.1f} s ({attempt + 1}/{max_retries})")
+            time.sleep(delay)
+
+
+def embed_and_upsert(
+    vector_store: VectorStore,
+    embeddings,
+    docs: Iterable[Document],
+    batch_size: int = INDEX_EMBED_BATCH_SIZE,
+    concurrency: int = INDEX_EMBED_CONCURRENCY,
+    max_retries: int = INDEX_EMBED_MAX_RETRIES,
+    backoff_s: float = INDEX_EMBED_BACKOFF_S,
+    checkpoint_path: str | None = None,
+    embedding_store: EmbeddingStore | None = None,
+    checkpoint_mode: str = "sync",
+) -> dict:
+    """
+    Embeduje chunki batchami (do `concurrency` żądań naraz) i zapisuje każdy gotowy batch w magazynie wektorów.
+
+    `docs` może być generatorem – pobierany jest leniwie, w locie najwyżej `concurrency` batchy
+    (ograniczona pamięć przy strumieniowym buildzie). Zapis do magazynu tylko z głównego wątku.
+    Z `embedding_store` wektory znanych tekstów są brane z magazynu (zapis od razu), a brakujące chunki
+    są zbierane w pełne batche API.
+    Po każdym batchu jego id trafiają do checkpointu (append), więc przerwany build nie traci
+    zrobionej pracy. Checkpoint innego trybu (`checkpoint_mode`: "sync" / "rebuild") jest zaczynany od nowa.
+    Wypisuje postęp i chunki/s.
+    Zwraca {"embedded", "reused", "api_calls", "retries", "seconds"}.
+    """
+    total = len(docs) if hasattr(docs, "__len__") else None
+    stats = {"embedded": 0, "reused": 0, "api_calls": 0, "retries": 0, "seconds": 0.0}
+    checkpoint = None
+    if checkpoint_path:
+        os.makedirs(os.path.dirname(checkpoint_path) or ".", exist_ok=True)
+        if _read_checkpoint(checkpoint_path, checkpoint_mode) is None:
+            checkpoint = open(checkpoint_path, "w", encoding="utf-8")
+            checkpoint.write(_checkpoint_header(checkpoint_mode) + "\n")
+        else:
+            checkpoint = open(checkpoint_path, "a", encoding="utf-8")
+    start = time.perf_counter()
+
+    def write(batch: list[Document], vectors: list[list[float]], retries: int = 0) -> None:
+        vector_store.upsert(batch, vectors)
+        if checkpoint:
+            checkpoint.write("".join(f"{d.id}\n" for d in batch))
+            checkpoint.flush()
+        stats["embedded"] += len(batch)
+        stats["retries"] += retries
+        elapsed = time.perf_counter() - start
+        done = f"{stats['embedded']:,}/{total:,} chunków ({stats['embedded'] / total:.0%})" if total else f"{stats['embedded']:,} chunków"
+        print(f"\r   embedding: {done} | {stats['embedded'] / elapsed:,.1f} chunków/s", end="", flush=True)
+
+    def finish(future, batch: list[Document]) -> None:
+        vectors, retries = future.result()
+        if embedding_store is not None:
+            embedding_store.put_many([d.page_content for d in batch], vectors)
+        write(batch, vectors, retries)
+
+    def submit(executor, in_flight: dict, batch: list[Document]) -> None:
+        if len(in_flight) >= max(1, concurrency):
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                finish(future, in_flight.pop(future))
+        texts = [d.page_content for d in batch]
+        in_flight[executor.submit(_embed_with_retry, embeddings, texts, max_retries, backoff_s)] = batch
+        stats["api_calls"] += 1
+
+    docs = iter(docs)
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            in_flight: dict = {}
+            pending: list[Document] = []  # chunki spoza magazynu, zbierane w pełne batche API
+            while batch := list(islice(docs, batch_size)):
+                if embedding_store is None:
+                    submit(executor, in_flight, batch)
+                    continue
+                vectors = embedding_store.get_many([d.page_content for d in batch])
+                cached = [(d, v) for d, v in zip(batch, vectors) if v is not None]
+                if cached:
+                    write([d for d, _ in cached], [v for _, v in cached])
+                    stats["reused"] += len(cached)
+                pending += [d for d, v in zip(batch, vectors) if v is None]
+                while len(pending) >= batch_size:
+                    submit(executor, in_flight, pending[:batch_size])
+                    pending = pending[batch_size:]
+            if pending:
+                submit(executor, in_flight, pending)
+            for future in as_completed(in_flight):
+                finish(future, in_flight[future])
+    finally:
+        if checkpoint:
+            checkpoint.close()
+        if stats["embedded"]:
+            print()
+    stats["seconds"] = time.perf_counter() - start
+    return stats
+
+
+def _replace_metadata(vector_store: VectorStore, docs: list[Document]) -> None:
+    """Nowe metadane z zachowaniem zapisanego embeddingu (upsert zastępuje cały rekord)."""
+    vectors = vector_store.get_embeddings([d.id for d in docs])
+    vector_store.upsert(docs, [vectors[d.id] for d in docs])
+
+
+def _stored_hashes(vector_store: VectorStore, page_size: int = 5000) -> dict[str, str | None]:
+    """id → metadata_hash wszystkich chunków w magazynie (stronicowane, bez trzymania pełnych metadanych)."""
+    return {d.id: d.metadata.get("metadata_hash") for docs, _ in vector_store.scan(page_size) for d in docs}
+
+
+def sync_vector_store(
+    vector_store: VectorStore,
+    embeddings,
+    doc_splits: Iterable[Document],
+    batch_size: int = INDEX_EMBED_BATCH_SIZE,
+    concurrency: int = INDEX_EMBED_CONCURRENCY,
+    checkpoint_path: str | None = None,
+    embedding_store: EmbeddingStore | None = None,
+    checkpoint_mode: str = "sync",
+) -> dict:
+    """
+    Inkrementalna synchronizacja magazynu wektorów z chunkami (id z _assign_chunk_ids); `doc_splits` może być generatorem:
+    - nowe id → embedding + upsert (embed_and_upsert: batche, równolegle, retry, checkpoint),
+    - to samo id, inny metadata_hash → podmiana metadanych z zachowaniem zapisanego embeddingu,
+    - id nieobecne w nowym zbiorze → delete (po przejściu całego strumienia).
+    Zwraca {"added", "updated", "removed", "unchanged", "resumed", "reused", "api_calls", "retries", "seconds"};
+    resumed – chunki zapisane już przez przerwany build (wg checkpointu), reused – nowe chunki,
+    których wektory były już w magazynie embeddingów (`embedding_store`).
+    """
+    stored = _stored_hashes(vector_store)
+    current: set[str] = set()
+    counts = Counter()
+
+    def new_chunks() -> Iterator[Document]:
+        updated: list[Document] = []
+        for d in doc_splits:
+            current.add(d.id)
+            if d.id not in stored:
+                counts["added"] += 1
+                yield d
+            elif stored[d.id] != d.metadata["metadata_hash"]:
+                updated.append(d)
+                if len(updated) == batch_size:
+                    _replace_metadata(vector_store, updated)
+                    counts["updated"] += len(updated)
+                    updated = []
+            else:
+                counts["unchanged"] += 1
+        if updated:
+            _replace_metadata(vector_store, updated)
+            counts["updated"] += len(updated)
+
+    embed_stats = embed_and_upsert(
+        vector_store,
+        embeddings,
+        new_chunks(),
+        batch_size=batch_size,
+        concurrency=concurrency,
+        checkpoint_path=checkpoint_path,
+        embedding_store=embedding_store,
+        checkpoint_mode=checkpoint_mode,
+    )
+    removed = [i for i in stored if i not in current]
+    for ids in _batches(removed, batch_size):
+        vector_store.delete(ids)
+    return {
+        "added": counts["added"],
+        "updated": counts["updated"],
+        "removed": len(removed),
+        "unchanged": counts["unchanged"],
+        "resumed": len((_read_checkpoint(checkpoint_path, checkpoint_mode) or set()) & current & stored.keys()),
+        "reused": embed_stats["reused"],
+        "api_calls": embed_stats["api_calls"],
+        "retries": embed_stats["retries"],
+        "seconds": embed_stats["seconds"],
+    }
+
+
+def export_vector_index(
+    vector_store: VectorStore, directory: str, dtype: str = VECTOR_INDEX_DTYPE, page_size: int = 2048
+) -> VectorIndex:
+    """
+    Eksportuje embeddingi, treść i metadane chunków z magazynu wektorów do indeksu NumPy (vector_index.py).
+    Stronicowany scan → macierz zapisywana od razu na dysk, w pamięci jedna strona.
+    """
+    count = vector_store.count()
+    writer = None
+    for docs, vectors in vector_store.scan(page_size, include_embeddings=True):
+        if writer is None:
+            writer = VectorIndexWriter(directory, count, len(vectors[0]), dtype)
+        writer.add(docs, vectors)
+    if writer is None:  # pusty magazyn
+        writer = VectorIndexWriter(directory, 0, 0, dtype)
+    return writer.finish()
+
+
+def _prepare_rebuild(
+    checkpoint_path: str = INDEX_CHECKPOINT_PATH,
+    directories: tuple[str, ...] = (CHROMA_DIR, LEXICAL_INDEX_DIR, VECTOR_INDEX_DIR),
+) -> bool:
+    """
+    REBUILD_INDEX=1: czyści indeks, chyba że istnieje checkpoint przerwanego rebuildu (wtedy wznawia go – True).
+    Checkpoint przerwanej synchronizacji inkrementalnej jest usuwany – indeks z tej synchronizacji nie jest
+    stanem pośrednim rebuildu, więc wymuszona przebudowa musi zacząć od zera.
+    """
+    if _read_checkpoint(checkpoint_path, "rebuild"):
+        print("⏯️ Znaleziono checkpoint przerwanego rebuildu — wznawianie bez czyszczenia indeksu...")
+        return True
+    if os.path.isfile(checkpoint_path):
+        os.remove(checkpoint_path)
+        print("🗑️ Usunięto checkpoint przerwanej synchronizacji inkrementalnej")
+    for directory in directories:
+        if os.path.isdir(directory):
+            shutil.rmtree(directory)
+    print("🔄 REBUILD_INDEX=1 — usunięto stary indeks, budowanie od zera...")
+    return False
+
+
+def build_index():
+    """
+    Buduje / aktualizuje magazyn wektorów (VECTOR_BACKEND, domyślnie Chroma w CHROMA_DIR), indeks BM25
+    (LEXICAL_INDEX_DIR) i indeks tags/keywords/aliases (METADATA_INDEX_PATH) z dokumentacji Docker.
+
+    Domyślnie inkrementalnie: embedowane są tylko nowe lub zmienione chunki, usunięte znikają z magazynu.
+    Wektory chunków o znanej treści są brane z magazynu embeddingów (INDEX_EMBEDDING_STORE_PATH),
+    więc pełna przebudowa nie płaci ponownie za tekst już raz zembedowany tym modelem.
+    Z VECTOR_BACKEND="numpy" build zapisuje do Chroma, a embeddingi są dodatkowo eksportowane
+    do VECTOR_INDEX_DIR (vector_index.py).
+    Chunki niosą sygnaturę MinHash (deduplikacja prawie-duplikatów w retrieval); z INDEX_DROP_NEAR_DUPLICATES=1
+    prawie-duplikaty są pomijane już przy budowie.
+    REBUILD_INDEX=1 – usuwa stary indeks i buduje od zera (_prepare_rebuild). Przerwany build (checkpoint
+    w INDEX_CHECKPOINT_PATH) jest wznawiany; z REBUILD_INDEX=1 bez czyszczenia indeksu tylko wtedy, gdy
+    przerwany był również build z REBUILD_INDEX=1 (tryb zapisany w nagłówku checkpointu).
+    Brak pliku parquet albo plik bez wierszy → błąd (_source_parquet) przed jakąkolwiek zmianą indeksu.
+    """
+    source = _source_parquet()
+    force_rebuild = os.environ.get("REBUILD_INDEX", "").lower() in ("1", "true", "yes")
+    if force_rebuild:
+        _prepare_rebuild()
+
+    make_splitter = partial(
+        RecursiveCharacterTextSplitter.from_tiktoken_encoder, encoding_name=TIKTOKEN_ENCODING, chunk_size=400, chunk_overlap=100
+    )
     embeddings = OpenAIEmbeddings(
         model=EMBEDDING_MODEL,
         api_key=OPENROUTER_API_KEY,
         base_url=OPENROUTER_BASE_URL,
+        chunk_size=INDEX_EMBED_BATCH_SIZE,  # batch embed_and_upsert = jedno żądanie do API
     )
-    os.makedirs(os.path.dirname(CHROMA_DIR) or ".", exist_ok=True)
-    Chroma.from_documents(
-        doc_splits,
+    vector_store = open_vector_store(VECTOR_BACKEND, writable=True)
+
+    # Strumień: parquet (record batches) → Document → chunki → BM25 + metadane (dopisywanie) → embedding + upsert.
+    # Wspólne id chunka w magazynie wektorów i BM25 – post_retrieval pobiera embeddingi po id (MMR)
+    lexical = LexicalIndexWriter(LEXICAL_INDEX_DIR)
+    metadata = MetadataIndexWriter(METADATA_INDEX_PATH)
+    chunks = iter_chunks(iter_parquet_frames(source), make_splitter, workers=INDEX_SPLIT_WORKERS)
+    dedup = NearDuplicateFilter(NEAR_DUPLICATE_THRESHOLD) if INDEX_DROP_NEAR_DUPLICATES else None
+    if dedup is not None:
+        chunks = _drop_near_duplicates(chunks, dedup)
+    store = EmbeddingStore(INDEX_EMBEDDING_STORE_PATH, EMBEDDING_MODEL) if INDEX_EMBEDDING_STORE_ENABLED else None
+    summary = sync_vector_store(
+        vector_store,
         embeddings,
-        collection_name=COLLECTION_NAME,
-        persist_directory=CHROMA_DIR,
+        _tee_to_indexes(chunks, lexical, metadata),
+        checkpoint_path=INDEX_CHECKPOINT_PATH,
+        embedding_store=store,
+        checkpoint_mode="rebuild" if force_rebuild else "sync",
+    )
+    lexical.finish()
+    metadata_index = metadata.finish()
+    total = len(lexical)
+    print(f"✅ Magazyn wektorów ({type(vector_store).__name__}) zsynchronizowany: {total:,} chunków")
+    print(
+        f"   dodane: {summary['added']:,} | zaktualizowane: {summary['updated']:,} | "
+        f"usunięte: {summary['removed']:,} | bez zmian: {summary['unchanged']:,}"
+        + (f" (w tym {summary['resumed']:,} z przerwanego buildu)" if summary["resumed"] else "")
+    )
+    saved_calls = math.ceil(total / INDEX_EMBED_BATCH_SIZE) - summary["api_calls"]
+    throughput = summary["added"] / summary["seconds"] if summary["seconds"] else 0.0
+    print(
+        f"   embedding: {summary['added']:,} chunków, {summary['api_calls']} wywołań API "
+        f"(retry: {summary['retries']}), {throughput:,.1f} chunków/s; "
+        f"zaoszczędzono {total - summary['added']:,} chunków (~{saved_calls} wywołań API)"
     )
-    print(f"✅ Indeks Chroma zbudowany: {len(doc_splits):,} chunków → {CHROMA_DIR}")
+    if store is not None:
+        print(
+            f"   magazyn embeddingów: {summary['reused']:,} wektorów użytych ponownie, "
+            f"{summary['added'] - summary['reused']:,} nowych → {INDEX_EMBEDDING_STORE_PATH}"
+        )
+    if dedup is not None:
+        print(f"   pominięte prawie-duplikaty (MinHash ≥ {NEAR_DUPLICATE_THRESHOLD}): {dedup.dropped:,} chunków")
+    print(f"✅ Indeks BM25 zbudowany: {total:,} chunków → {LEXICAL_INDEX_DIR}")
+    values = ", ".join(f"{field}: {len(metadata_index.value_counts(field)):,}" for field in metadata_index.fields)
+    print(f"✅ Indeks metadanych zbudowany ({values} wartości) → {METADATA_INDEX_PATH}")
+    changed = summary["added"] or summary["updated"] or summary["removed"] or summary["resumed"]
+    if VECTOR_BACKEND == "numpy" and (changed or VectorIndex.load(VECTOR_INDEX_DIR) is None):
+        vector_index = export_vector_index(vector_store, VECTOR_INDEX_DIR)
+        disk_mb = vector_index.matrix.size * np.dtype(vector_index.dtype).itemsize / 2**20
+        print(
+            f"✅ Indeks NumPy ({vector_index.dtype}, {disk_mb:,.1f} MB na dysku, "
+            f"{vector_index.matrix.nbytes / 2**20:,.1f} MB float32 w pamięci) wyeksportowany: {len(vector_index):,} chunków → {VECTOR_INDEX_DIR}"
+        )
+    if changed or not os.path.isfile(INDEX_VERSION_PATH):
+        _write_index_version()
+    if os.path.isfile(INDEX_CHECKPOINT_PATH):
+        os.remove(INDEX_CHECKPOINT_PATH)
+
+
+def _write_index_version():
+    """Zapisuje nową wersję indeksu – semantyczny cache odpowiedzi unieważnia wpisy ze starej wersji."""
+    os.makedirs(os.path.dirname(INDEX_VERSION_PATH), exist_ok=True)
+    with open(INDEX_VERSION_PATH, "w", encoding="utf-8") as f:
+        f.write(uuid.uuid4().hex)
 
 
 if __name__ == "__main__":
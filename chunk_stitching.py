@@ -0,0 +1,105 @@
+"""
+Sklejanie sąsiednich chunków jednego dokumentu przed składaniem kontekstu (post_retrieval).
+
+build_index zapisuje w metadanych chunka source_id (dokument źródłowy), chunk_index (numer chunka
+w dokumencie) i next_chunk_id (id następnego chunka). Kolejne chunki tego samego dokumentu wśród
+wybranych łączone są w jeden blok, a nakładka splittera (chunk_overlap) występuje w nim raz. Luka
+jednego chunka między wybranymi (i, i + 2) może być uzupełniona środkowym chunkiem pobranym po id
+(`fetch`, np. retriever.get_chunks). Sklejony blok zajmuje miejsce najwyżej ocenionego chunka
+z serii. Chunki bez metadanych pozycji (indeks sprzed zmiany) przechodzą bez zmian.
+"""
+
+from collections.abc import Callable
+
+from langchain_core.documents import Document
+
+# Krótsza wspólna końcówka to przypadek, nie nakładka splittera (chunk_overlap=100 tokenów ≈ 400 znaków)
+MIN_OVERLAP_CHARS = 16
+
+
+def merge_overlapping(previous: str, following: str) -> tuple[str, int]:
+    """
+    Łączy tekst dwóch kolejnych chunków: najdłuższy sufiks `previous` będący prefiksem `following`
+    występuje raz (nakładka co najmniej MIN_OVERLAP_CHARS znaków). Zwraca (tekst, liczba usuniętych znaków);
+    bez nakładki – złączenie nową linią.
+    """
+    probe = following[:MIN_OVERLAP_CHARS]
+    start = previous.find(probe) if probe else -1
+    while start != -1:
+        overlap = len(previous) - start
+        if following.startswith(previous[start:]):
+            return previous + following[overlap:], overlap
+        start = previous.find(probe, start + 1)
+    return f"{previous}\n{following}", 0
+
+
+def _position(doc: Document) -> tuple[str, int] | None:
+    source_id, index = doc.metadata.get("source_id"), doc.metadata.get("chunk_index")
+    if source_id is None or not isinstance(index, int):
+        return None
+    return source_id, index
+
+
+def _fill_gaps(run: list[Document], fetch: Callable[[list[str]], list[Document]], stats: dict) -> list[Document]:
+    """Uzupełnia luki jednego chunka (i, i + 2) chunkami pobranymi po next_chunk_id."""
+    wanted = {
+        prev.metadata["next_chunk_id"]: prev
+        for prev, following in zip(run, run[1:])
+        if following.metadata["chunk_index"] == prev.metadata["chunk_index"] + 2 and prev.metadata.get("next_chunk_id")
+    }
+    if not wanted:
+        return run
+    for middle in fetch(list(wanted)):
+        prev = wanted.get(middle.id)
+        if prev is not None and _position(middle) == (prev.metadata["source_id"], prev.metadata["chunk_index"] + 1):
+            run.append(middle)
+            stats["fetched"] += 1
+    return sorted(run, key=lambda d: d.metadata["chunk_index"])
+
+
+def stitch_adjacent(
+    docs: list[Document], fetch: Callable[[list[str]], list[Document]] | None = None
+) -> tuple[list[Document], dict]:
+    """
+    Chunki w kolejności rankingu → bloki (sklejone serie kolejnych chunków) w kolejności rankingu.
+    Statystyki: stitched (chunki dołączone do poprzednika), fetched (dobrane środkowe chunki),
+    overlap_chars (usunięte powtórzone znaki).
+    """
+    stats = {"stitched": 0, "fetched": 0, "overlap_chars": 0}
+    groups: dict[str, list[Document]] = {}
+    for doc in docs:
+        position = _position(doc)
+        if position is not None:
+            groups.setdefault(position[0], []).append(doc)
+    if all(len(group) < 2 for group in groups.values()):
+        return docs, stats
+
+    rank = {id(doc): i for i, doc in enumerate(docs)}
+    blocks: list[tuple[int, Document]] = []
+    for doc in docs:
+        if _position(doc) is None:
+            blocks.append((rank[id(doc)], doc))
+    for group in groups.values():
+        group = sorted(group, key=lambda d: d.metadata["chunk_index"])
+        if fetch is not None and len(group) > 1:
+            group = _fill_gaps(group, fetch, stats)
+        run = [group[0]]
+        for doc in group[1:] + [None]:
+            if doc is not None and doc.metadata["chunk_index"] == run[-1].metadata["chunk_index"] + 1:
+                run.append(doc)
+                continue
+            blocks.append((min(rank.get(id(d), len(docs)) for d in run), _stitch_run(run, stats)))
+            run = [doc]
+    return [doc for _, doc in sorted(blocks, key=lambda block: block[0])], stats
+
+
+def _stitch_run(run: list[Document], stats: dict) -> Document:
+    if len(run) == 1:
+        return run[0]
+    text = run[0].page_content
+    for doc in run[1:]:
+        text, overlap = merge_overlapping(text, doc.page_content)
+        stats["overlap_chars"] += overlap
+    stats["stitched"] += len(run) - 1
+    metadata = dict(run[0].metadata, stitched_chunks=len(run))
+    return Document(id=run[0].id, page_content=text, metadata=metadata)
@@ -7,7 +7,42 @@ from dotenv import load_dotenv
 load_dotenv(override=True)
 
 CHROMA_DIR = os.path.join(os.path.dirname(__file__), "chroma")
+# Wersja indeksu (zapisywana przez build_index.py) – zmiana unieważnia semantyczny cache odpowiedzi
+INDEX_VERSION_PATH = os.path.join(CHROMA_DIR, "index_version.txt")
+# Indeks leksykalny BM25 (hybrid retrieval) – budowany razem z Chroma w build_index.py
+LEXICAL_INDEX_DIR = os.path.join(os.path.dirname(__file__), "lexical_index")
+# Odwrócony indeks tags/keywords/aliases (metadata_index.py) – pre-filtr kandydatów; wiersze jak w indeksie BM25
+METADATA_INDEX_PATH = os.path.join(LEXICAL_INDEX_DIR, "metadata.npz")
 COLLECTION_NAME = "docker_docs_rag"
+# Backend magazynu wektorów (vector_store.py) dla build_index i retrievera:
+# "chroma" (kolekcja w CHROMA_DIR), "numpy" (vector_index.py – macierz embeddingów eksportowana z Chroma
+# przez build_index, memmap, iloczyn macierz × wektor w procesie), "memory" (w pamięci procesu – testy, benchmarki)
+VECTOR_BACKEND = os.environ.get("VECTOR_BACKEND", "chroma").lower()
+VECTOR_INDEX_DIR = os.path.join(os.path.dirname(__file__), "vector_index")
+# Typ macierzy na dysku: "int8" (1 B/wymiar, skala na wiersz) albo "float16" (2 B/wymiar, pełny recall);
+# przy otwarciu dekwantyzowana do float32 w pamięci
+VECTOR_INDEX_DTYPE = os.environ.get("VECTOR_INDEX_DTYPE", "int8")
+
+# build_index.py: parquet czytany strumieniowo partiami wierszy (pyarrow record batches) – pamięć nie zależy od rozmiaru pliku, rośnie z liczbą chunków
+INDEX_PARQUET_BATCH_ROWS = int(os.environ.get("INDEX_PARQUET_BATCH_ROWS", "1000"))
+# Kodowanie tiktoken wspólne dla splittera chunków (build_index.py) i budżetu kontekstu (context_builder.py)
+TIKTOKEN_ENCODING = "gpt2"  # domyślne w RecursiveCharacterTextSplitter.from_tiktoken_encoder
+# build_index.py: procesy dzielące dokumenty na chunki (liczenie tokenów tiktoken); 1 = w procesie głównym
+INDEX_SPLIT_WORKERS = int(os.environ.get("INDEX_SPLIT_WORKERS", str(os.cpu_count() or 1)))
+# build_index.py: embedding chunków w batchach (1 batch = 1 wywołanie API), równolegle, z retry i checkpointem
+INDEX_EMBED_BATCH_SIZE = int(os.environ.get("INDEX_EMBED_BATCH_SIZE", "256"))
+INDEX_EMBED_CONCURRENCY = int(os.environ.get("INDEX_EMBED_CONCURRENCY", "4"))
+INDEX_EMBED_MAX_RETRIES = 5
+INDEX_EMBED_BACKOFF_S = 1.0  # opóźnienie bazowe: 1 s, 2 s, 4 s, ... (+ jitter)
+# Magazyn embeddingów chunków po hashu (model + tekst) – współdzielony przez przebudowy i eksperymenty
+INDEX_EMBEDDING_STORE_ENABLED = os.environ.get("INDEX_EMBEDDING_STORE", "1").lower() not in ("0", "false", "no")
+INDEX_EMBEDDING_STORE_PATH = os.path.join(os.path.dirname(__file__), "cache", "chunk_embeddings.sqlite")
+# Prawie-duplikaty chunków (near_duplicates.py): sygnatura MinHash w metadanych chunka, próg = szacowane
+# podobieństwo Jaccarda shingli (3 tokeny); retrieval scala kandydatów powyżej progu, build może je pomijać
+NEAR_DUPLICATE_THRESHOLD = float(os.environ.get("NEAR_DUPLICATE_THRESHOLD", "0.8"))
+INDEX_DROP_NEAR_DUPLICATES = os.environ.get("INDEX_DROP_NEAR_DUPLICATES", "").lower() in ("1", "true", "yes")
+# Id chunków już zapisanych w magazynie wektorów – przerwany build (także REBUILD_INDEX=1) wznawia od tego miejsca
+INDEX_CHECKPOINT_PATH = os.path.join(CHROMA_DIR, "build_checkpoint.txt")
 
 # OpenRouter (https://openrouter.ai) – API key i base URL z .env
 OPENROUTER_API_KEY = os.environ.get("OPENROUTER_API_KEY")
@@ -19,5 +54,51 @@ GRADER_LLM_MODEL = "openai/gpt-5.2"
 # Embeddingi: OpenAI działa przez OpenRouter. Qwen3-embedding powodował "No embedding data received".
 EMBEDDING_MODEL = "openai/text-embedding-3-small"
 
+# route_query: DIRECT (odpowiedź bez dokumentacji) vs RAG – lokalnie (reguły słów kluczowych, potem najbliższy
+# centroid embeddingów przykładowych pytań, query_router.py); LLM tylko gdy różnica podobieństw < margines.
+# Domyślnie wyłączony – margines trzeba skalibrować dla modelu embeddingów:
+# python benchmarks/bench_query_router.py --calibrate
+QUERY_ROUTING_ENABLED = os.environ.get("QUERY_ROUTING", "0").lower() not in ("0", "false", "no")
+ROUTER_CENTROID_MARGIN = float(os.environ.get("ROUTER_CENTROID_MARGIN", "0.04"))
+
+# pre_retrieval: wyszukiwanie hybrydowe dla oryginalnego zapytania równolegle z ekspansją (LLM), wyniki dołączane
+# w retrieval; ekspansja pomijana, gdy najlepszy chunk dense ma podobieństwo cosinusowe ≥ SPECULATIVE_SKIP_SIMILARITY
+# i znajduje go też BM25
+SPECULATIVE_RETRIEVAL_ENABLED = os.environ.get("SPECULATIVE_RETRIEVAL", "1").lower() not in ("0", "false", "no")
+SPECULATIVE_SKIP_SIMILARITY = float(os.environ.get("SPECULATIVE_SKIP_SIMILARITY", "0.7"))
+
 # Retrieval: orchestrator–workers – liczba równoległych workerów (max = liczba expanded queries, zazwyczaj 1–3)
 RETRIEVAL_MAX_WORKERS = 3
+# ask_many(): maks. liczba równolegle wykonywanych grafów w batchu
+ASK_MANY_MAX_CONCURRENCY = 8
+
+# Post-retrieval: MMR (Maximal Marginal Relevance) na zapisanych embeddingach chunków
+# λ=1.0 → tylko relewancja (RRF), λ=0.0 → tylko różnorodność; MMR_TOP_K – liczba wybranych chunków
+MMR_ENABLED = True
+MMR_LAMBDA = 0.7
+MMR_TOP_K = 8
+
+# post_retrieval: budżet tokenów kontekstu dla generate – chunki wg rankingu do wyczerpania budżetu,
+# ostatni przycinany na granicy zdań (context_builder.py); liczba użytych tokenów trafia do trace
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "1500"))
+# post_retrieval: kolejne chunki jednego dokumentu sklejane w jeden blok bez powtórzonej nakładki (chunk_stitching.py);
+# CONTEXT_STITCH_FETCH_MIDDLE – brakujący środkowy chunk (wybrane i oraz i + 2) pobierany po id z magazynu wektorów
+CONTEXT_STITCH_ENABLED = os.environ.get("CONTEXT_STITCH", "1").lower() not in ("0", "false", "no")
+CONTEXT_STITCH_FETCH_MIDDLE = os.environ.get("CONTEXT_STITCH_FETCH_MIDDLE", "1").lower() not in ("0", "false", "no")
+# Opcjonalna kompresja ekstrakcyjna chunków przed generate (context_compression.py, bez LLM): zostają zdania
+# i bloki kodu z score ≥ CONTEXT_COMPRESSION_MIN_SCORE × najlepszy score w chunku (pokrycie termów zapytania, IDF z BM25)
+CONTEXT_COMPRESSION_ENABLED = os.environ.get("CONTEXT_COMPRESSION", "").lower() in ("1", "true", "yes")
+CONTEXT_COMPRESSION_MIN_SCORE = 0.5
+
+# Cache embeddingów zapytań (LRU w pamięci + SQLite na dysku); zmiana EMBEDDING_MODEL unieważnia cache
+EMBEDDING_CACHE_ENABLED = os.environ.get("EMBEDDING_CACHE", "1").lower() not in ("0", "false", "no")
+EMBEDDING_CACHE_PATH = os.path.join(os.path.dirname(__file__), "cache", "query_embeddings.sqlite")
+EMBEDDING_CACHE_MEMORY_ITEMS = 2048
+EMBEDDING_CACHE_DISK_ITEMS = 100_000
+
+# Semantyczny cache odpowiedzi przed ask() (opt-in: SEMANTIC_CACHE=1 lub ask(..., use_cache=True))
+SEMANTIC_CACHE_ENABLED = os.environ.get("SEMANTIC_CACHE", "").lower() in ("1", "true", "yes")
+SEMANTIC_CACHE_PATH = os.path.join(os.path.dirname(__file__), "cache", "semantic_answers.sqlite")
+SEMANTIC_CACHE_THRESHOLD = 0.92  # minimalne podobieństwo cosinusowe zapytań
+SEMANTIC_CACHE_TTL_S = 7 * 24 * 3600
+SEMANTIC_CACHE_MAX_ENTRIES = 1000
@@ -0,0 +1,128 @@
+"""
+Składanie kontekstu dla generate w budżecie tokenów (post_retrieval).
+
+Chunki dokładane są w kolejności rankingu (RRF + MMR), dopóki mieszczą się w budżecie; ostatni, który
+się nie mieści, jest przycinany na granicy zdań (albo pomijany, gdy zostało mniej niż
+MIN_TRIMMED_TOKENS). Pierwszy chunk bez granicy zdania w budżecie (długi blok kodu, sklejony blok)
+jest cięty twardo na granicy tokenów – wybrane chunki nigdy nie dają pustego kontekstu. Tokeny liczy ten sam enkoder tiktoken, którym build_index dzieli dokumenty
+na chunki (TIKTOKEN_ENCODING). Enkoder można wstrzyknąć (testy, inne modele) – wystarczy obiekt
+z metodą encode(text) → lista tokenów.
+"""
+
+import re
+import threading
+
+from langchain_core.documents import Document
+
+from config import TIKTOKEN_ENCODING
+
+BLOCK_SEPARATOR = "\n\n---\n\n"
+# Mniej wolnego budżetu nie opłaca się zapełniać urywkiem chunka
+MIN_TRIMMED_TOKENS = 32
+# Granice zdań: po . ! ? przed białym znakiem oraz przed pustą linią (akapity, bloki kodu)
+_SENTENCE_RE = re.compile(r"(?<=[.!?])(?=\s)|(?=\n\s*\n)")
+
+_encoder_lock = threading.Lock()
+_encoder = None
+
+
+class ApproximateEncoder:
+    """Zastępczy licznik (~4 znaki na token), gdy kodowania tiktoken nie da się wczytać (np. offline)."""
+
+    def encode(self, text: str) -> list[int]:
+        return [0] * ((len(text) + 3) // 4)
+
+
+def get_encoder():
+    """Współdzielony enkoder tiktoken (TIKTOKEN_ENCODING, ładowany raz na proces); bez tiktoken – ApproximateEncoder."""
+    global _encoder
+    if _encoder is None:
+        with _encoder_lock:
+            if _encoder is None:
+                try:
+                    import tiktoken
+
+                    _encoder = tiktoken.get_encoding(TIKTOKEN_ENCODING)
+                except Exception as exc:  # brak pakietu albo pliku kodowania (pobierany z sieci przy pierwszym użyciu)
+                    print(f"[context_builder] tiktoken {TIKTOKEN_ENCODING!r} niedostępny ({type(exc).__name__}) – przybliżone liczenie tokenów")
+                    _encoder = ApproximateEncoder()
+    return _encoder
+
+
+def count_tokens(text: str, encoder=None) -> int:
+    return len((encoder or get_encoder()).encode(text))
+
+
+def format_block(index: int, doc: Document, content: str | None = None) -> str:
+    """Blok kontekstu: numer, tytuł źródła i treść chunka."""
+    return f"[{index}] (from: {doc.metadata.get('title', '?')})\n{doc.page_content if content is None else content}"
+
+
+def trim_to_sentences(text: str, max_tokens: int, encoder=None) -> str:
+    """Najdłuższy początek tekstu złożony z całych zdań, który mieści się w max_tokens ("" gdy nie mieści się nic)."""
+    encoder = encoder or get_encoder()
+    kept, used = [], 0
+    for piece in _SENTENCE_RE.split(text):
+        tokens = len(encoder.encode(piece))
+        if used + tokens > max_tokens:
+            break
+        kept.append(piece)
+        used += tokens
+    return "".join(kept).rstrip()
+
+
+def cut_to_tokens(text: str, max_tokens: int, encoder=None) -> str:
+    """
+    Początek tekstu o najwyżej max_tokens tokenach, bez względu na granice zdań: encode → decode
+    (tiktoken); enkoder bez decode – najdłuższy prefiks znaków mieszczący się w budżecie (bisekcja).
+    """
+    encoder = encoder or get_encoder()
+    if max_tokens <= 0:
+        return ""
+    if hasattr(encoder, "decode"):
+        return encoder.decode(encoder.encode(text)[:max_tokens]).rstrip()
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if len(encoder.encode(text[:middle])) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return text[:low].rstrip()
+
+
+def build_context(docs: list[Document], budget: int, encoder=None) -> tuple[str, dict]:
+    """
+    Kontekst z chunków w kolejności rankingu, najwyżej `budget` tokenów; pierwszy chunk bez granicy zdania
+    w budżecie – cięty twardo (cut_to_tokens). Zwraca (kontekst, statystyki: chunks, tokens, budget, trimmed, dropped).
+    """
+    encoder = encoder or get_encoder()
+    blocks: list[str] = []
+    used = 0
+    trimmed = False
+    for doc in docs:
+        separator = BLOCK_SEPARATOR if blocks else ""
+        block = format_block(len(blocks) + 1, doc)
+        tokens = len(encoder.encode(separator + block))
+        if used + tokens <= budget:
+            blocks.append(block)
+            used += tokens
+            continue
+        header_tokens = len(encoder.encode(separator + format_block(len(blocks) + 1, doc, "")))
+        room = budget - used - header_tokens
+        if room >= MIN_TRIMMED_TOKENS or not blocks:
+            content = trim_to_sentences(doc.page_content, room, encoder)
+            if not content and not blocks:
+                content = cut_to_tokens(doc.page_content, room, encoder)
+            if content:
+                blocks.append(format_block(len(blocks) + 1, doc, content))
+                trimmed = True
+        break
+    context = BLOCK_SEPARATOR.join(blocks)
+    return context, {
+        "chunks": len(blocks),
+        "tokens": len(encoder.encode(context)),
+        "budget": budget,
+        "trimmed": trimmed,
+        "dropped": len(docs) - len(blocks),
+    }
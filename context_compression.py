@@ -0,0 +1,112 @@
+"""
+Ekstrakcyjna kompresja chunków przed generate – bez wywołań LLM.
+
+Chunk dzielony jest na jednostki: bloki kodu (```...```, także niedomknięte na końcu chunka) w całości
+oraz zdania kolejnych linii; front-matter YAML na początku chunka jest odrzucany. Jednostka dostaje score
+z pokrycia termów zapytania (oryginalnego i expanded) – suma wag termów wspólnych, waga = IDF z indeksu
+BM25 (retriever.get_term_weights; bez indeksu 1.0), więc "docker" waży mniej niż "--network".
+Zostają jednostki z score ≥ min_score_ratio × najlepszy score w chunku, bloki kodu bezpośrednio po
+zachowanym zdaniu i zdanie bezpośrednio przed zachowanym blokiem kodu (komenda + jej opis).
+Chunk bez żadnego wspólnego termu (trafiony semantycznie przez dense) zachowuje początkowe zdania
+(linie krótsze niż MIN_FALLBACK_WORDS słów – nawigacja, nagłówki – są pomijane).
+Kolejność jednostek jest zachowana, pominięte fragmenty oznacza "…".
+"""
+
+import re
+
+from langchain_core.documents import Document
+
+from lexical_index import tokenize
+
+GAP_MARKER = "…"
+# Jednostek zachowywanych z chunka bez wspólnych termów z zapytaniem (tylko zdania z co najmniej MIN_FALLBACK_WORDS słowami)
+FALLBACK_UNITS = 2
+MIN_FALLBACK_WORDS = 5
+# Słowa pytające / funkcyjne – bez IDF z indeksu pasowałyby do prawie każdego zdania
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it my of on or should the this to what when "
+    "where which why will with you your".split()
+)
+
+_FRONT_MATTER_RE = re.compile(r"\A\s*---\n.*?\n---\s*\n", re.S)
+_CODE_RE = re.compile(r"```.*?(?:```|\Z)", re.S)
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+(?=[A-Z`\"'(\[])")
+
+
+def query_terms(queries: list[str]) -> set[str]:
+    """Termy zapytań (tokenizacja BM25) bez słów funkcyjnych."""
+    return {t for q in queries for t in tokenize(q) if t not in STOPWORDS}
+
+
+def split_units(text: str) -> list[tuple[str, bool]]:
+    """Chunk → jednostki (tekst, czy blok kodu) w kolejności; front-matter pominięty."""
+    text = _FRONT_MATTER_RE.sub("", text, count=1)
+    units: list[tuple[str, bool]] = []
+    pos = 0
+    for match in _CODE_RE.finditer(text):
+        units += _prose_units(text[pos : match.start()])
+        units.append((match.group().strip(), True))
+        pos = match.end()
+    units += _prose_units(text[pos:])
+    return units
+
+
+def _prose_units(text: str) -> list[tuple[str, bool]]:
+    return [
+        (sentence.strip(), False)
+        for line in text.splitlines()
+        for sentence in _SENTENCE_RE.split(line)
+        if sentence.strip()
+    ]
+
+
+def compress_text(
+    text: str, terms: set[str], weights: dict[str, float] | None = None, min_score_ratio: float = 0.5
+) -> tuple[str, int, int]:
+    """Zachowane jednostki chunka połączone w tekst; zwraca (tekst, jednostek zachowanych, jednostek razem)."""
+    units = split_units(text)
+    if not units:
+        return "", 0, 0
+    weights = weights or {}
+    scores = [sum(weights.get(t, 1.0) for t in terms.intersection(tokenize(unit))) for unit, _ in units]
+    best = max(scores)
+    if best <= 0:
+        prose = [i for i, (unit, is_code) in enumerate(units) if not is_code and len(tokenize(unit)) >= MIN_FALLBACK_WORDS]
+        keep = set(prose[:FALLBACK_UNITS])
+    else:
+        keep = {i for i, score in enumerate(scores) if score >= min_score_ratio * best}
+        for i in sorted(keep):
+            is_code = units[i][1]
+            if not is_code and i + 1 < len(units) and units[i + 1][1]:
+                keep.add(i + 1)  # przykład (kod) po zachowanym zdaniu
+            if is_code and i > 0 and not units[i - 1][1]:
+                keep.add(i - 1)  # zdanie wprowadzające do zachowanego kodu
+    parts: list[str] = []
+    previous = -1
+    for i in sorted(keep):
+        if i > previous + 1:
+            parts.append(GAP_MARKER)
+        parts.append(units[i][0])
+        previous = i
+    if previous < len(units) - 1:
+        parts.append(GAP_MARKER)
+    return "\n".join(parts), len(keep), len(units)
+
+
+def compress_documents(
+    docs: list[Document], queries: list[str], weights: dict[str, float] | None = None, min_score_ratio: float = 0.5
+) -> tuple[list[Document], dict]:
+    """Kompresja każdego chunka (nowe Document z tym samym id i metadanymi); statystyki: units, kept_units, chars_before, chars_after."""
+    terms = query_terms(queries)
+    compressed, kept_total, units_total = [], 0, 0
+    for doc in docs:
+        text, kept, units = compress_text(doc.page_content, terms, weights, min_score_ratio)
+        kept_total += kept
+        units_total += units
+        compressed.append(Document(id=doc.id, page_content=text, metadata=doc.metadata))
+    return compressed, {
+        "units": units_total,
+        "kept_units": kept_total,
+        "chars_before": sum(len(d.page_content) for d in docs),
+        "chars_after": sum(len(d.page_content) for d in compressed),
+    }
@@ -0,0 +1,174 @@
+"""
+Cache embeddingów zapytań: LRU w pamięci przed trwałym magazynem SQLite.
+
+Klucz = hash(model + znormalizowany tekst). Zmiana EMBEDDING_MODEL automatycznie
+unieważnia cache (wpisy innego modelu są usuwane przy otwarciu bazy).
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+def normalize_text(text: str) -> str:
+    """Normalizacja klucza: trim + zwinięcie białych znaków (wielkość liter bez zmian – wpływa na embedding)."""
+    return " ".join(text.split())
+
+
+def cache_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Dwupoziomowy cache wektorów: OrderedDict (LRU) + SQLite (LRU po last_used). Thread-safe."""
+
+    def __init__(self, path: str, model: str, max_memory_items: int = 2048, max_disk_items: int = 100_000):
+        self.path = path
+        self.model = model
+        self.max_memory_items = max_memory_items
+        self.max_disk_items = max_disk_items
+        self.hits = 0
+        self.misses = 0
+        self._memory: OrderedDict[str, list[float]] = OrderedDict()
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._init_db()
+
+    def _init_db(self) -> None:
+        with self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'model'").fetchone()
+            if row is None or row[0] != self.model:
+                self._conn.execute("DELETE FROM embeddings")
+                self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('model', ?)", (self.model,))
+
+    def _remember(self, key: str, vector: list[float]) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def get_many(self, texts: list[str]) -> list[list[float] | None]:
+        """Zwraca wektory z cache (None dla brakujących). Aktualizuje liczniki hit/miss."""
+        keys = [cache_key(self.model, t) for t in texts]
+        result: list[list[float] | None] = [None] * len(texts)
+        with self._lock:
+            missing: dict[str, list[int]] = {}
+            for i, key in enumerate(keys):
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    result[i] = self._memory[key]
+                else:
+                    missing.setdefault(key, []).append(i)
+            if missing:
+                placeholders = ",".join("?" * len(missing))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", list(missing)
+                ).fetchall()
+                now = time.time()
+                with self._conn:
+                    self._conn.executemany(
+                        "UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, key) for key, _ in rows]
+                    )
+                for key, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32).tolist()
+                    self._remember(key, vector)
+                    for i in missing[key]:
+                        result[i] = vector
+            found = sum(1 for v in result if v is not None)
+            self.hits += found
+            self.misses += len(texts) - found
+        return result
+
+    def put_many(self, texts: list[str], vectors: list[list[float]]) -> None:
+        """Zapisuje wektory (pamięć + dysk) i przycina SQLite do max_disk_items najświeższych wpisów."""
+        now = time.time()
+        rows = []
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                key = cache_key(self.model, text)
+                self._remember(key, list(vector))
+                rows.append((key, np.asarray(vector, dtype=np.float32).tobytes(), now))
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows
+                )
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN ("
+                    "SELECT key FROM embeddings ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                    (self.max_disk_items,),
+                )
+
+    def stats(self) -> dict:
+        with self._lock:
+            disk_items = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            return {"hits": self.hits, "misses": self.misses, "memory_items": len(self._memory), "disk_items": disk_items}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            with self._conn:
+                self._conn.execute("DELETE FROM embeddings")
+
+
+class CachedEmbeddings(Embeddings):
+    """Wrapper na Embeddings: najpierw cache, brakujące teksty embedowane jednym batchowym wywołaniem."""
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache):
+        self.embeddings = embeddings
+        self.cache = cache
+
+    def _lookup(self, texts: list[str]) -> tuple[list[list[float] | None], dict[str, list[int]]]:
+        """Wektory z cache + brakujące teksty (znormalizowany tekst → pozycje w batchu)."""
+        vectors = self.cache.get_many(texts)
+        missing: dict[str, list[int]] = {}
+        for i, (text, vector) in enumerate(zip(texts, vectors)):
+            if vector is None:
+                missing.setdefault(normalize_text(text), []).append(i)
+        return vectors, missing
+
+    def _fill(self, texts: list[str], vectors: list, missing: dict[str, list[int]], fresh: list[list[float]] | None) -> dict:
+        """Zapisuje świeże wektory w cache, uzupełnia batch i zwraca statystyki."""
+        hits = len(texts) - sum(len(idx) for idx in missing.values())
+        if missing:
+            self.cache.put_many([texts[idx[0]] for idx in missing.values()], fresh)
+            for idx, vector in zip(missing.values(), fresh):
+                for i in idx:
+                    vectors[i] = vector
+        return {"hits": hits, "misses": len(texts) - hits, "api_calls": 1 if missing else 0}
+
+    def embed_with_stats(self, texts: list[str]) -> tuple[list[list[float]], dict]:
+        """Zwraca (wektory, {"hits", "misses", "api_calls"}) dla jednego batcha."""
+        vectors, missing = self._lookup(texts)
+        fresh = self.embeddings.embed_documents([texts[idx[0]] for idx in missing.values()]) if missing else None
+        return vectors, self._fill(texts, vectors, missing, fresh)
+
+    async def aembed_with_stats(self, texts: list[str]) -> tuple[list[list[float]], dict]:
+        """Async wersja embed_with_stats (aembed_documents dla brakujących tekstów)."""
+        vectors, missing = self._lookup(texts)
+        fresh = await self.embeddings.aembed_documents([texts[idx[0]] for idx in missing.values()]) if missing else None
+        return vectors, self._fill(texts, vectors, missing, fresh)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.embed_with_stats(texts)[0]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_with_stats([text])[0][0]
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        return (await self.aembed_with_stats(texts))[0]
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return (await self.aembed_with_stats([text]))[0][0]
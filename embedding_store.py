@@ -0,0 +1,67 @@
+"""
+Adresowany treścią magazyn embeddingów chunków dla build_index.
+
+Klucz = sha256(model + dokładny tekst chunka) → wektor float32 (BLOB) w SQLite. Wpisy różnych
+modeli współistnieją, nic nie jest usuwane: przebudowa z inną kolekcją / metadanymi albo powrót
+do wcześniejszego modelu nie płaci ponownie za niezmienione chunki. Bezpieczny dla równoległych
+buildów (WAL, busy timeout, INSERT OR IGNORE – ten sam klucz zawsze oznacza ten sam wektor).
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+
+import numpy as np
+
+
+def content_key(model: str, text: str) -> str:
+    """Bez normalizacji tekstu (inaczej niż cache zapytań) – embedding chunka zależy od każdego znaku."""
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """Magazyn wektorów po hashu treści, współdzielony między buildami i procesami."""
+
+    def __init__(self, path: str, model: str, timeout_s: float = 60.0):
+        self.path = path
+        self.model = model
+        self.reused = 0
+        self.stored = 0
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=timeout_s, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS vectors (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+
+    def get_many(self, texts: list[str]) -> list[list[float] | None]:
+        """Wektory dla tekstów (None dla brakujących)."""
+        keys = [content_key(self.model, t) for t in texts]
+        with self._lock:
+            found: dict[str, bytes] = {}
+            unique = list(dict.fromkeys(keys))
+            for start in range(0, len(unique), 900):  # limit parametrów SQLite
+                part = unique[start : start + 900]
+                placeholders = ",".join("?" * len(part))
+                found.update(
+                    self._conn.execute(f"SELECT key, vector FROM vectors WHERE key IN ({placeholders})", part).fetchall()
+                )
+            result = [np.frombuffer(found[k], dtype=np.float32).tolist() if k in found else None for k in keys]
+            self.reused += sum(1 for v in result if v is not None)
+        return result
+
+    def put_many(self, texts: list[str], vectors: list[list[float]]) -> None:
+        rows = [(content_key(self.model, t), np.asarray(v, dtype=np.float32).tobytes()) for t, v in zip(texts, vectors)]
+        with self._lock:
+            with self._conn:
+                self._conn.executemany("INSERT OR IGNORE INTO vectors (key, vector) VALUES (?, ?)", rows)
+            self.stored += len(rows)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM vectors").fetchone()[0]
+
+    def stats(self) -> dict:
+        return {"reused": self.reused, "stored": self.stored, "vectors": len(self)}
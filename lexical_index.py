@@ -0,0 +1,253 @@
+"""
+Indeks leksykalny BM25 budowany obok indeksu Chroma (hybrid retrieval).
+
+Postingi są liczone raz w build_index i zapisywane na dysk jako tablice NumPy
+(bez ponownej tokenizacji korpusu przy starcie). Treść chunków leży w pliku JSONL
+czytanym punktowo (seek po offsetach) tylko dla zwróconych wyników.
+LexicalIndexWriter buduje ten sam indeks strumieniowo (partiami chunków) dla build_index.
+"""
+
+import json
+import os
+import re
+from array import array
+from collections import Counter
+
+import numpy as np
+from langchain_core.documents import Document
+
+POSTINGS_FILENAME = "postings.npz"
+DOCS_FILENAME = "docs.jsonl"
+
+# Tokeny z flagami CLI (--network, -p) i identyfikatorami (docker-compose.yml, image_prune) jako całość
+_TOKEN_RE = re.compile(r"-{1,2}[a-z0-9][a-z0-9\-]*|[a-z0-9]+(?:[._\-/][a-z0-9]+)*")
+
+
+def tokenize(text: str) -> list[str]:
+    """Tokenizacja BM25: lowercase, flagi CLI i nazwy z kropką/myślnikiem zachowane jako jeden token."""
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _doc_line(doc: Document) -> bytes:
+    line = json.dumps({"id": doc.id, "page_content": doc.page_content, "metadata": doc.metadata}, ensure_ascii=False)
+    return line.encode("utf-8") + b"\n"
+
+
+def _csr_postings(
+    terms: list[str], term_ids: np.ndarray, doc_ids: np.ndarray, tfs: np.ndarray
+) -> tuple[dict[str, int], np.ndarray, np.ndarray, np.ndarray]:
+    """Trójki (term, chunk, tf) → słownik alfabetyczny + postingi CSR posortowane po (term, chunk)."""
+    by_name = sorted(range(len(terms)), key=terms.__getitem__)
+    rank = np.empty(len(terms), dtype=np.int64)
+    rank[by_name] = np.arange(len(terms))
+    ranked = rank[term_ids]
+    order = np.lexsort((doc_ids, ranked))
+    offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(ranked, minlength=len(terms)), out=offsets[1:])
+    return (
+        {terms[i]: r for r, i in enumerate(by_name)},
+        offsets,
+        doc_ids[order].astype(np.int32),
+        np.minimum(tfs[order], np.iinfo(np.uint16).max).astype(np.uint16),
+    )
+
+
+class LexicalIndex:
+    """Odwrócony indeks BM25 na tablicach NumPy (CSR: offsets → doc_ids / tfs)."""
+
+    def __init__(
+        self,
+        vocab: dict[str, int],
+        offsets: np.ndarray,
+        doc_ids: np.ndarray,
+        tfs: np.ndarray,
+        doc_lens: np.ndarray,
+        doc_offsets: np.ndarray | None = None,
+        docs_path: str | None = None,
+        docs: list[Document] | None = None,
+        k1: float = 1.5,
+        b: float = 0.75,
+    ):
+        self.vocab = vocab
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_lens = doc_lens
+        self.doc_offsets = doc_offsets
+        self.docs_path = docs_path
+        self._docs = docs
+        self.k1 = k1
+        self.b = b
+        n = len(doc_lens)
+        self.avgdl = float(doc_lens.mean()) if n else 0.0
+        df = np.diff(offsets).astype(np.float32)
+        self.idf = np.log1p((n - df + 0.5) / (df + 0.5)).astype(np.float32)
+        # Normalizacja długości liczona raz: k1 * (1 - b + b * dl / avgdl)
+        self._norm = (k1 * (1 - b + b * doc_lens / max(self.avgdl, 1e-9))).astype(np.float32)
+
+    def __len__(self) -> int:
+        return len(self.doc_lens)
+
+    @classmethod
+    def build(cls, docs: list[Document]) -> "LexicalIndex":
+        """Tokenizuje chunki i liczy postingi w pamięci (dla dużych korpusów – LexicalIndexWriter)."""
+        terms: dict[str, int] = {}
+        term_ids, doc_ids, tfs = [], [], []
+        doc_lens = np.zeros(len(docs), dtype=np.int32)
+        for i, doc in enumerate(docs):
+            counts = Counter(tokenize(doc.page_content))
+            doc_lens[i] = sum(counts.values())
+            for term, tf in counts.items():
+                term_ids.append(terms.setdefault(term, len(terms)))
+                doc_ids.append(i)
+                tfs.append(tf)
+        vocab, offsets, doc_ids, tfs = _csr_postings(
+            list(terms), np.asarray(term_ids, dtype=np.int64), np.asarray(doc_ids, dtype=np.int64), np.asarray(tfs, dtype=np.int64)
+        )
+        return cls(vocab, offsets, doc_ids, tfs, doc_lens, docs=list(docs))
+
+    def save(self, directory: str) -> None:
+        """Zapisuje postingi (npz) i tabelę chunków (JSONL z offsetami bajtowymi)."""
+        os.makedirs(directory, exist_ok=True)
+        docs_path = os.path.join(directory, DOCS_FILENAME)
+        doc_offsets = np.zeros(len(self), dtype=np.int64)
+        with open(docs_path, "wb") as f:
+            for i, doc in enumerate(self._docs or []):
+                doc_offsets[i] = f.tell()
+                f.write(_doc_line(doc))
+        self.doc_offsets = doc_offsets
+        self.docs_path = docs_path
+        self._save_postings(os.path.join(directory, POSTINGS_FILENAME))
+
+    def _save_postings(self, path: str) -> None:
+        terms = sorted(self.vocab, key=self.vocab.get)  # tokeny nie zawierają "\n" (patrz _TOKEN_RE)
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                terms=np.array("\n".join(terms)),
+                offsets=self.offsets,
+                doc_ids=self.doc_ids,
+                tfs=self.tfs,
+                doc_lens=self.doc_lens,
+                doc_offsets=self.doc_offsets,
+                params=np.array([self.k1, self.b], dtype=np.float64),
+            )
+
+    @classmethod
+    def load(cls, directory: str) -> "LexicalIndex | None":
+        """Wczytuje gotowe postingi. Zwraca None, gdy indeks nie został zbudowany."""
+        postings_path = os.path.join(directory, POSTINGS_FILENAME)
+        docs_path = os.path.join(directory, DOCS_FILENAME)
+        if not (os.path.isfile(postings_path) and os.path.isfile(docs_path)):
+            return None
+        with np.load(postings_path) as data:
+            terms_blob = str(data["terms"])
+            terms = terms_blob.split("\n") if terms_blob else []
+            k1, b = data["params"].tolist()
+            return cls(
+                {term: t for t, term in enumerate(terms)},
+                data["offsets"],
+                data["doc_ids"],
+                data["tfs"],
+                data["doc_lens"],
+                doc_offsets=data["doc_offsets"],
+                docs_path=docs_path,
+                k1=k1,
+                b=b,
+            )
+
+    def scores(self, query: str) -> np.ndarray:
+        """Wektor score BM25 dla wszystkich chunków (jedna pętla po termach zapytania, reszta w NumPy)."""
+        scores = np.zeros(len(self), dtype=np.float32)
+        for term in set(tokenize(query)):
+            t = self.vocab.get(term)
+            if t is None:
+                continue
+            start, end = self.offsets[t], self.offsets[t + 1]
+            ids = self.doc_ids[start:end]
+            tf = self.tfs[start:end].astype(np.float32)
+            scores[ids] += self.idf[t] * tf * (self.k1 + 1) / (tf + self._norm[ids])
+        return scores
+
+    def get_documents(self, ids: list[int]) -> list[Document]:
+        if self._docs is not None:
+            return [self._docs[i] for i in ids]
+        docs = []
+        with open(self.docs_path, "rb") as f:
+            for i in ids:
+                f.seek(int(self.doc_offsets[i]))
+                row = json.loads(f.readline())
+                docs.append(Document(id=row.get("id"), page_content=row["page_content"], metadata=row["metadata"]))
+        return docs
+
+    def search(self, query: str, k: int = 6, rows: np.ndarray | None = None) -> list[tuple[Document, float]]:
+        """Top-k chunków wg BM25 (argpartition), tylko z score > 0; `rows` – wybór tylko spośród tych chunków."""
+        if not len(self) or (rows is not None and not len(rows)):
+            return []
+        scores = self.scores(query)
+        candidates = scores if rows is None else scores[rows]
+        k = min(k, len(candidates))
+        top = np.argpartition(-candidates, k - 1)[:k]
+        top = top[np.argsort(-candidates[top], kind="stable")]
+        found = top if rows is None else np.asarray(rows)[top]
+        found = [int(i) for i in found if scores[i] > 0]
+        return list(zip(self.get_documents(found), (float(scores[i]) for i in found)))
+
+
+class LexicalIndexWriter:
+    """
+    Strumieniowa budowa indeksu BM25: add() przyjmuje kolejne partie chunków, treść trafia od razu
+    do JSONL na dysku, w pamięci zostają tylko postingi jako zwarte tablice (term, chunk, tf).
+    finish() zapisuje postingi i podmienia pliki indeksu (os.replace) – czytelnicy nie widzą połowicznego stanu.
+    """
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self._docs_tmp = os.path.join(directory, DOCS_FILENAME + ".tmp")
+        self._file = open(self._docs_tmp, "wb")
+        self._terms: dict[str, int] = {}
+        self._term_ids = array("i")
+        self._doc_ids = array("i")
+        self._tfs = array("i")
+        self._doc_lens = array("i")
+        self._doc_offsets = array("q")
+
+    def __len__(self) -> int:
+        return len(self._doc_lens)
+
+    def add(self, docs: list[Document]) -> None:
+        for doc in docs:
+            i = len(self._doc_lens)
+            counts = Counter(tokenize(doc.page_content))
+            self._doc_lens.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self._term_ids.append(self._terms.setdefault(term, len(self._terms)))
+                self._doc_ids.append(i)
+                self._tfs.append(tf)
+            self._doc_offsets.append(self._file.tell())
+            self._file.write(_doc_line(doc))
+
+    def finish(self) -> LexicalIndex:
+        self._file.close()
+        vocab, offsets, doc_ids, tfs = _csr_postings(
+            list(self._terms),
+            np.frombuffer(self._term_ids, dtype=np.int32),
+            np.frombuffer(self._doc_ids, dtype=np.int32),
+            np.frombuffer(self._tfs, dtype=np.int32),
+        )
+        docs_path = os.path.join(self.directory, DOCS_FILENAME)
+        postings_path = os.path.join(self.directory, POSTINGS_FILENAME)
+        index = LexicalIndex(
+            vocab,
+            offsets,
+            doc_ids,
+            tfs,
+            np.frombuffer(self._doc_lens, dtype=np.int32).copy(),
+            doc_offsets=np.frombuffer(self._doc_offsets, dtype=np.int64).copy(),
+            docs_path=docs_path,
+        )
+        index._save_postings(postings_path + ".tmp")
+        os.replace(self._docs_tmp, docs_path)
+        os.replace(postings_path + ".tmp", postings_path)
+        return index
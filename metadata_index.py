@@ -0,0 +1,172 @@
+"""
+Odwrócony indeks metadanych chunków (tags / keywords / aliases) – pre-filtr kandydatów dla retrieval.
+
+_df_to_docs zapisuje te pola w metadanych jako napisy JSON (listy z parquet), których nie da się
+filtrować w Chroma (`where` porównuje cały napis). build_index buduje więc obok BM25 osobny indeks:
+pole → wartość (lowercase) → posortowane numery wierszy (CSR, jak postingi w lexical_index).
+Wiersze to kolejność strumienia chunków – ta sama co w indeksie BM25 – a `ids` mapuje wiersz na id
+chunka dla magazynu wektorów.
+
+Filtr to słownik {pole: wartość albo lista wartości}: w obrębie pola wystarczy jedna z wartości (OR),
+wszystkie podane pola muszą pasować (AND), np. {"tags": ["compose", "networking"]}.
+"""
+
+import json
+import os
+from array import array
+
+import numpy as np
+from langchain_core.documents import Document
+
+FILTER_FIELDS = ("tags", "keywords", "aliases")
+
+
+def metadata_values(value) -> list[str]:
+    """Wartość pola metadanych → posortowane, unikalne wartości lowercase (lista JSON, "a, b" albo pojedynczy napis)."""
+    if value is None or value == "":
+        return []
+    items = value
+    if isinstance(value, str):
+        text = value.strip()
+        items = text.split(",")
+        if text.startswith("["):
+            try:
+                items = json.loads(text)
+            except ValueError:
+                pass
+    if not isinstance(items, (list, tuple)):
+        items = [items]
+    values = (" ".join(str(item).split()).lower() for item in items if item is not None)
+    return sorted({v for v in values if v})
+
+
+def validate_filters(filters: dict | None) -> None:
+    """Filtr z publicznego API: nieznane pole → ValueError z listą dostępnych pól (przed uruchomieniem grafu)."""
+    if filters is None:
+        return
+    if not isinstance(filters, dict):
+        raise ValueError(f"Filtr musi być słownikiem {{pole: wartości}}, otrzymano {type(filters).__name__}")
+    unknown = sorted(str(field) for field in filters if field not in FILTER_FIELDS)
+    if unknown:
+        raise ValueError(f"Nieznane pola filtra: {', '.join(unknown)} (dostępne: {', '.join(FILTER_FIELDS)})")
+
+
+def normalize_filters(filters: dict | None) -> dict[str, tuple[str, ...]]:
+    """Filtr → {pole: posortowane wartości lowercase}; pola bez wartości pomijane (pusty wynik = brak filtra)."""
+    normalized = {}
+    for field, wanted in (filters or {}).items():
+        values = metadata_values(list(wanted) if isinstance(wanted, (set, frozenset)) else wanted)
+        if values:
+            normalized[field] = tuple(values)
+    return dict(sorted(normalized.items()))
+
+
+class MetadataIndex:
+    """Pole → wartość → wiersze chunków (CSR: offsets → rows) + id chunka każdego wiersza."""
+
+    def __init__(self, ids: list[str], postings: dict[str, tuple[dict[str, int], np.ndarray, np.ndarray]]):
+        self.ids = ids
+        self.postings = postings
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def fields(self) -> list[str]:
+        return list(self.postings)
+
+    def value_counts(self, field: str) -> dict[str, int]:
+        """Liczba chunków na wartość pola (np. do podpowiedzi dostępnych filtrów)."""
+        values, offsets, _ = self.postings.get(field, ({}, np.zeros(1, dtype=np.int64), None))
+        counts = np.diff(offsets)
+        return {value: int(counts[v]) for value, v in values.items()}
+
+    def rows(self, filters: dict | None) -> np.ndarray | None:
+        """Posortowane wiersze chunków pasujących do filtra; None, gdy filtr jest pusty (bez ograniczenia)."""
+        normalized = normalize_filters(filters)
+        if not normalized:
+            return None
+        result = None
+        for field, wanted in normalized.items():
+            if field not in self.postings:
+                raise ValueError(f"Nieznane pole filtra: {field!r} (dostępne: {', '.join(self.fields)})")
+            values, offsets, rows = self.postings[field]
+            matched = [rows[offsets[v] : offsets[v + 1]] for v in (values.get(w) for w in wanted) if v is not None]
+            field_rows = np.unique(np.concatenate(matched)) if matched else np.zeros(0, dtype=np.int32)
+            result = field_rows if result is None else np.intersect1d(result, field_rows, assume_unique=True)
+            if not len(result):
+                break
+        return result
+
+    def chunk_ids(self, rows: np.ndarray) -> list[str]:
+        return [self.ids[i] for i in rows]
+
+    def save(self, path: str) -> None:
+        arrays = {"ids": np.array("\n".join(self.ids)), "fields": np.array("\n".join(self.fields))}
+        for field, (values, offsets, rows) in self.postings.items():
+            arrays[f"{field}.values"] = np.array("\n".join(sorted(values, key=values.get)))
+            arrays[f"{field}.offsets"] = offsets
+            arrays[f"{field}.rows"] = rows
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path + ".tmp", "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path: str) -> "MetadataIndex | None":
+        """Wczytuje indeks. Zwraca None, gdy nie został zbudowany."""
+        if not os.path.isfile(path):
+            return None
+
+        def lines(blob) -> list[str]:
+            text = str(blob)
+            return text.split("\n") if text else []
+
+        with np.load(path) as data:
+            postings = {}
+            for field in lines(data["fields"]):
+                values = lines(data[f"{field}.values"])
+                postings[field] = ({v: i for i, v in enumerate(values)}, data[f"{field}.offsets"], data[f"{field}.rows"])
+            return cls(lines(data["ids"]), postings)
+
+    @classmethod
+    def build(cls, docs: list[Document], fields: tuple[str, ...] = FILTER_FIELDS) -> "MetadataIndex":
+        writer = MetadataIndexWriter(None, fields)
+        writer.add(docs)
+        return writer.index()
+
+
+class MetadataIndexWriter:
+    """Strumieniowa budowa (add() partiami chunków, jak LexicalIndexWriter); finish() zapisuje atomowo (os.replace)."""
+
+    def __init__(self, path: str | None, fields: tuple[str, ...] = FILTER_FIELDS):
+        self.path = path
+        self.fields = fields
+        self._ids: list[str] = []
+        self._rows: dict[str, dict[str, array]] = {field: {} for field in fields}
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add(self, docs: list[Document]) -> None:
+        for doc in docs:
+            row = len(self._ids)
+            self._ids.append(doc.id or "")
+            for field in self.fields:
+                for value in metadata_values(doc.metadata.get(field)):
+                    self._rows[field].setdefault(value, array("i")).append(row)
+
+    def index(self) -> MetadataIndex:
+        postings = {}
+        for field, by_value in self._rows.items():
+            values = sorted(by_value)
+            offsets = np.zeros(len(values) + 1, dtype=np.int64)
+            np.cumsum(np.array([len(by_value[v]) for v in values], dtype=np.int64), out=offsets[1:])
+            rows = np.concatenate([np.frombuffer(by_value[v], dtype=np.int32) for v in values]) if values else np.zeros(0, dtype=np.int32)
+            postings[field] = ({v: i for i, v in enumerate(values)}, offsets, rows)
+        return MetadataIndex(list(self._ids), postings)
+
+    def finish(self) -> MetadataIndex:
+        index = self.index()
+        index.save(self.path)
+        return index
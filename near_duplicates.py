@@ -0,0 +1,119 @@
+"""
+Wykrywanie prawie-duplikatów chunków sygnaturami MinHash (ten sam akapit skopiowany między stronami,
+drobne różnice w formatowaniu).
+
+Sygnatura: NUM_PERM minimów hashy shingli (SHINGLE_SIZE kolejnych tokenów BM25, crc32) po permutacjach
+h(x) = (a·x + b) mod p – liczona raz w build_index i zapisywana w metadanych chunka (SIGNATURE_KEY,
+base64). Odsetek równych pozycji dwóch sygnatur szacuje podobieństwo Jaccarda zbiorów shingli, więc
+porównanie w retrieval to jedna operacja NumPy zamiast porównywania tekstów.
+Build może opcjonalnie odrzucać prawie-duplikaty całego korpusu (NearDuplicateFilter – LSH z pasmami
+sygnatury, porównywane są tylko chunki ze wspólnym pasmem).
+"""
+
+import base64
+import zlib
+
+import numpy as np
+from langchain_core.documents import Document
+
+from lexical_index import tokenize
+
+SIGNATURE_KEY = "minhash"
+NUM_PERM = 64
+SHINGLE_SIZE = 3
+_PRIME = np.uint64(4294967311)  # najmniejsza liczba pierwsza > 2^32
+# Stałe permutacje – sygnatury porównywalne między buildami i procesami
+_rng = np.random.default_rng(1_000_003)
+_A = _rng.integers(1, 2**31, NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, 2**31, NUM_PERM, dtype=np.uint64)
+
+
+def minhash_signature(text: str) -> np.ndarray:
+    """Sygnatura MinHash tekstu (NUM_PERM × uint32); tekst krótszy niż shingle → pojedyncze tokeny."""
+    tokens = tokenize(text)
+    if len(tokens) >= SHINGLE_SIZE:
+        shingles = {" ".join(tokens[i : i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1)}
+    else:
+        shingles = set(tokens) or {""}
+    hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+    return ((hashes[:, None] * _A + _B) % _PRIME).min(axis=0).astype(np.uint32)
+
+
+def encode_signature(signature: np.ndarray) -> str:
+    return base64.b64encode(signature.astype("<u4").tobytes()).decode("ascii")
+
+
+def decode_signature(value) -> np.ndarray | None:
+    if not isinstance(value, str) or not value:
+        return None
+    try:
+        signature = np.frombuffer(base64.b64decode(value), dtype="<u4")
+    except ValueError:
+        return None
+    return signature if len(signature) == NUM_PERM else None
+
+
+def add_signature(doc: Document) -> None:
+    """Zapisuje sygnaturę w metadanych chunka (build_index)."""
+    doc.metadata[SIGNATURE_KEY] = encode_signature(minhash_signature(doc.page_content))
+
+
+def signature_of(doc: Document) -> np.ndarray:
+    """Sygnatura z metadanych; chunki z indeksu sprzed sygnatur – liczona z treści."""
+    signature = decode_signature(doc.metadata.get(SIGNATURE_KEY))
+    return signature if signature is not None else minhash_signature(doc.page_content)
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Szacowane podobieństwo Jaccarda (odsetek równych pozycji sygnatur)."""
+    return float(np.mean(a == b))
+
+
+def near_duplicate_of(docs: list[Document], threshold: float) -> list[int]:
+    """
+    Dla każdego chunka indeks wcześniejszego chunka, którego jest prawie-duplikatem (podobieństwo ≥ threshold),
+    albo własny indeks. Kolejność wejścia = priorytet (reprezentantem zostaje pierwszy).
+    """
+    if not docs:
+        return []
+    signatures = np.stack([signature_of(d) for d in docs])
+    owner = list(range(len(docs)))
+    kept: list[int] = []
+    for i in range(len(docs)):
+        if kept:
+            matches = (signatures[kept] == signatures[i]).mean(axis=1)
+            best = int(np.argmax(matches))
+            if matches[best] >= threshold:
+                owner[i] = kept[best]
+                continue
+        kept.append(i)
+    return owner
+
+
+class NearDuplicateFilter:
+    """
+    Strumieniowe odrzucanie prawie-duplikatów (build): sygnatura dzielona na `bands` pasm; kandydaci to
+    chunki z identycznym pasmem, potwierdzani pełnym porównaniem sygnatur. W pamięci: sygnatury + klucze pasm.
+    """
+
+    def __init__(self, threshold: float, bands: int = 16):
+        if NUM_PERM % bands:
+            raise ValueError(f"Liczba pasm musi dzielić NUM_PERM ({NUM_PERM})")
+        self.threshold = threshold
+        self.rows = NUM_PERM // bands
+        self._buckets: dict[tuple[int, bytes], list[int]] = {}
+        self._signatures: list[np.ndarray] = []
+        self.dropped = 0
+
+    def is_duplicate(self, doc: Document) -> bool:
+        """True, gdy chunk jest prawie-duplikatem wcześniej widzianego; inaczej zapamiętuje jego sygnaturę."""
+        signature = signature_of(doc)
+        keys = [(band, signature[band * self.rows : (band + 1) * self.rows].tobytes()) for band in range(NUM_PERM // self.rows)]
+        candidates = {i for key in keys for i in self._buckets.get(key, ())}
+        if any(similarity(self._signatures[i], signature) >= self.threshold for i in candidates):
+            self.dropped += 1
+            return True
+        for key in keys:
+            self._buckets.setdefault(key, []).append(len(self._signatures))
+        self._signatures.append(signature)
+        return False
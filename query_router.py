@@ -0,0 +1,95 @@
+"""
+Lokalny routing zapytań (route_query): DIRECT (pytanie ogólne – odpowiedź bez dokumentacji) albo RAG.
+
+1. Reguły słów kluczowych (bez kosztu): pytania o definicję / koncept ("what is", "co to jest") → DIRECT;
+   komendy, flagi, pliki konfiguracyjne, porty, błędy i czasowniki czynności ("how do I", "configure",
+   "expose") → RAG. Decyzja, gdy trafiają reguły tylko jednej strony.
+2. Najbliższy centroid: embedding zapytania (ten sam model co retrieval, cache embeddingów) porównany
+   z centroidami przykładowych pytań DIRECT / RAG (ROUTE_EXAMPLES). Decyzja, gdy różnica podobieństw
+   cosinusowych ≥ margines.
+3. W pozostałych przypadkach (niepewne) – LLM (workflow.ROUTE_PROMPT).
+"""
+
+import re
+
+import numpy as np
+
+ROUTE_EXAMPLES = {
+    "direct": [
+        "What is Docker?",
+        "What is a container?",
+        "What is a Docker image?",
+        "What is the difference between a container and a virtual machine?",
+        "Why should I use containers?",
+        "Explain containerization in simple terms",
+        "What are the benefits of Docker?",
+        "Co to jest Docker?",
+        "Czym jest kontener?",
+        "Czym różni się obraz od kontenera?",
+    ],
+    "rag": [
+        "How do I expose a port from a container?",
+        "How to persist data with Docker volumes?",
+        "docker run -p 8080:80 nginx does not work",
+        "How to configure a healthcheck in compose.yaml?",
+        "What does the --network host flag do?",
+        "Multi-stage build example for a Go application",
+        "How do I limit container memory?",
+        "Error: Cannot connect to the Docker daemon",
+        "Jak skonfigurować sieć w Docker Compose?",
+        "Jak zbudować obraz z Dockerfile?",
+    ],
+}
+
+_DIRECT_RULES = {
+    "definition": re.compile(
+        r"^\s*(what\s+(is|are)\s+(an?\s+)?|what's\s+|define\s+|explain\s+|co\s+to\s+(jest|są)\b|czym\s+(jest|są)\b)", re.I
+    ),
+    "concept": re.compile(r"\b(why\s+(use|should)|benefits?\s+of|advantages?\s+of|zalety|dlaczego\s+warto|in\s+simple\s+terms)\b", re.I),
+}
+_RAG_RULES = {
+    # komendy pisane małymi literami ("docker run"), flagi, kod w backtickach – "Docker volume" to rzeczownik
+    "command": re.compile(
+        r"`|\bdocker(-compose)?\s+(run|build|buildx|compose|exec|ps|pull|push|volume|network|image|container|system|"
+        r"login|logs|stop|rm|rmi|inspect|tag|save|load|cp|stats|swarm|service|stack|context|scout|init)\b|\s--?[a-z][\w-]*"
+    ),
+    "config_file": re.compile(r"\b(dockerfile|compose\.ya?ml|docker-compose|\.ya?ml|\.json|\.env|daemon\.json)\b", re.I),
+    "port_or_path": re.compile(r"\b\d{2,5}:\d{2,5}\b|(^|\s)/[\w.-]+/"),
+    "error": re.compile(r"\b(error|failed|fails|cannot|can't|permission denied|not working|does not work|błąd|nie działa)\b", re.I),
+    "how_to": re.compile(r"\b(how\s+(do|can|to|should)|jak\s+\w+|step[- ]by[- ]step|example)\b", re.I),
+    "action": re.compile(
+        r"\b(install|configure|set\s+up|enable|disable|expose|publish|persist|keep|mount|connect|limit|deploy|"
+        r"push|pull|build|tag|remove|delete|prune|update|upgrade|debug|troubleshoot|migrate|share|copy|restart)\b",
+        re.I,
+    ),
+}
+
+
+def keyword_route(query: str) -> tuple[str | None, list[str]]:
+    """Decyzja reguł: ("direct" | "rag" | None gdy brak reguł albo reguły obu stron, nazwy trafionych reguł)."""
+    direct = [name for name, rule in _DIRECT_RULES.items() if rule.search(query)]
+    rag = [name for name, rule in _RAG_RULES.items() if rule.search(query)]
+    if direct and not rag:
+        return "direct", direct
+    if rag and not direct:
+        return "rag", rag
+    return None, direct + rag
+
+
+def build_centroids(vectors: dict[str, list[list[float]]]) -> dict[str, np.ndarray]:
+    """Znormalizowane centroidy embeddingów przykładów każdej trasy."""
+    centroids = {}
+    for route, rows in vectors.items():
+        matrix = np.asarray(rows, dtype=np.float32)
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        centroid = matrix.mean(axis=0)
+        centroids[route] = centroid / max(float(np.linalg.norm(centroid)), 1e-12)
+    return centroids
+
+
+def nearest_centroid(vector: list[float], centroids: dict[str, np.ndarray]) -> tuple[str, float]:
+    """(trasa najbliższego centroidu, margines = różnica podobieństw cosinusowych do dwóch najbliższych)."""
+    query = np.asarray(vector, dtype=np.float32)
+    query = query / max(float(np.linalg.norm(query)), 1e-12)
+    similarities = sorted(((float(centroid @ query), route) for route, centroid in centroids.items()), reverse=True)
+    return similarities[0][1], similarities[0][0] - similarities[1][0]
@@ -0,0 +1,47 @@
+"""Post-retrieval reranking helpers: Maximal Marginal Relevance on stored chunk embeddings."""
+
+import numpy as np
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1.0, norms)
+
+
+def mmr_select(relevance: np.ndarray, embeddings: np.ndarray, k: int, lambda_mult: float = 0.7) -> list[int]:
+    """
+    Maximal Marginal Relevance: score_i = λ·rel_i − (1−λ)·max_{j∈S} cos(i, j).
+
+    Macierz podobieństw liczona jednym iloczynem E·Eᵀ; każdy krok zachłanny to operacje
+    wektorowe (bez pętli po parach). Wiersze zerowe (brak embeddingu) nie karzą za redundancję.
+    Zwraca indeksy kandydatów w kolejności wyboru.
+    """
+    n = len(relevance)
+    k = min(k, n)
+    if k <= 0:
+        return []
+    relevance = np.asarray(relevance, dtype=np.float32)
+    unit = _normalize_rows(np.asarray(embeddings, dtype=np.float32))
+    similarity = unit @ unit.T
+    max_sim = np.zeros(n, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    selected: list[int] = []
+    for _ in range(k):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_sim
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(max_sim, similarity[best], out=max_sim)
+    return selected
+
+
+def minmax_normalize(scores) -> np.ndarray:
+    """Skaluje score (np. RRF) do [0, 1]; stałe score → same jedynki."""
+    scores = np.asarray(scores, dtype=np.float32)
+    if not len(scores):
+        return scores
+    span = scores.max() - scores.min()
+    if span == 0:
+        return np.ones_like(scores)
+    return (scores - scores.min()) / span
@@ -1,29 +1,255 @@
 """Retriever tool for searching Docker docs chunks. Loads existing index (no indexing)."""
 
+import threading
+
+import numpy as np
 from dotenv import load_dotenv
 
 load_dotenv(override=True)  # przed importem LangChain (LangSmith observability)
 
-from langchain_chroma import Chroma
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
 from langchain_core.tools import create_retriever_tool
 from langchain_openai import OpenAIEmbeddings
 
-from config import CHROMA_DIR, COLLECTION_NAME, EMBEDDING_MODEL, OPENROUTER_API_KEY, OPENROUTER_BASE_URL
+from config import (
+    EMBEDDING_CACHE_DISK_ITEMS,
+    EMBEDDING_CACHE_ENABLED,
+    EMBEDDING_CACHE_MEMORY_ITEMS,
+    EMBEDDING_CACHE_PATH,
+    EMBEDDING_MODEL,
+    INDEX_VERSION_PATH,
+    LEXICAL_INDEX_DIR,
+    METADATA_INDEX_PATH,
+    OPENROUTER_API_KEY,
+    OPENROUTER_BASE_URL,
+    VECTOR_BACKEND,
+)
+from embedding_cache import CachedEmbeddings, EmbeddingCache
+from lexical_index import LexicalIndex
+from metadata_index import MetadataIndex
+from vector_store import VectorStore, open_vector_store
+
+# --- Rejestr współdzielonych uchwytów (jeden klient embeddings + jeden magazyn wektorów na proces) ---
+_registry_lock = threading.Lock()
+_embeddings: Embeddings | None = None
+_vector_store: VectorStore | None = None
+_embedding_cache: EmbeddingCache | None = None
+_lexical_index: LexicalIndex | None = None
+_lexical_loaded = False
+_metadata_index: MetadataIndex | None = None
+_metadata_loaded = False
 
 
-def get_retriever(k: int = 4):
-    """Ładuje istniejący indeks Chroma i zwraca retriever. Nie buduje indeksu."""
-    embeddings = OpenAIEmbeddings(
+def _create_embeddings() -> OpenAIEmbeddings:
+    return OpenAIEmbeddings(
         model=EMBEDDING_MODEL,
         api_key=OPENROUTER_API_KEY,
         base_url=OPENROUTER_BASE_URL,
     )
-    vs = Chroma(
-        collection_name=COLLECTION_NAME,
-        embedding_function=embeddings,
-        persist_directory=CHROMA_DIR,
-    )
-    return vs.as_retriever(search_kwargs={"k": k})
+
+
+def get_embedding_cache() -> EmbeddingCache | None:
+    """Zwraca współdzielony cache embeddingów zapytań (None gdy EMBEDDING_CACHE=0)."""
+    global _embedding_cache
+    if not EMBEDDING_CACHE_ENABLED:
+        return None
+    if _embedding_cache is None:
+        with _registry_lock:
+            if _embedding_cache is None:
+                _embedding_cache = EmbeddingCache(
+                    EMBEDDING_CACHE_PATH,
+                    EMBEDDING_MODEL,
+                    max_memory_items=EMBEDDING_CACHE_MEMORY_ITEMS,
+                    max_disk_items=EMBEDDING_CACHE_DISK_ITEMS,
+                )
+    return _embedding_cache
+
+
+def get_embeddings() -> Embeddings:
+    """Zwraca współdzielony klient embeddings (tworzony raz na proces, thread-safe), opakowany w cache zapytań."""
+    global _embeddings
+    if _embeddings is None:
+        cache = get_embedding_cache()
+        with _registry_lock:
+            if _embeddings is None:
+                client = _create_embeddings()
+                _embeddings = CachedEmbeddings(client, cache) if cache is not None else client
+    return _embeddings
+
+
+def get_vector_store() -> VectorStore:
+    """Zwraca współdzielony magazyn wektorów wg VECTOR_BACKEND (vector_store.py; otwierany raz na proces, thread-safe)."""
+    global _vector_store
+    if _vector_store is None:
+        with _registry_lock:
+            if _vector_store is None:
+                _vector_store = open_vector_store(VECTOR_BACKEND)
+    return _vector_store
+
+
+def reload_vector_store() -> None:
+    """Zamyka współdzielone uchwyty – kolejne get_vector_store() otworzy indeks na nowo (np. po przebudowie)."""
+    global _embeddings, _vector_store, _lexical_index, _lexical_loaded, _metadata_index, _metadata_loaded
+    with _registry_lock:
+        _embeddings = None
+        _vector_store = None
+        _lexical_index = None
+        _lexical_loaded = False
+        _metadata_index = None
+        _metadata_loaded = False
+
+
+def get_lexical_index() -> LexicalIndex | None:
+    """Zwraca współdzielony indeks BM25 z LEXICAL_INDEX_DIR (None, gdy nie został zbudowany)."""
+    global _lexical_index, _lexical_loaded
+    if not _lexical_loaded:
+        with _registry_lock:
+            if not _lexical_loaded:
+                _lexical_index = LexicalIndex.load(LEXICAL_INDEX_DIR)
+                _lexical_loaded = True
+    return _lexical_index
+
+
+def get_metadata_index() -> MetadataIndex | None:
+    """Zwraca współdzielony indeks tags/keywords/aliases z METADATA_INDEX_PATH (None, gdy nie został zbudowany)."""
+    global _metadata_index, _metadata_loaded
+    if not _metadata_loaded:
+        with _registry_lock:
+            if not _metadata_loaded:
+                _metadata_index = MetadataIndex.load(METADATA_INDEX_PATH)
+                _metadata_loaded = True
+    return _metadata_index
+
+
+def resolve_filters(filters: dict | None) -> tuple[list[int], list[str]] | None:
+    """
+    Filtr metadanych ({"tags": ["compose"]}) → (wiersze BM25, id chunków) kandydatów z indeksu metadanych.
+    None, gdy filtr jest pusty albo indeks metadanych nie został zbudowany (wyszukiwanie bez ograniczenia).
+    """
+    index = get_metadata_index()
+    if not filters or index is None:
+        return None
+    rows = index.rows(filters)
+    if rows is None:
+        return None
+    return rows.tolist(), index.chunk_ids(rows)
+
+
+def get_index_version() -> str:
+    """Wersja indeksu zapisana przez build_index.py ("" gdy brak) – do unieważniania cache odpowiedzi."""
+    try:
+        with open(INDEX_VERSION_PATH, encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+
+class VectorStoreRetriever(BaseRetriever):
+    """Retriever LangChain nad magazynem wektorów: embedding zapytania (z cache) + VectorStore.search."""
+
+    vector_store: VectorStore
+    k: int = 4
+    where: dict | None = None
+
+    model_config = {"arbitrary_types_allowed": True}
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> list[Document]:
+        vector = get_embeddings().embed_query(query)
+        return [doc for doc, _ in self.vector_store.search(vector, k=self.k, where=self.where)]
+
+
+def get_retriever(k: int = 4, where: dict | None = None):
+    """Zwraca retriever nad współdzielonym magazynem wektorów (wg VECTOR_BACKEND). Nie buduje indeksu."""
+    return VectorStoreRetriever(vector_store=get_vector_store(), k=k, where=where)
+
+
+def embed_queries(queries: list[str], stats: dict | None = None) -> list[list[float]]:
+    """
+    Embeduje wszystkie zapytania jednym batchowym wywołaniem embed_documents (jeden round-trip).
+    Zapytania obecne w cache nie są wysyłane do API. Gdy podano stats – uzupełnia hits/misses/api_calls.
+    """
+    if not queries:
+        return []
+    embeddings = get_embeddings()
+    if isinstance(embeddings, CachedEmbeddings):
+        vectors, call_stats = embeddings.embed_with_stats(list(queries))
+    else:
+        vectors = embeddings.embed_documents(list(queries))
+        call_stats = {"hits": 0, "misses": len(queries), "api_calls": 1}
+    if stats is not None:
+        stats.update(call_stats)
+    return vectors
+
+
+async def aembed_queries(queries: list[str], stats: dict | None = None) -> list[list[float]]:
+    """Async wersja embed_queries (aembed_documents – bez blokowania event loopa)."""
+    if not queries:
+        return []
+    embeddings = get_embeddings()
+    if isinstance(embeddings, CachedEmbeddings):
+        vectors, call_stats = await embeddings.aembed_with_stats(list(queries))
+    else:
+        vectors = await embeddings.aembed_documents(list(queries))
+        call_stats = {"hits": 0, "misses": len(queries), "api_calls": 1}
+    if stats is not None:
+        stats.update(call_stats)
+    return vectors
+
+
+def search_by_vector_with_scores(
+    vector: list[float], k: int = 4, where: dict | None = None, ids: list[str] | None = None
+) -> list[tuple[Document, float]]:
+    """
+    Wyszukiwanie po gotowym wektorze (opcjonalny filtr metadanych, `ids` – tylko spośród tych chunków);
+    zwraca (chunk, dystans) – mniejszy dystans = bliżej.
+    """
+    return get_vector_store().search(vector, k=k, where=where, ids=ids)
+
+
+def search_by_vector(vector: list[float], k: int = 4, where: dict | None = None) -> list[Document]:
+    """Wyszukiwanie we współdzielonym indeksie po gotowym wektorze (bez ponownego embeddingu)."""
+    return [doc for doc, _ in search_by_vector_with_scores(vector, k=k, where=where)]
+
+
+def get_chunk_embeddings(ids: list[str]) -> dict[str, list[float]]:
+    """Pobiera zapisane embeddingi chunków po id (jedno zapytanie do magazynu, bez API embeddings)."""
+    if not ids:
+        return {}
+    return get_vector_store().get_embeddings(list(ids))
+
+
+def get_chunks(ids: list[str]) -> list[Document]:
+    """Pobiera chunki (treść + metadane) po id – np. brakujący środkowy chunk przy sklejaniu kontekstu."""
+    if not ids:
+        return []
+    return get_vector_store().get(list(ids))
+
+
+def lexical_search_with_scores(query: str, k: int = 4, rows: list[int] | None = None) -> list[tuple[Document, float]]:
+    """
+    Wyszukiwanie BM25; zwraca (chunk, score BM25) – większy score = lepiej. Pusta lista bez indeksu.
+    `rows` – tylko spośród tych chunków (wiersze z resolve_filters).
+    """
+    index = get_lexical_index()
+    if index is None:
+        return []
+    return index.search(query, k=k, rows=None if rows is None else np.asarray(rows, dtype=np.int64))
+
+
+def get_term_weights(terms) -> dict[str, float]:
+    """IDF termów z indeksu BM25 (termy spoza słownika pominięte; pusty słownik bez indeksu)."""
+    index = get_lexical_index()
+    if index is None:
+        return {}
+    return {term: float(index.idf[index.vocab[term]]) for term in terms if term in index.vocab}
+
+
+def lexical_search(query: str, k: int = 4) -> list[Document]:
+    """Wyszukiwanie BM25 (dokładne tokeny: --network, EXPOSE, docker image prune). Pusta lista bez indeksu."""
+    return [doc for doc, _ in lexical_search_with_scores(query, k=k)]
 
 
 def create_docker_docs_tool():
@@ -0,0 +1,139 @@
+"""
+Semantyczny cache odpowiedzi przed workflow.ask().
+
+Przechowuje (embedding zapytania, odpowiedź, flow trace) w SQLite; wyszukiwanie po
+podobieństwie cosinusowym na macierzy NumPy trzymanej w pamięci. Eviction: TTL + LRU
+(po last_used). Namespace (model embeddingów + wersja indeksu) – jego zmiana czyści cache.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+
+class SemanticCache:
+    """Cache odpowiedzi po podobieństwie zapytań (cosinus ≥ threshold). Thread-safe."""
+
+    def __init__(
+        self,
+        path: str,
+        namespace: str,
+        threshold: float = 0.92,
+        ttl_s: float = 7 * 24 * 3600,
+        max_entries: int = 1000,
+    ):
+        self.path = path
+        self.namespace = namespace
+        self.threshold = threshold
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS answers ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, namespace TEXT NOT NULL, query TEXT NOT NULL, "
+                "vector BLOB NOT NULL, answer TEXT NOT NULL, flow_log TEXT NOT NULL, "
+                "created_at REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+        self._load()
+
+    def _load(self) -> None:
+        """Usuwa wpisy z innego namespace / po TTL i wczytuje wektory do pamięci."""
+        with self._conn:
+            self._conn.execute("DELETE FROM answers WHERE namespace != ?", (self.namespace,))
+            self._conn.execute("DELETE FROM answers WHERE created_at < ?", (time.time() - self.ttl_s,))
+        rows = self._conn.execute("SELECT id, vector, created_at FROM answers ORDER BY id").fetchall()
+        self._ids = np.array([r[0] for r in rows], dtype=np.int64)
+        self._created = np.array([r[2] for r in rows], dtype=np.float64)
+        vectors = [np.frombuffer(r[1], dtype=np.float32) for r in rows]
+        self._matrix = np.vstack(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+
+    def set_namespace(self, namespace: str) -> None:
+        """Zmiana wersji indeksu / modelu embeddingów – unieważnia wszystkie wpisy."""
+        with self._lock:
+            if namespace != self.namespace:
+                self.namespace = namespace
+                self._load()
+
+    @staticmethod
+    def _unit(vector) -> np.ndarray:
+        v = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm else v
+
+    def lookup(self, vector) -> dict | None:
+        """Zwraca {"query", "answer", "flow_log", "similarity"} najbliższego wpisu ≥ threshold albo None."""
+        query = self._unit(vector)
+        with self._lock:
+            if len(self._ids) and self._matrix.shape[1] == len(query):
+                sims = self._matrix @ query
+                sims[self._created < time.time() - self.ttl_s] = -np.inf
+                best = int(np.argmax(sims))
+                if sims[best] >= self.threshold:
+                    entry_id = int(self._ids[best])
+                    row = self._conn.execute(
+                        "SELECT query, answer, flow_log FROM answers WHERE id = ?", (entry_id,)
+                    ).fetchone()
+                    if row is not None:
+                        with self._conn:
+                            self._conn.execute("UPDATE answers SET last_used = ? WHERE id = ?", (time.time(), entry_id))
+                        self.hits += 1
+                        return {
+                            "query": row[0],
+                            "answer": row[1],
+                            "flow_log": json.loads(row[2]),
+                            "similarity": round(float(sims[best]), 4),
+                        }
+            self.misses += 1
+            return None
+
+    def store(self, query: str, vector, answer: str, flow_log: list[dict]) -> None:
+        """
+        Zapisuje odpowiedź; wpisy po TTL i powyżej max_entries najdawniej używane (LRU) usuwa.
+        Macierz w pamięci aktualizowana przyrostowo (nowy wiersz, bez usuniętych) – bez ponownego odczytu tabeli.
+        """
+        unit = self._unit(vector)
+        now = time.time()
+        with self._lock:
+            with self._conn:
+                cursor = self._conn.execute(
+                    "INSERT INTO answers (namespace, query, vector, answer, flow_log, created_at, last_used) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (self.namespace, query, unit.tobytes(), answer, json.dumps(flow_log, ensure_ascii=False), now, now),
+                )
+                evicted = [int(i) for i in self._ids[self._created < now - self.ttl_s]]
+                if len(self._ids) + 1 - len(evicted) > self.max_entries:
+                    evicted += [
+                        r[0]
+                        for r in self._conn.execute(
+                            "SELECT id FROM answers WHERE created_at >= ? ORDER BY last_used DESC LIMIT -1 OFFSET ?",
+                            (now - self.ttl_s, self.max_entries),
+                        )
+                    ]
+                if evicted:
+                    self._conn.executemany("DELETE FROM answers WHERE id = ?", [(i,) for i in evicted])
+            self._ids = np.append(self._ids, cursor.lastrowid)
+            self._created = np.append(self._created, now)
+            self._matrix = np.vstack([self._matrix, unit]) if len(self._matrix) else unit[np.newaxis, :]
+            if evicted:
+                keep = ~np.isin(self._ids, evicted)
+                self._ids, self._created, self._matrix = self._ids[keep], self._created[keep], self._matrix[keep]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._ids)}
+
+    def clear(self) -> None:
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM answers")
+            self._load()
@@ -1,16 +1,42 @@
-"""Testy jednostkowe build_index – bez Chroma/API."""
+"""Testy jednostkowe build_index – bez API (Chroma tylko w pamięci, fałszywe embeddingi)."""
 
+import io
 import os
 import sys
+import tempfile
 import unittest
+from contextlib import redirect_stdout
+from functools import partial
+from unittest.mock import patch
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import chromadb
+import httpx
+import numpy as np
+import openai
 import pandas as pd
 
 from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_text_splitters import RecursiveCharacterTextSplitter
 
-from build_index import _chroma_safe_metadata_value, _df_to_docs
+from build_index import (
+    _assign_chunk_ids,
+    _chroma_safe_metadata_value,
+    _df_to_docs,
+    _prepare_rebuild,
+    _read_checkpoint,
+    build_index,
+    embed_and_upsert,
+    iter_chunks,
+    iter_parquet_frames,
+    sync_vector_store,
+)
+from chunk_stitching import stitch_adjacent
+from config import EMBEDDING_MODEL
+from embedding_store import EmbeddingStore
+from vector_store import ChromaVectorStore, InMemoryVectorStore
 
 
 class TestChromaSafeMetadataValue(unittest.TestCase):
@@ -110,5 +136,274 @@ class TestDfToDocs(unittest.TestCase):
         self.assertIn("keywords", docs[0].metadata)
 
 
+class _CountingEmbedding(DeterministicFakeEmbedding):
+    embedded: int = 0
+
+    def embed_documents(self, texts):
+        self.embedded += len(texts)
+        return super().embed_documents(texts)
+
+
+def _df_to_docs_iterrows(df: pd.DataFrame):
+    """Poprzednia implementacja _df_to_docs (df.iterrows) – referencja dla wersji kolumnowej."""
+    docs = []
+    for _, row in df.iterrows():
+        content = row.get("content", "")
+        if not content or (isinstance(content, str) and not content.strip()):
+            content = f"{row.get('title', '')}\n\n{row.get('description', '')}".strip() or "(brak treści)"
+        metadata = {
+            "file_path": _chroma_safe_metadata_value(row.get("file_path", "")),
+            "title": _chroma_safe_metadata_value(row.get("title", "")),
+        }
+        for key in ("tags", "keywords", "aliases"):
+            if key in row and row[key] is not None:
+                metadata[key] = _chroma_safe_metadata_value(row[key])
+        docs.append(Document(page_content=content, metadata=metadata))
+    return docs
+
+
+class TestDfToDocsMatchesIterrows(unittest.TestCase):
+    """Wersja kolumnowa daje dokładnie to samo co df.iterrows() (także typy wartości metadanych)."""
+
+    def assertSameDocs(self, df):
+        # repr: NaN porównywalny, a typy numpy (np.float64(...)) różnią się od typów Pythona
+        expected = [repr((d.page_content, d.metadata)) for d in _df_to_docs_iterrows(df)]
+        actual = [repr((d.page_content, d.metadata)) for d in _df_to_docs(df)]
+        self.assertEqual(actual, expected)
+
+    def test_mixed_rows(self):
+        import numpy as np
+
+        df = pd.DataFrame({
+            "content": ["Body", "   ", "", ""],
+            "title": ["T", "Only title", "", None],
+            "description": ["D", None, "", "Desc"],
+            "file_path": ["a.md", None, "c.md", "d.md"],
+            "tags": [np.array(["docker", "cli"]), np.array([]), None, ["t"]],
+            "keywords": [None, "k", float("nan"), np.int64(3)],
+            "aliases": [{"x": 1}, None, ["a"], ""],
+        }, index=[5, 5, 2, 0])
+        self.assertSameDocs(df)
+
+    def test_null_content_falls_back_to_title(self):
+        # iterrows: NaN (null z parquet) był "prawdziwy" i Document(page_content=nan) rzucał błąd
+        docs = _df_to_docs(pd.DataFrame({"content": ["Body", None], "title": ["A", "B"], "description": ["", "D"]}))
+        self.assertEqual([d.page_content for d in docs], ["Body", "B\n\nD"])
+
+    def test_numeric_columns_and_missing_columns(self):
+        df = pd.DataFrame({"content": ["A", "", "C"], "title": [1, 2, 3], "keywords": [0.5, float("nan"), 2.0]})
+        self.assertSameDocs(df)
+        self.assertSameDocs(pd.DataFrame({"title": ["x", "y"]}))
+        self.assertSameDocs(pd.DataFrame())
+
+
+class TestIncrementalIndex(unittest.TestCase):
+    """Stabilne id chunków i inkrementalna synchronizacja magazynu wektorów (Chroma i w pamięci)."""
+
+    def _chunks(self, *items):
+        docs = [Document(page_content=text, metadata={"file_path": path, "title": title}) for path, text, title in items]
+        _assign_chunk_ids(docs)
+        return docs
+
+    def test_ids_stable_and_unique(self):
+        a = self._chunks(("a.md", "same", "T"), ("a.md", "same", "T"), ("b.md", "same", "T"))
+        b = self._chunks(("a.md", "same", "T"), ("a.md", "same", "T"), ("b.md", "same", "T"))
+        self.assertEqual([d.id for d in a], [d.id for d in b])
+        self.assertEqual(len({d.id for d in a}), 3)
+
+    @staticmethod
+    def _counts(summary):
+        return {k: summary[k] for k in ("added", "updated", "removed", "unchanged")}
+
+    def test_sync_only_embeds_changes(self):
+        backends = {
+            "chroma": lambda: ChromaVectorStore.open(collection_name="test_incremental", client=chromadb.EphemeralClient()),
+            "memory": InMemoryVectorStore,
+        }
+        for name, open_store in backends.items():
+            with self.subTest(backend=name):
+                self._check_sync(open_store())
+
+    def _check_sync(self, vector_store):
+        embedding = _CountingEmbedding(size=8)
+        first = self._chunks(("a.md", "alpha", "A"), ("a.md", "beta", "A"), ("b.md", "gamma", "B"))
+        summary = sync_vector_store(vector_store, embedding, first)
+        self.assertEqual(self._counts(summary), {"added": 3, "updated": 0, "removed": 0, "unchanged": 0})
+        self.assertEqual(embedding.embedded, 3)
+
+        # beta zmieniona treść, gamma zmieniony tytuł, delta nowa
+        second = self._chunks(("a.md", "alpha", "A"), ("a.md", "beta v2", "A"), ("b.md", "gamma", "B2"), ("c.md", "delta", "C"))
+        summary = sync_vector_store(vector_store, embedding, second)
+        self.assertEqual(self._counts(summary), {"added": 2, "updated": 1, "removed": 1, "unchanged": 1})
+        self.assertEqual(embedding.embedded, 5)
+        stored = [d for docs, _ in vector_store.scan() for d in docs]
+        self.assertEqual(sorted(d.id for d in stored), sorted(d.id for d in second))
+        self.assertEqual({d.id: d.metadata for d in stored}[second[2].id]["title"], "B2")
+
+        summary = sync_vector_store(vector_store, embedding, second)
+        self.assertEqual(self._counts(summary), {"added": 0, "updated": 0, "removed": 0, "unchanged": 4})
+        self.assertEqual(embedding.embedded, 5)
+
+
+class TestStreamingIngestion(unittest.TestCase):
+    """Parquet partiami → chunki: te same chunki i id co przy przetwarzaniu całości naraz."""
+
+    def test_batches_match_whole_frame(self):
+        df = pd.DataFrame([
+            {"content": f"Section {i % 3}. " + "docker volume " * 20, "title": f"T{i}", "file_path": f"p{i % 2}.md"}
+            for i in range(7)
+        ])
+        make_splitter = partial(RecursiveCharacterTextSplitter, chunk_size=120, chunk_overlap=20)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "docs.parquet")
+            df.to_parquet(path)
+            frames = list(iter_parquet_frames(path, batch_rows=3))
+            streamed = list(iter_chunks(iter_parquet_frames(path, batch_rows=3), make_splitter))
+        self.assertEqual([len(f) for f in frames], [3, 3, 1])
+        whole = list(iter_chunks([df], make_splitter))
+        self.assertEqual([(d.id, d.page_content) for d in streamed], [(d.id, d.page_content) for d in whole])
+        self.assertEqual(len({d.id for d in streamed}), len(streamed))
+        first, second = streamed[0], streamed[1]
+        self.assertEqual((first.metadata["chunk_index"], second.metadata["chunk_index"]), (0, 1))
+        self.assertEqual(first.metadata["source_id"], second.metadata["source_id"])
+        self.assertEqual(first.metadata["next_chunk_id"], second.id)
+
+    def test_rows_sharing_file_path_are_separate_sources(self):
+        """Wiersze o tym samym (albo pustym) file_path: bez wspólnego source_id i next_chunk_id między dokumentami."""
+        df = pd.DataFrame([
+            {"content": "Alpha page. " + "docker volume " * 20, "title": "A", "file_path": "same.md"},
+            {"content": "Beta page. " + "docker network " * 20, "title": "B", "file_path": "same.md"},
+            {"content": "Gamma page. " + "docker image " * 20, "title": "C", "file_path": ""},
+            {"content": "Delta page. " + "docker build " * 20, "title": "D", "file_path": ""},
+        ])
+        chunks = list(iter_chunks([df], partial(RecursiveCharacterTextSplitter, chunk_size=120, chunk_overlap=20)))
+        by_title = {}
+        for d in chunks:
+            by_title.setdefault(d.metadata["title"], []).append(d)
+        self.assertGreater(len(by_title["A"]), 1)
+        self.assertEqual(len({d.metadata["source_id"] for d in by_title["A"]}), 1)
+        self.assertNotEqual(by_title["A"][0].metadata["source_id"], by_title["B"][0].metadata["source_id"])
+        self.assertNotIn(by_title["B"][0].id, [d.metadata.get("next_chunk_id") for d in by_title["A"]])
+        for d in by_title["C"] + by_title["D"]:
+            self.assertNotIn("source_id", d.metadata)
+            self.assertNotIn("next_chunk_id", d.metadata)
+        self.assertGreater(len(by_title["C"]), 1)
+        stitched, stats = stitch_adjacent(by_title["C"][:2])  # kolejne chunki, ale bez file_path – nie łączone
+        self.assertEqual(stats["stitched"], 0)
+        self.assertEqual(len(stitched), 2)
+
+    def test_process_pool_output_identical(self):
+        df = pd.DataFrame({
+            "content": [f"Page {i}. " + "docker compose up " * (5 + i % 30) for i in range(300)],
+            "title": [f"T{i}" for i in range(300)],
+            "file_path": [f"p{i % 7}.md" for i in range(300)],
+        })
+        make_splitter = partial(RecursiveCharacterTextSplitter, chunk_size=100, chunk_overlap=30)
+        single = [(d.id, d.page_content, d.metadata) for d in iter_chunks([df[:150], df[150:]], make_splitter, workers=1)]
+        pooled = [(d.id, d.page_content, d.metadata) for d in iter_chunks([df[:150], df[150:]], make_splitter, workers=3)]
+        self.assertEqual(pooled, single)
+
+    def test_build_without_source_keeps_existing_index(self):
+        """Brak parquet (nieudane pobranie z Kaggle) albo pusty plik → błąd, bez synchronizacji i bez REBUILD."""
+        store = InMemoryVectorStore()
+        docs = [Document(page_content=f"chunk {i}", metadata={"n": i}, id=f"id{i}") for i in range(3)]
+        store.upsert(docs, [[1.0, float(i)] for i in range(3)])
+        with tempfile.TemporaryDirectory() as tmp:
+            empty = os.path.join(tmp, "empty.parquet")
+            pd.DataFrame({"content": pd.Series([], dtype=str)}).to_parquet(empty)
+            for source, error in ((None, FileNotFoundError), (empty, ValueError)):
+                with self.subTest(source=source), patch("build_index._find_parquet", return_value=source), patch(
+                    "build_index.open_vector_store", return_value=store
+                ), patch("build_index._prepare_rebuild") as prepare, patch.dict(os.environ, {"REBUILD_INDEX": "1"}):
+                    with self.assertRaises(error):
+                        build_index()
+                    prepare.assert_not_called()
+                self.assertEqual(sorted(d.id for page, _ in store.scan() for d in page), ["id0", "id1", "id2"])
+
+    def test_empty_source_yields_placeholder(self):
+        chunks = list(iter_chunks(iter_parquet_frames(None), RecursiveCharacterTextSplitter))
+        self.assertEqual([d.page_content for d in chunks], ["(brak dokumentów)"])
+
+
+class _FlakyEmbedding(DeterministicFakeEmbedding):
+    """Pierwsze `failures` wywołań kończy się błędem połączenia (jak chwilowy problem z siecią)."""
+
+    failures: int = 0
+
+    def embed_documents(self, texts):
+        if self.failures:
+            self.failures -= 1
+            raise openai.APIConnectionError(request=httpx.Request("POST", "https://example.invalid/embeddings"))
+        return super().embed_documents(texts)
+
+
+class TestEmbedAndUpsert(unittest.TestCase):
+    """Batche embeddingów: retry z backoffem i checkpoint zapisanych id."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.checkpoint = os.path.join(self.tmp.name, "checkpoint.txt")
+        self.vector_store = ChromaVectorStore.open(collection_name="test_embed_and_upsert", client=chromadb.EphemeralClient())
+        self.docs = [Document(page_content=f"chunk {i}", metadata={"n": i}, id=f"id{i}") for i in range(5)]
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_batches_retry_and_checkpoint(self):
+        embedding = _FlakyEmbedding(size=4, failures=2)
+        stats = embed_and_upsert(
+            self.vector_store, embedding, self.docs, batch_size=2, concurrency=2, backoff_s=0, checkpoint_path=self.checkpoint
+        )
+        self.assertEqual((stats["embedded"], stats["api_calls"], stats["retries"]), (5, 3, 2))
+        self.assertEqual(self.vector_store.count(), 5)
+        self.assertEqual(_read_checkpoint(self.checkpoint), {d.id for d in self.docs})
+
+    def test_gives_up_after_max_retries(self):
+        embedding = _FlakyEmbedding(size=4, failures=10)
+        with self.assertRaises(openai.APIConnectionError):
+            embed_and_upsert(self.vector_store, embedding, self.docs[:1], max_retries=1, backoff_s=0, checkpoint_path=self.checkpoint)
+        self.assertEqual(_read_checkpoint(self.checkpoint), set())
+
+    def test_store_vectors_reused_without_api_calls(self):
+        store = EmbeddingStore(os.path.join(self.tmp.name, "store.sqlite"), "fake")
+        first = embed_and_upsert(self.vector_store, _CountingEmbedding(size=4), self.docs[:3], batch_size=2, embedding_store=store)
+        embedding = _CountingEmbedding(size=4)
+        other = InMemoryVectorStore()
+        stats = embed_and_upsert(other, embedding, self.docs, batch_size=2, embedding_store=store)
+        self.assertEqual((first["reused"], first["api_calls"]), (0, 2))
+        self.assertEqual((stats["reused"], stats["api_calls"], embedding.embedded), (3, 1, 2))
+        self.assertEqual(other.count(), 5)
+        np.testing.assert_allclose(
+            other.get_embeddings(["id0"])["id0"], self.vector_store.get_embeddings(["id0"])["id0"], rtol=1e-6
+        )
+
+    def test_checkpoint_of_other_model_ignored(self):
+        with open(self.checkpoint, "w", encoding="utf-8") as f:
+            f.write("# other/model\nid0\n")
+        self.assertIsNone(_read_checkpoint(self.checkpoint))
+
+    def test_checkpoint_records_build_mode(self):
+        embed_and_upsert(self.vector_store, _CountingEmbedding(size=4), self.docs[:2], checkpoint_path=self.checkpoint)
+        self.assertEqual(_read_checkpoint(self.checkpoint, "sync"), {"id0", "id1"})
+        self.assertIsNone(_read_checkpoint(self.checkpoint, "rebuild"))
+        # rebuild nie dopisuje do checkpointu synchronizacji – zaczyna własny
+        embed_and_upsert(self.vector_store, _CountingEmbedding(size=4), self.docs[2:3], checkpoint_path=self.checkpoint, checkpoint_mode="rebuild")
+        self.assertEqual(_read_checkpoint(self.checkpoint, "rebuild"), {"id2"})
+        with open(self.checkpoint, "w", encoding="utf-8") as f:
+            f.write(f"# {EMBEDDING_MODEL}\nid0\n")  # format sprzed zapisu trybu
+        self.assertEqual(_read_checkpoint(self.checkpoint, "sync"), {"id0"})
+
+    def test_forced_rebuild_resumes_only_interrupted_rebuild(self):
+        index_dir = os.path.join(self.tmp.name, "chroma")
+        for mode, resumed in (("rebuild", True), ("sync", False)):
+            os.makedirs(index_dir, exist_ok=True)
+            with open(self.checkpoint, "w", encoding="utf-8") as f:
+                f.write(f"# {EMBEDDING_MODEL} {mode}\nid0\n")
+            with redirect_stdout(io.StringIO()):
+                self.assertEqual(_prepare_rebuild(self.checkpoint, (index_dir,)), resumed, mode)
+            self.assertEqual(os.path.isdir(index_dir), resumed, mode)
+            self.assertEqual(os.path.isfile(self.checkpoint), resumed, mode)
+
+
 if __name__ == "__main__":
     unittest.main(verbosity=2)
@@ -0,0 +1,71 @@
+"""Testy sklejania sąsiednich chunków (chunk_stitching.py) – bez Chroma/API."""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from chunk_stitching import merge_overlapping, stitch_adjacent
+
+TEXT = " ".join(f"Sentence {i} explains how docker compose starts service number {i}." for i in range(30))
+
+
+def _chunks(source_id: str = "s1") -> list[Document]:
+    splits = RecursiveCharacterTextSplitter(chunk_size=300, chunk_overlap=80).split_text(TEXT)
+    docs = [
+        Document(id=f"{source_id}-{i}", page_content=text, metadata={"title": "Compose", "source_id": source_id, "chunk_index": i})
+        for i, text in enumerate(splits)
+    ]
+    for d, following in zip(docs, docs[1:]):
+        d.metadata["next_chunk_id"] = following.id
+    return docs
+
+
+class TestMergeOverlapping(unittest.TestCase):
+    def test_splitter_overlap_removed(self):
+        chunks = _chunks()
+        text, removed = merge_overlapping(chunks[0].page_content, chunks[1].page_content)
+        self.assertGreater(removed, 0)
+        self.assertTrue(TEXT.startswith(text))
+        self.assertEqual(text.count("Sentence 3 "), 1)
+
+    def test_no_overlap_joined_with_newline(self):
+        self.assertEqual(merge_overlapping("First part.", "Second part."), ("First part.\nSecond part.", 0))
+
+
+class TestStitchAdjacent(unittest.TestCase):
+    def test_consecutive_chunks_become_one_block_at_best_rank(self):
+        chunks = _chunks()
+        other = Document(id="x", page_content="Unrelated", metadata={"source_id": "s2", "chunk_index": 4})
+        plain = Document(page_content="No position metadata")
+        docs, stats = stitch_adjacent([other, chunks[2], plain, chunks[1], chunks[5]])
+        self.assertEqual([d.id for d in docs], ["x", "s1-1", None, "s1-5"])
+        self.assertEqual(docs[1].metadata["stitched_chunks"], 2)
+        self.assertIn(docs[1].page_content, TEXT)
+        self.assertEqual(stats["stitched"], 1)
+        self.assertGreater(stats["overlap_chars"], 0)
+
+    def test_missing_middle_chunk_fetched_by_id(self):
+        chunks = _chunks()
+        requested = []
+
+        def fetch(ids):
+            requested.extend(ids)
+            return [d for d in chunks if d.id in ids]
+
+        docs, stats = stitch_adjacent([chunks[3], chunks[1]], fetch)
+        self.assertEqual(requested, ["s1-2"])
+        self.assertEqual(len(docs), 1)
+        self.assertEqual(docs[0].metadata["stitched_chunks"], 3)
+        self.assertEqual(stats["fetched"], 1)
+        unchanged, stats = stitch_adjacent([chunks[3], chunks[1]])
+        self.assertEqual([d.id for d in unchanged], ["s1-3", "s1-1"])
+        self.assertEqual(stats["stitched"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
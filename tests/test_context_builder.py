@@ -0,0 +1,86 @@
+"""Testy składania kontekstu w budżecie tokenów (context_builder.py) – enkoder wstrzykiwany, bez tiktoken."""
+
+import os
+import re
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.documents import Document
+
+from context_builder import BLOCK_SEPARATOR, build_context, cut_to_tokens, trim_to_sentences
+
+
+class _WordEncoder:
+    """Token = słowo (z poprzedzającym białym znakiem)."""
+
+    def encode(self, text: str) -> list[str]:
+        return re.findall(r"\s*\S+", text)
+
+
+ENCODER = _WordEncoder()
+
+
+def _doc(title: str, text: str) -> Document:
+    return Document(page_content=text, metadata={"title": title})
+
+
+class TestTrimToSentences(unittest.TestCase):
+    def test_keeps_whole_sentences_only(self):
+        text = "Run the container. Publish the port with -p. Then open the browser."
+        self.assertEqual(trim_to_sentences(text, 8, ENCODER), "Run the container. Publish the port with -p.")
+        self.assertEqual(trim_to_sentences(text, 2, ENCODER), "")
+
+    def test_paragraph_and_code_block_boundaries(self):
+        text = "Example:\n\n```\ndocker run -d nginx\n```\n\nMore text here"
+        self.assertEqual(trim_to_sentences(text, 7, ENCODER), "Example:\n\n```\ndocker run -d nginx\n```")
+
+
+class TestBuildContext(unittest.TestCase):
+    def test_adds_chunks_until_budget_and_trims_last(self):
+        docs = [
+            _doc("A", "One two three four five six seven eight nine ten."),
+            _doc("B", "Alpha beta gamma delta. " * 10),
+            _doc("C", "Never included."),
+        ]
+        context, stats = build_context(docs, 50, ENCODER)
+        blocks = context.split(BLOCK_SEPARATOR)
+        self.assertEqual(len(blocks), 2)
+        self.assertTrue(blocks[0].startswith("[1] (from: A)\n"))
+        self.assertTrue(blocks[1].startswith("[2] (from: B)\n") and blocks[1].endswith("delta."))
+        self.assertNotIn("Never", context)
+        self.assertEqual(stats["tokens"], len(ENCODER.encode(context)))
+        self.assertLessEqual(stats["tokens"], 50)
+        self.assertEqual((stats["chunks"], stats["trimmed"], stats["dropped"]), (2, True, 1))
+
+    def test_small_leftover_is_not_filled(self):
+        docs = [_doc("A", "word " * 30), _doc("B", "Short sentence. " * 20)]
+        context, stats = build_context(docs, 40, ENCODER)
+        self.assertEqual(stats["chunks"], 1)
+        self.assertFalse(stats["trimmed"])
+
+    def test_first_chunk_without_sentence_boundary_is_cut_hard(self):
+        """Długi blok kodu bez granicy zdania w budżecie – twarde cięcie zamiast pustego kontekstu."""
+        code = "```\n" + " ".join(f"--flag{i}" for i in range(200)) + "\n```"
+        context, stats = build_context([_doc("CLI", code), _doc("B", "Next.")], 30, ENCODER)
+        self.assertTrue(context.startswith("[1] (from: CLI)\n```\n--flag0 --flag1"))
+        self.assertLessEqual(stats["tokens"], 30)
+        self.assertEqual((stats["chunks"], stats["trimmed"], stats["dropped"]), (1, True, 1))
+
+    def test_cut_to_tokens_with_and_without_decode(self):
+        self.assertEqual(cut_to_tokens("a b c d e", 3, ENCODER), "a b c")
+        self.assertEqual(cut_to_tokens("a b c", 0, ENCODER), "")
+
+        class _DecodingEncoder(_WordEncoder):
+            def decode(self, tokens):
+                return "".join(tokens)
+
+        self.assertEqual(cut_to_tokens("a b c d e", 2, _DecodingEncoder()), "a b")
+
+    def test_empty(self):
+        self.assertEqual(build_context([], 100, ENCODER), ("", {"chunks": 0, "tokens": 0, "budget": 100, "trimmed": False, "dropped": 0}))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,62 @@
+"""Testy ekstrakcyjnej kompresji kontekstu (context_compression.py) – bez LLM/API."""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.documents import Document
+
+from context_compression import GAP_MARKER, compress_documents, compress_text, query_terms, split_units
+
+PAGE = """---
+title: Publish ports
+---
+Home / Manuals / Networking
+Docker Desktop is available for Mac, Windows and Linux. By default a container does not expose ports to the host.
+Publish a port with the -p flag:
+
+```console
+$ docker run -p 8080:80 nginx
+```
+
+Registry mirrors reduce network traffic when many hosts pull the same images."""
+
+
+class TestSplitUnits(unittest.TestCase):
+    def test_front_matter_dropped_code_block_whole(self):
+        units = split_units(PAGE)
+        self.assertNotIn("title: Publish ports", [u for u, _ in units])
+        self.assertIn(("```console\n$ docker run -p 8080:80 nginx\n```", True), units)
+        self.assertIn(("By default a container does not expose ports to the host.", False), units)
+
+    def test_unclosed_code_block_at_chunk_end(self):
+        self.assertEqual(split_units("Run it:\n```\ndocker ps")[-1], ("```\ndocker ps", True))
+
+
+class TestCompress(unittest.TestCase):
+    def test_keeps_matching_sentences_and_their_code(self):
+        text, kept, total = compress_text(PAGE, query_terms(["How to expose a port?"]))
+        self.assertIn("does not expose ports", text)
+        self.assertIn("$ docker run -p 8080:80 nginx", text)
+        self.assertNotIn("Registry mirrors", text)
+        self.assertNotIn("Home / Manuals", text)
+        self.assertLess(kept, total)
+        self.assertTrue(text.endswith(GAP_MARKER))
+
+    def test_idf_weights_prefer_rare_terms(self):
+        text = "Docker runs containers.\nUse --network host for host networking."
+        compressed, _, _ = compress_text(text, query_terms(["docker --network"]), {"docker": 0.1, "--network": 5.0})
+        self.assertEqual(compressed, GAP_MARKER + "\nUse --network host for host networking.")
+
+    def test_chunk_without_overlap_keeps_leading_sentences(self):
+        docs = [Document(id="x", page_content=PAGE, metadata={"title": "Ports"})]
+        compressed, stats = compress_documents(docs, ["kubernetes helm chart"])
+        self.assertEqual(compressed[0].id, "x")
+        self.assertTrue(compressed[0].page_content.startswith(GAP_MARKER + "\nDocker Desktop is available"))
+        self.assertLess(stats["chars_after"], stats["chars_before"])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
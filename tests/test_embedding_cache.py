@@ -0,0 +1,93 @@
+"""Testy jednostkowe cache embeddingów zapytań – bez API (SQLite w katalogu tymczasowym)."""
+
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embedding_cache import CachedEmbeddings, EmbeddingCache, cache_key, normalize_text
+
+
+class TestNormalization(unittest.TestCase):
+    """Klucz cache: model + znormalizowany tekst."""
+
+    def test_whitespace_collapsed(self):
+        self.assertEqual(normalize_text("  docker   run\n-p "), "docker run -p")
+
+    def test_key_depends_on_model(self):
+        self.assertNotEqual(cache_key("m1", "docker"), cache_key("m2", "docker"))
+        self.assertEqual(cache_key("m1", "docker  run"), cache_key("m1", " docker run"))
+
+
+class TestEmbeddingCache(unittest.TestCase):
+    """LRU w pamięci + trwały SQLite."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "emb.sqlite")
+
+    def test_persists_across_instances(self):
+        EmbeddingCache(self.path, "m1").put_many(["docker volume mount"], [[0.5, 0.25]])
+        cache = EmbeddingCache(self.path, "m1")
+        self.assertEqual(cache.get_many(["docker volume mount"]), [[0.5, 0.25]])
+        self.assertEqual(cache.stats()["hits"], 1)
+
+    def test_model_change_invalidates(self):
+        EmbeddingCache(self.path, "m1").put_many(["q"], [[1.0]])
+        cache = EmbeddingCache(self.path, "m2")
+        self.assertEqual(cache.get_many(["q"]), [None])
+        self.assertEqual(cache.stats()["disk_items"], 0)
+        self.assertEqual(cache.misses, 1)
+
+    def test_memory_lru_eviction(self):
+        cache = EmbeddingCache(self.path, "m1", max_memory_items=2)
+        cache.put_many(["a", "b"], [[1.0], [2.0]])
+        cache.get_many(["a"])  # "a" najświeższy
+        cache.put_many(["c"], [[3.0]])
+        self.assertEqual(cache.stats()["memory_items"], 2)
+        self.assertNotIn(cache_key("m1", "b"), cache._memory)
+        self.assertIn(cache_key("m1", "a"), cache._memory)
+
+    def test_disk_size_limit(self):
+        cache = EmbeddingCache(self.path, "m1", max_disk_items=3)
+        for i in range(5):
+            cache.put_many([f"q{i}"], [[float(i)]])
+        self.assertEqual(cache.stats()["disk_items"], 3)
+
+
+class TestCachedEmbeddings(unittest.TestCase):
+    """Wrapper Embeddings: brakujące teksty jednym wywołaniem API, trafienia z cache."""
+
+    def test_hits_skip_api(self):
+        client = MagicMock()
+        client.embed_documents.side_effect = lambda texts: [[float(len(t))] for t in texts]
+        emb = CachedEmbeddings(client, EmbeddingCache(":memory:", "m1"))
+
+        vectors, stats = emb.embed_with_stats(["docker run -p", "docker volume mount"])
+        self.assertEqual(stats, {"hits": 0, "misses": 2, "api_calls": 1})
+        self.assertEqual(vectors, [[13.0], [19.0]])
+
+        vectors, stats = emb.embed_with_stats(["docker run  -p", "new query"])
+        self.assertEqual(stats, {"hits": 1, "misses": 1, "api_calls": 1})
+        client.embed_documents.assert_called_with(["new query"])
+        self.assertEqual(vectors[0], [13.0])
+
+        _, stats = emb.embed_with_stats(["new query"])
+        self.assertEqual(stats["api_calls"], 0)
+        self.assertEqual(client.embed_documents.call_count, 2)
+
+    def test_duplicates_in_batch_embedded_once(self):
+        client = MagicMock()
+        client.embed_documents.side_effect = lambda texts: [[1.0] for _ in texts]
+        emb = CachedEmbeddings(client, EmbeddingCache(":memory:", "m1"))
+        vectors, _ = emb.embed_with_stats(["q", "q "])
+        client.embed_documents.assert_called_once_with(["q"])
+        self.assertEqual(vectors, [[1.0], [1.0]])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,55 @@
+"""Testy magazynu embeddingów chunków (content-addressed) – bez API, SQLite w katalogu tymczasowym."""
+
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embedding_store import EmbeddingStore, content_key
+
+
+class TestEmbeddingStore(unittest.TestCase):
+    """Klucz = model + dokładny tekst; wpisy trwałe i współdzielone między instancjami."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "store.sqlite")
+
+    def test_key_is_exact_text_and_model(self):
+        self.assertNotEqual(content_key("m", "docker run"), content_key("m", "docker  run"))
+        self.assertNotEqual(content_key("m1", "docker"), content_key("m2", "docker"))
+
+    def test_roundtrip_and_stats(self):
+        store = EmbeddingStore(self.path, "m")
+        store.put_many(["a", "b"], [[0.5, 1.0], [2.0, -1.0]])
+        self.assertEqual(store.get_many(["b", "x", "a"]), [[2.0, -1.0], None, [0.5, 1.0]])
+        self.assertEqual(store.stats(), {"reused": 2, "stored": 2, "vectors": 2})
+
+    def test_shared_across_instances_and_models(self):
+        EmbeddingStore(self.path, "m1").put_many(["a"], [[1.0]])
+        self.assertEqual(EmbeddingStore(self.path, "m1").get_many(["a"]), [[1.0]])
+        self.assertEqual(EmbeddingStore(self.path, "m2").get_many(["a"]), [None])
+
+    def test_concurrent_writers(self):
+        stores = [EmbeddingStore(self.path, "m") for _ in range(4)]
+        texts = [f"chunk {i}" for i in range(200)]
+
+        def write(store):
+            for i in range(0, len(texts), 20):
+                store.put_many(texts[i : i + 20], [[float(j)] for j in range(i, i + 20)])
+
+        threads = [threading.Thread(target=write, args=(s,)) for s in stores]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(stores[0]), 200)
+        self.assertEqual(stores[0].get_many(texts[-1:]), [[199.0]])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,94 @@
+"""Testy jednostkowe indeksu BM25 (lexical_index.py) – bez Chroma/API."""
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from langchain_core.documents import Document
+
+from lexical_index import LexicalIndex, LexicalIndexWriter, tokenize
+
+DOCS = [
+    Document(page_content="Use docker run --network host to share the host network.", metadata={"title": "Networking"}),
+    Document(page_content="The EXPOSE instruction documents which port the container listens on.", metadata={"title": "Dockerfile"}),
+    Document(page_content="Remove unused images with docker image prune -a.", metadata={"title": "Prune"}),
+    Document(page_content="Volumes persist data generated by containers.", metadata={"title": "Volumes"}),
+]
+
+
+class TestTokenize(unittest.TestCase):
+    """Tokenizacja zachowuje flagi CLI i nazwy plików."""
+
+    def test_cli_flags_kept(self):
+        self.assertEqual(tokenize("docker run --network host -p 80"), ["docker", "run", "--network", "host", "-p", "80"])
+
+    def test_lowercase_and_filenames(self):
+        self.assertEqual(tokenize("EXPOSE in docker-compose.yml."), ["expose", "in", "docker-compose.yml"])
+
+
+class TestLexicalIndex(unittest.TestCase):
+    """Budowa, zapis/odczyt postingów i wyszukiwanie BM25."""
+
+    def test_exact_token_ranks_first(self):
+        index = LexicalIndex.build(DOCS)
+        results = index.search("--network", k=2)
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0][0].metadata["title"], "Networking")
+
+    def test_multi_term_query(self):
+        index = LexicalIndex.build(DOCS)
+        results = index.search("docker image prune", k=3)
+        self.assertEqual(results[0][0].metadata["title"], "Prune")
+        scores = [score for _, score in results]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_search_restricted_to_rows(self):
+        index = LexicalIndex.build(DOCS)
+        self.assertEqual([d.metadata["title"] for d, _ in index.search("docker", k=3, rows=np.array([0]))], ["Networking"])
+        self.assertEqual(index.search("docker image prune", k=3, rows=np.array([1, 3])), [])
+
+    def test_unknown_terms_return_empty(self):
+        self.assertEqual(LexicalIndex.build(DOCS).search("kubernetes helm", k=3), [])
+
+    def test_save_and_load_roundtrip(self):
+        built = LexicalIndex.build(DOCS)
+        with tempfile.TemporaryDirectory() as tmp:
+            built.save(tmp)
+            loaded = LexicalIndex.load(tmp)
+            self.assertIsNotNone(loaded)
+            self.assertEqual(len(loaded), len(DOCS))
+            expected = [(d.page_content, round(s, 5)) for d, s in built.search("EXPOSE port", k=4)]
+            actual = [(d.page_content, round(s, 5)) for d, s in loaded.search("EXPOSE port", k=4)]
+            self.assertEqual(actual, expected)
+            self.assertEqual(loaded.search("EXPOSE", k=1)[0][0].metadata, {"title": "Dockerfile"})
+
+    def test_load_missing_returns_none(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            self.assertIsNone(LexicalIndex.load(tmp))
+
+
+class TestLexicalIndexWriter(unittest.TestCase):
+    """Strumieniowa budowa daje te same postingi co LexicalIndex.build()."""
+
+    def test_same_as_build(self):
+        built = LexicalIndex.build(DOCS)
+        with tempfile.TemporaryDirectory() as tmp:
+            writer = LexicalIndexWriter(tmp)
+            writer.add(DOCS[:3])
+            writer.add(DOCS[3:])
+            written = writer.finish()
+            loaded = LexicalIndex.load(tmp)
+            self.assertEqual(sorted(os.listdir(tmp)), ["docs.jsonl", "postings.npz"])
+            for index in (written, loaded):
+                self.assertEqual(index.vocab, built.vocab)
+                for name in ("offsets", "doc_ids", "tfs", "doc_lens"):
+                    np.testing.assert_array_equal(getattr(index, name), getattr(built, name))
+            self.assertEqual(loaded.search("volumes", k=1)[0][0].page_content, DOCS[3].page_content)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,78 @@
+"""Testy odwróconego indeksu metadanych (metadata_index.py) – bez Chroma/API."""
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.documents import Document
+
+from metadata_index import MetadataIndex, MetadataIndexWriter, metadata_values, normalize_filters, validate_filters
+
+DOCS = [
+    Document(id="c0", page_content="services:", metadata={"tags": '["Compose", "networking"]', "keywords": "yaml, services"}),
+    Document(id="c1", page_content="docker network create", metadata={"tags": '["networking"]'}),
+    Document(id="c2", page_content="docker compose up", metadata={"tags": '["compose"]', "aliases": '["/compose/up/"]'}),
+    Document(id="c3", page_content="docker volume create", metadata={"title": "Volumes"}),
+]
+
+
+class TestMetadataValues(unittest.TestCase):
+    """Wartości z metadanych Chroma (napisy JSON, listy po przecinku) → lowercase."""
+
+    def test_json_list_comma_list_and_scalar(self):
+        self.assertEqual(metadata_values('["Compose", "networking", "compose"]'), ["compose", "networking"])
+        self.assertEqual(metadata_values("yaml,  Services "), ["services", "yaml"])
+        self.assertEqual(metadata_values(["A b"]), ["a b"])
+        self.assertEqual(metadata_values(""), [])
+        self.assertEqual(metadata_values(None), [])
+
+    def test_normalize_filters_drops_empty_fields(self):
+        self.assertEqual(normalize_filters({"tags": "Compose", "keywords": []}), {"tags": ("compose",)})
+        self.assertEqual(normalize_filters(None), {})
+
+    def test_validate_filters_lists_allowed_fields(self):
+        validate_filters({"tags": ["compose"], "keywords": "yaml"})
+        validate_filters(None)
+        with self.assertRaisesRegex(ValueError, r"tag.*dostępne: tags, keywords, aliases"):
+            validate_filters({"tag": ["compose"]})
+        with self.assertRaises(ValueError):
+            validate_filters(["compose"])
+
+
+class TestMetadataIndex(unittest.TestCase):
+    """OR w obrębie pola, AND między polami, zapis/odczyt."""
+
+    def setUp(self):
+        self.index = MetadataIndex.build(DOCS)
+
+    def test_or_within_field_and_across_fields(self):
+        self.assertEqual(self.index.rows({"tags": "compose"}).tolist(), [0, 2])
+        self.assertEqual(self.index.rows({"tags": ["compose", "networking"]}).tolist(), [0, 1, 2])
+        self.assertEqual(self.index.rows({"tags": ["networking"], "keywords": "yaml"}).tolist(), [0])
+        self.assertEqual(self.index.chunk_ids(self.index.rows({"aliases": "/compose/up/"})), ["c2"])
+        self.assertEqual(self.index.rows({"tags": "kubernetes"}).tolist(), [])
+        self.assertIsNone(self.index.rows({}))
+
+    def test_unknown_field(self):
+        with self.assertRaises(ValueError):
+            self.index.rows({"title": "Volumes"})
+
+    def test_writer_roundtrip(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "metadata.npz")
+            writer = MetadataIndexWriter(path)
+            for doc in DOCS:
+                writer.add([doc])
+            writer.finish()
+            loaded = MetadataIndex.load(path)
+            self.assertEqual(loaded.ids, ["c0", "c1", "c2", "c3"])
+            self.assertEqual(loaded.value_counts("tags"), {"compose": 2, "networking": 2})
+            self.assertEqual(loaded.rows({"tags": ["networking"]}).tolist(), [0, 1])
+            self.assertIsNone(MetadataIndex.load(os.path.join(tmp, "missing.npz")))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,71 @@
+"""Testy sygnatur MinHash i wykrywania prawie-duplikatów (near_duplicates.py) – bez Chroma/API."""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.documents import Document
+
+from near_duplicates import (
+    NUM_PERM,
+    SIGNATURE_KEY,
+    NearDuplicateFilter,
+    add_signature,
+    decode_signature,
+    encode_signature,
+    minhash_signature,
+    near_duplicate_of,
+    signature_of,
+    similarity,
+)
+
+PARAGRAPH = (
+    "Bind mounts have limited functionality compared to volumes. When you use a bind mount, a file or directory "
+    "on the host machine is mounted into a container. The file or directory is referenced by its absolute path."
+)
+COPY = PARAGRAPH.replace("Bind mounts", "**Bind mounts**") + " Learn more."
+OTHER = "Docker Compose lets you define a multi-container application in a single YAML file and start it with one command."
+
+
+class TestSignature(unittest.TestCase):
+    def test_deterministic_and_roundtrip(self):
+        signature = minhash_signature(PARAGRAPH)
+        self.assertEqual(signature.shape, (NUM_PERM,))
+        self.assertTrue((signature == minhash_signature(PARAGRAPH)).all())
+        self.assertTrue((decode_signature(encode_signature(signature)) == signature).all())
+        self.assertIsNone(decode_signature("abc"))
+        self.assertIsNone(decode_signature(None))
+
+    def test_similarity_separates_copies_from_unrelated_text(self):
+        self.assertGreaterEqual(similarity(minhash_signature(PARAGRAPH), minhash_signature(COPY)), 0.7)
+        self.assertLess(similarity(minhash_signature(PARAGRAPH), minhash_signature(OTHER)), 0.2)
+
+    def test_stored_signature_used_and_computed_when_missing(self):
+        doc = Document(page_content=PARAGRAPH)
+        add_signature(doc)
+        self.assertIn(SIGNATURE_KEY, doc.metadata)
+        stored = Document(page_content="changed text", metadata=dict(doc.metadata))
+        self.assertTrue((signature_of(stored) == minhash_signature(PARAGRAPH)).all())
+        self.assertTrue((signature_of(Document(page_content=OTHER)) == minhash_signature(OTHER)).all())
+
+
+class TestNearDuplicates(unittest.TestCase):
+    def test_owner_is_first_similar_doc(self):
+        docs = [Document(page_content=t) for t in (OTHER, PARAGRAPH, COPY, PARAGRAPH)]
+        self.assertEqual(near_duplicate_of(docs, 0.7), [0, 1, 1, 1])
+        self.assertEqual(near_duplicate_of(docs, 1.01), [0, 1, 2, 3])
+        self.assertEqual(near_duplicate_of([], 0.8), [])
+
+    def test_filter_drops_repeats_across_pages(self):
+        dedup = NearDuplicateFilter(0.7)
+        kept = [t for t in (PARAGRAPH, OTHER, COPY, PARAGRAPH) if not dedup.is_duplicate(Document(page_content=t))]
+        self.assertEqual(kept, [PARAGRAPH, OTHER])
+        self.assertEqual(dedup.dropped, 2)
+        with self.assertRaises(ValueError):
+            NearDuplicateFilter(0.8, bands=5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+"""Testy jednostkowe rerankingu post-retrieval (rerank.py) – bez Chroma/API."""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from rerank import minmax_normalize, mmr_select
+
+
+class TestMMRSelect(unittest.TestCase):
+    """Maximal Marginal Relevance na macierzy embeddingów."""
+
+    def setUp(self):
+        # 0 i 1 – prawie identyczne sąsiednie chunki, 2 – inny temat
+        self.embeddings = np.array([[1.0, 0.0], [0.99, 0.05], [0.0, 1.0]])
+        self.relevance = np.array([1.0, 0.9, 0.5])
+
+    def test_skips_near_duplicate(self):
+        self.assertEqual(mmr_select(self.relevance, self.embeddings, k=2, lambda_mult=0.5), [0, 2])
+
+    def test_lambda_1_is_pure_relevance(self):
+        self.assertEqual(mmr_select(self.relevance, self.embeddings, k=3, lambda_mult=1.0), [0, 1, 2])
+
+    def test_k_larger_than_candidates(self):
+        self.assertEqual(sorted(mmr_select(self.relevance, self.embeddings, k=10)), [0, 1, 2])
+
+    def test_zero_rows_not_penalized(self):
+        embeddings = np.array([[1.0, 0.0], [0.0, 0.0], [1.0, 0.0]])
+        self.assertEqual(mmr_select(np.array([1.0, 0.6, 0.9]), embeddings, k=2, lambda_mult=0.5), [0, 1])
+
+    def test_empty(self):
+        self.assertEqual(mmr_select(np.array([]), np.zeros((0, 4)), k=3), [])
+
+
+class TestMinmaxNormalize(unittest.TestCase):
+
+    def test_scales_to_unit_range(self):
+        np.testing.assert_allclose(minmax_normalize([2.0, 1.0, 0.0]), [1.0, 0.5, 0.0])
+
+    def test_constant_scores(self):
+        np.testing.assert_allclose(minmax_normalize([0.3, 0.3]), [1.0, 1.0])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
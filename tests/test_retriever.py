@@ -2,11 +2,17 @@
 
 import os
 import sys
+import threading
 import unittest
+from unittest.mock import MagicMock, patch
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from langchain_core.documents import Document
+
+import retriever
 from retriever import get_retriever, create_docker_docs_tool
+from vector_store import InMemoryVectorStore, VectorStore
 
 # Testy integracyjne (wymagają indeksu Chroma i API) – można pominąć: SKIP_INTEGRATION=1
 SKIP_INTEGRATION = os.environ.get("SKIP_INTEGRATION", "").lower() in ("1", "true", "yes")
@@ -49,6 +55,62 @@ SEMANTIC_QUERIES = [
 ]
 
 
+class TestRetrieverRegistry(unittest.TestCase):
+    """Rejestr współdzielonych uchwytów – bez Chroma/API (mock)."""
+
+    def setUp(self):
+        retriever.reload_vector_store()
+        self.addCleanup(retriever.reload_vector_store)
+        cache_patch = patch("retriever.get_embedding_cache", return_value=None)
+        cache_patch.start()
+        self.addCleanup(cache_patch.stop)
+
+    def test_store_opened_once_across_threads(self):
+        with patch("retriever.open_vector_store", return_value=MagicMock(spec=VectorStore)) as mock_open:
+            threads = [threading.Thread(target=get_retriever, kwargs={"k": 6}) for _ in range(8)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        self.assertEqual(mock_open.call_count, 1)
+
+    def test_embeddings_client_created_once(self):
+        with patch("retriever._create_embeddings", return_value=MagicMock()) as mock_emb:
+            threads = [threading.Thread(target=retriever.get_embeddings) for _ in range(8)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        self.assertEqual(mock_emb.call_count, 1)
+
+    def test_reload_reopens_store(self):
+        with patch("retriever.open_vector_store", side_effect=lambda *_: MagicMock(spec=VectorStore)) as mock_open:
+            first = retriever.get_vector_store()
+            self.assertIs(retriever.get_vector_store(), first)
+            retriever.reload_vector_store()
+            second = retriever.get_vector_store()
+        self.assertIsNot(first, second)
+        self.assertEqual(mock_open.call_count, 2)
+
+    def test_search_goes_through_backend(self):
+        store = InMemoryVectorStore()
+        store.upsert(
+            [
+                Document(id="a", page_content="volumes", metadata={"title": "Volumes"}),
+                Document(id="b", page_content="networks", metadata={"title": "Networking"}),
+            ],
+            [[1.0, 0.0], [0.6, 0.8]],
+        )
+        embeddings = MagicMock()
+        embeddings.embed_query.return_value = [0.0, 1.0]
+        with patch("retriever.open_vector_store", return_value=store), \
+                patch("retriever._create_embeddings", return_value=embeddings):
+            self.assertEqual([d.id for d in retriever.search_by_vector([1.0, 0.1], k=2)], ["a", "b"])
+            self.assertEqual([d.id for d in retriever.search_by_vector([1.0, 0.1], k=2, where={"title": "Networking"})], ["b"])
+            self.assertEqual(list(retriever.get_chunk_embeddings(["b", "missing"])), ["b"])
+            self.assertEqual([d.id for d in get_retriever(k=1).invoke("docker network")], ["b"])
+
+
 @unittest.skipIf(SKIP_INTEGRATION, "SKIP_INTEGRATION=1")
 class TestRetrieverStructure(unittest.TestCase):
     """Struktura toola i retrievera (wymaga indeksu Chroma)."""
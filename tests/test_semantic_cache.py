@@ -0,0 +1,80 @@
+"""Testy jednostkowe semantycznego cache odpowiedzi (semantic_cache.py) – bez API."""
+
+import os
+import sys
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from semantic_cache import SemanticCache
+
+FLOW = [{"node": "generate", "model": "m", "calls": 1, "detail": "Final answer generation"}]
+
+
+class TestSemanticCache(unittest.TestCase):
+    """Lookup po cosinusie, TTL/LRU, trwałość i unieważnianie po wersji indeksu."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "answers.sqlite")
+
+    def test_similar_query_hits(self):
+        cache = SemanticCache(self.path, "v1", threshold=0.9)
+        cache.store("How to persist data?", [1.0, 0.1], "Use volumes", FLOW)
+        hit = cache.lookup([0.98, 0.12])
+        self.assertIsNotNone(hit)
+        self.assertEqual(hit["answer"], "Use volumes")
+        self.assertEqual(hit["flow_log"], FLOW)
+        self.assertEqual(hit["query"], "How to persist data?")
+
+    def test_dissimilar_query_misses(self):
+        cache = SemanticCache(self.path, "v1", threshold=0.9)
+        cache.store("How to persist data?", [1.0, 0.0], "Use volumes", FLOW)
+        self.assertIsNone(cache.lookup([0.0, 1.0]))
+        self.assertEqual(cache.stats(), {"hits": 0, "misses": 1, "entries": 1})
+
+    def test_persists_and_namespace_change_invalidates(self):
+        SemanticCache(self.path, "v1").store("q", [1.0, 0.0], "a", FLOW)
+        self.assertIsNotNone(SemanticCache(self.path, "v1").lookup([1.0, 0.0]))
+        cache = SemanticCache(self.path, "v2")
+        self.assertIsNone(cache.lookup([1.0, 0.0]))
+        self.assertEqual(cache.stats()["entries"], 0)
+
+    def test_ttl_expiry(self):
+        cache = SemanticCache(self.path, "v1", ttl_s=60)
+        cache.store("q", [1.0, 0.0], "a", FLOW)
+        with patch("semantic_cache.time.time", return_value=time.time() + 120):
+            self.assertIsNone(cache.lookup([1.0, 0.0]))
+
+    def test_lru_eviction(self):
+        cache = SemanticCache(self.path, "v1", max_entries=2)
+        cache.store("q1", [1.0, 0.0, 0.0], "a1", FLOW)
+        cache.store("q2", [0.0, 1.0, 0.0], "a2", FLOW)
+        time.sleep(0.01)
+        cache.lookup([1.0, 0.0, 0.0])  # q1 świeżo użyte
+        time.sleep(0.01)
+        cache.store("q3", [0.0, 0.0, 1.0], "a3", FLOW)
+        self.assertEqual(cache.stats()["entries"], 2)
+        self.assertIsNone(cache.lookup([0.0, 1.0, 0.0]))
+        self.assertEqual(cache.lookup([1.0, 0.0, 0.0])["answer"], "a1")
+
+    def test_store_updates_matrix_without_reload(self):
+        cache = SemanticCache(self.path, "v1", ttl_s=60, max_entries=3)
+        cache.store("old", [0.0, 0.0, 1.0], "stale", FLOW)
+        with patch.object(cache, "_load", side_effect=AssertionError("store nie wczytuje tabeli")):
+            with patch("semantic_cache.time.time", return_value=time.time() + 120):  # "old" po TTL
+                for i in range(4):
+                    cache.store(f"q{i}", [1.0, float(i), 0.0], f"a{i}", FLOW)
+        self.assertEqual(cache.stats()["entries"], 3)
+        reloaded = SemanticCache(self.path, "v1", ttl_s=10**6)
+        self.assertEqual(cache._ids.tolist(), reloaded._ids.tolist())
+        self.assertTrue((cache._matrix == reloaded._matrix).all())
+        self.assertEqual(reloaded.lookup([0.0, 0.0, 1.0]), None)  # wpis po TTL usunięty także z tabeli
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
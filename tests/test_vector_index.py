@@ -0,0 +1,136 @@
+"""Testy indeksu wektorowego NumPy (vector_index.py) – bez API, Chroma tylko w pamięci."""
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import chromadb
+import numpy as np
+from langchain_core.documents import Document
+
+from build_index import export_vector_index
+from vector_index import CURRENT_FILENAME, VECTORS_FILENAME, VectorIndex, VectorIndexWriter, quantize
+from vector_store import ChromaVectorStore
+
+
+def _corpus(n: int = 300, dim: int = 32, seed: int = 0) -> tuple[list[Document], np.ndarray]:
+    vectors = np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+    docs = [Document(id=f"id{i}", page_content=f"chunk {i}", metadata={"n": i}) for i in range(n)]
+    return docs, vectors
+
+
+class TestQuantize(unittest.TestCase):
+    """Kwantyzacja zachowuje kierunek wektora (cosinus ~ 1)."""
+
+    def test_int8_and_float16_close_to_original(self):
+        _, vectors = _corpus(50)
+        unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        for dtype in ("int8", "float16"):
+            quantized, scales = quantize(vectors, dtype)
+            restored = quantized.astype(np.float32) * (scales[:, None] if scales is not None else 1)
+            self.assertGreater(float(np.min(np.sum(restored * unit, axis=1))), 0.99, dtype)
+
+    def test_unknown_dtype(self):
+        with self.assertRaises(ValueError):
+            quantize(np.ones((1, 2)), "float64")
+
+
+class TestVectorIndex(unittest.TestCase):
+    """Eksport partiami do wersji, macierz float32 przy odczycie, top-k zgodne z dokładnym cosinusem."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.docs, self.vectors = _corpus()
+
+    def _write(self, dtype: str) -> VectorIndex:
+        writer = VectorIndexWriter(self.tmp.name, len(self.docs), self.vectors.shape[1], dtype)
+        for start in range(0, len(self.docs), 64):
+            writer.add(self.docs[start : start + 64], self.vectors[start : start + 64])
+        writer.finish()
+        return VectorIndex.load(self.tmp.name)
+
+    def test_search_matches_exact_cosine(self):
+        unit = self.vectors / np.linalg.norm(self.vectors, axis=1, keepdims=True)
+        for dtype in ("float16", "int8"):
+            index = self._write(dtype)
+            self.assertEqual(index.matrix.dtype, np.float32)
+            self.assertTrue(index.matrix.flags.c_contiguous)
+            self.assertEqual(index.dtype, dtype)
+            query = self.vectors[7] + 0.3 * self.vectors[8]
+            exact = np.argsort(-(unit @ (query / np.linalg.norm(query))))[:5]
+            results = index.search(query.tolist(), k=5)
+            self.assertEqual([d.id for d, _ in results], [f"id{i}" for i in exact], dtype)
+            self.assertEqual(results[0][0].metadata, {"n": 7})
+            distances = [distance for _, distance in results]
+            self.assertEqual(distances, sorted(distances))
+
+    def test_search_restricted_to_rows(self):
+        index = self._write("int8")
+        rows = np.arange(0, len(self.docs), 3)
+        query = self.vectors[7] + 0.3 * self.vectors[8]
+        sims = index.similarities(query.tolist())
+        np.testing.assert_allclose(index.similarities(query.tolist(), rows), sims[rows], rtol=1e-6)
+        expected = rows[np.argsort(-sims[rows])[:4]]
+        self.assertEqual([d.id for d, _ in index.search(query.tolist(), k=4, rows=rows)], [f"id{i}" for i in expected])
+        self.assertEqual(index.search(query.tolist(), k=4, rows=np.zeros(0, dtype=np.int64)), [])
+
+    def test_get_embeddings_by_id(self):
+        index = self._write("int8")
+        stored = index.get_embeddings(["id3", "missing"])
+        self.assertEqual(list(stored), ["id3"])
+        unit = self.vectors[3] / np.linalg.norm(self.vectors[3])
+        self.assertGreater(float(np.dot(stored["id3"], unit)), 0.99)
+
+    def test_missing_and_incomplete_export(self):
+        self.assertIsNone(VectorIndex.load(os.path.join(self.tmp.name, "none")))
+        writer = VectorIndexWriter(self.tmp.name, 3, 4)
+        writer.add(self.docs[:1], self.vectors[:1, :4])
+        with self.assertRaises(ValueError):
+            writer.finish()
+
+    def test_new_export_swaps_version_and_prunes_old(self):
+        first = self._write("int8")
+        first_dir = os.path.dirname(first.docs_path)
+        second = self._write("int8")
+        self.assertNotEqual(os.path.dirname(second.docs_path), first_dir)
+        self.assertEqual(first.get_documents([5])[0].id, "id5")  # poprzednia wersja nadal czytelna
+        self._write("int8")
+        self.assertFalse(os.path.isdir(first_dir))
+        versions = [name for name in os.listdir(self.tmp.name) if name.startswith("v")]
+        self.assertEqual(len(versions), 2)
+        # proces otwarty na usuniętej wersji nadal odpowiada (tabela chunków zmapowana przy otwarciu)
+        self.assertEqual(first.get_documents([5])[0].id, "id5")
+        self.assertEqual(first.search(self.vectors[5].tolist(), k=1, where={"n": 5})[0][0].id, "id5")
+
+    def test_incomplete_export_does_not_change_current(self):
+        index = self._write("int8")
+        writer = VectorIndexWriter(self.tmp.name, 3, self.vectors.shape[1], "int8")
+        writer.add(self.docs[:1], self.vectors[:1])
+        with self.assertRaises(ValueError):
+            writer.finish()
+        self.assertEqual(VectorIndex.load(self.tmp.name).docs_path, index.docs_path)
+
+    def test_inconsistent_files_not_loaded(self):
+        index = self._write("int8")
+        version_dir = os.path.dirname(index.docs_path)
+        np.save(os.path.join(version_dir, VECTORS_FILENAME), np.zeros((5, self.vectors.shape[1]), dtype=np.int8))
+        self.assertIsNone(VectorIndex.load(self.tmp.name))
+        os.remove(os.path.join(self.tmp.name, CURRENT_FILENAME))
+        self.assertIsNone(VectorIndex.load(self.tmp.name))  # stary układ bez wersji – brak plików w katalogu
+
+    def test_export_from_chroma(self):
+        vector_store = ChromaVectorStore.open(collection_name="test_export_vector_index", client=chromadb.EphemeralClient())
+        vector_store.upsert(self.docs, self.vectors.tolist())
+        index = export_vector_index(vector_store, self.tmp.name, dtype="float16", page_size=70)
+        self.assertEqual(len(index), len(self.docs))
+        doc, distance = index.search(self.vectors[42].tolist(), k=1)[0]
+        self.assertEqual((doc.id, doc.page_content, doc.metadata), ("id42", "chunk 42", {"n": 42}))
+        self.assertAlmostEqual(distance, 0.0, places=3)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,143 @@
+"""Testy interfejsu magazynu wektorów (vector_store.py) – te same przypadki dla każdego backendu, bez API."""
+
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import chromadb
+from langchain_core.documents import Document
+
+from build_index import export_vector_index
+from vector_index import VectorIndex
+from vector_store import ChromaVectorStore, InMemoryVectorStore, NumpyVectorStore, VectorStore, open_vector_store
+
+DOCS = [
+    Document(id="run", page_content="docker run -p 80:80", metadata={"title": "Run", "section": "cli", "tags": "cli"}),
+    Document(id="expose", page_content="EXPOSE 80", metadata={"title": "Dockerfile", "section": "build"}),
+    Document(id="volume", page_content="docker volume create", metadata={"title": "Volumes", "section": "cli"}),
+]
+VECTORS = [[1.0, 0.0, 0.0], [0.8, 0.6, 0.0], [0.0, 0.6, 0.8]]
+
+
+class _VectorStoreContract:
+    """Przypadki wspólne dla backendów z zapisem."""
+
+    def make_store(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        self.store = self.make_store()
+        self.store.upsert(DOCS, VECTORS)
+
+    def test_search_nearest_first_and_filtered(self):
+        results = self.store.search([1.0, 0.1, 0.0], k=2)
+        self.assertEqual([d.id for d, _ in results], ["run", "expose"])
+        self.assertLess(results[0][1], results[1][1])
+        self.assertEqual(results[0][0].metadata["title"], "Run")
+        filtered = self.store.search([1.0, 0.1, 0.0], k=2, where={"section": "cli"})
+        self.assertEqual([d.id for d, _ in filtered], ["run", "volume"])
+        self.assertEqual(self.store.search([1.0, 0.0, 0.0], k=2, where={"section": "cli", "title": "Volumes"})[0][0].id, "volume")
+
+    def test_search_restricted_to_candidate_ids(self):
+        results = self.store.search([1.0, 0.1, 0.0], k=2, ids=["volume", "expose", "missing"])
+        self.assertEqual([d.id for d, _ in results], ["expose", "volume"])
+        self.assertEqual([d.id for d, _ in self.store.search([1.0, 0.1, 0.0], k=2, where={"section": "cli"}, ids=["volume", "expose"])], ["volume"])
+        self.assertEqual(self.store.search([1.0, 0.1, 0.0], k=2, ids=[]), [])
+
+    def test_get_and_embeddings_by_id(self):
+        self.assertEqual([d.page_content for d in self.store.get(["volume", "missing"])], ["docker volume create"])
+        self.assertEqual(list(self.store.get_embeddings(["expose", "missing"])), ["expose"])
+        self.assertAlmostEqual(self.store.get_embeddings(["expose"])["expose"][1], 0.6, places=5)
+
+    def test_upsert_replaces_whole_record_and_delete(self):
+        replaced = Document(id="run", page_content="docker run", metadata={"title": "Run v2", "section": "cli"})
+        self.store.upsert([replaced], [VECTORS[0]])
+        self.assertEqual(self.store.get(["run"])[0].metadata, {"title": "Run v2", "section": "cli"})  # bez "tags"
+        self.store.delete(["expose"])
+        self.assertEqual(self.store.count(), 2)
+        pages = list(self.store.scan(page_size=1, include_embeddings=True))
+        self.assertEqual(sorted(d.id for docs, _ in pages for d in docs), ["run", "volume"])
+        self.assertTrue(all(len(vectors) == len(docs) for docs, vectors in pages))
+
+
+class TestChromaVectorStore(_VectorStoreContract, unittest.TestCase):
+    def make_store(self):
+        client = chromadb.EphemeralClient()
+        name = f"test_vector_store_{self._testMethodName}"
+        if name in [c.name for c in client.list_collections()]:
+            client.delete_collection(name)
+        return ChromaVectorStore.open(collection_name=name, client=client)
+
+    def test_candidate_search_without_ids_filter_matches_chroma(self):
+        """Dystanse w procesie i nadmiar wyników bez filtra dają to samo, co filtr `ids` w zapytaniu Chroma."""
+        vector, ids = [1.0, 0.1, 0.0], ["volume", "expose"]
+        expected = [(d.id, distance) for d, distance in self.store._results(self.store._query(vector, 2, None, ids))]
+        for exact in (64, 0):
+            with patch("vector_store.CHROMA_EXACT_CANDIDATES", exact):
+                results = [(d.id, distance) for d, distance in self.store.search(vector, k=2, ids=ids)]
+            self.assertEqual([i for i, _ in results], [i for i, _ in expected], exact)
+            for (_, got), (_, want) in zip(results, expected):
+                self.assertAlmostEqual(got, want, places=5)
+
+    def test_overfetch_falls_back_to_ids_filter(self):
+        near = [Document(id=f"near{i}", page_content="x", metadata={"section": "other"}) for i in range(30)]
+        self.store.upsert(near, [[1.0, 0.01 * i, 0.0] for i in range(30)])
+        with patch("vector_store.CHROMA_EXACT_CANDIDATES", 0):
+            self.assertEqual(self.store.search([1.0, 0.0, 0.0], k=1, ids=["volume"])[0][0].id, "volume")
+            with patch("vector_store.CHROMA_OVERFETCH_MAX", 4), patch.object(self.store, "_query", wraps=self.store._query) as query:
+                self.assertEqual(self.store.search([1.0, 0.0, 0.0], k=1, ids=["volume"])[0][0].id, "volume")
+            self.assertEqual(query.call_args.args[3], ["volume"])  # ostatnie zapytanie – z filtrem ids
+
+    def test_ids_filter_skips_ids_missing_from_collection(self):
+        near = [Document(id=f"near{i}", page_content="x", metadata={"section": "other"}) for i in range(30)]
+        self.store.upsert(near, [[1.0, 0.01 * i, 0.0] for i in range(30)])
+        with patch("vector_store.CHROMA_EXACT_CANDIDATES", 0), patch("vector_store.CHROMA_OVERFETCH_MAX", 0):
+            with patch.object(self.store, "_query", wraps=self.store._query) as query:
+                self.assertEqual([d.id for d, _ in self.store.search([1.0, 0.0, 0.0], k=1, ids=["volume", "missing"])], ["volume"])
+            self.assertEqual(query.call_args.args[3], ["volume"])  # ponowienie tylko z istniejącymi id
+            self.assertEqual(self.store.search([1.0, 0.0, 0.0], k=1, ids=["missing"]), [])
+            with self.assertRaises(ValueError):  # błędny filtr nie jest maskowany ponowieniem
+                self.store.search([1.0, 0.0, 0.0], k=1, where={"section": {"$bad": 1}}, ids=["volume", "run"])
+
+    def test_interface_is_abstract(self):
+        with self.assertRaises(TypeError):
+            VectorStore()
+
+
+class TestInMemoryVectorStore(_VectorStoreContract, unittest.TestCase):
+    def make_store(self):
+        return InMemoryVectorStore()
+
+
+class TestNumpyVectorStore(unittest.TestCase):
+    """Eksport z magazynu z zapisem → ten sam ranking i filtry; zapis niedostępny."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        source = InMemoryVectorStore()
+        source.upsert(DOCS, VECTORS)
+        export_vector_index(source, self.tmp.name, dtype="float16")
+        self.store = NumpyVectorStore(VectorIndex.load(self.tmp.name))
+
+    def test_search_get_and_read_only(self):
+        self.assertEqual(self.store.count(), 3)
+        self.assertEqual([d.id for d, _ in self.store.search([1.0, 0.1, 0.0], k=2, where={"section": "cli"})], ["run", "volume"])
+        self.assertEqual([d.id for d in self.store.get(["expose", "missing"])], ["expose"])
+        self.assertEqual([d.id for d, _ in self.store.search([1.0, 0.1, 0.0], k=2, ids=["volume", "expose"])], ["expose", "volume"])
+        with self.assertRaises(PermissionError):
+            self.store.delete(["run"])
+        with self.assertRaises(PermissionError):
+            self.store.upsert(DOCS[:1], VECTORS[:1])
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            open_vector_store("faiss")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -1,19 +1,38 @@
 """Testy jednostkowe workflow – bez wywołań LLM/API."""
 
+import asyncio
 import os
+import re
 import sys
+import threading
+import time
 import unittest
-from unittest.mock import MagicMock, patch
+from contextvars import ContextVar
+from unittest.mock import AsyncMock, MagicMock, patch
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import numpy as np
 from langchain_core.documents import Document
 
+from config import ASK_MANY_MAX_CONCURRENCY, EMBEDDING_MODEL, SMART_LLM_MODEL
 from workflow import (
+    _format_flow_trace_md,
     _parse_grader_response,
     _route_after_check,
+    _rrf_fuse,
+    _rrf_fuse_with_scores,
+    aask,
+    ask,
+    ask_many,
+    ask_stream,
+    build_rag_graph,
+    compress_context,
     post_retrieval,
+    pre_retrieval,
+    apre_retrieval,
     retrieval,
+    route_query,
     RAGState,
     RELEVANCE_THRESHOLD,
 )
@@ -72,6 +91,186 @@ class TestParseGraderResponse(unittest.TestCase):
         self.assertEqual(refined, "trimmed")
 
 
+class TestRouteQuery(unittest.TestCase):
+    """route_query: reguły → centroid → LLM tylko przy niepewnej decyzji; w trace metoda decyzji."""
+
+    CENTROIDS = {"direct": np.array([1.0, 0.0]), "rag": np.array([0.0, 1.0])}
+
+    def _route(self, query: str, vector: list[float], llm_answer: str = "RAG") -> tuple[dict, MagicMock, MagicMock]:
+        chain = MagicMock()
+        chain.invoke.return_value = MagicMock(content=llm_answer)
+        with patch("workflow._route_chain", return_value=chain), \
+                patch("workflow._get_route_centroids", return_value=(self.CENTROIDS, 0)), \
+                patch("workflow.embed_queries", return_value=[vector]) as embed:
+            out = route_query({"query": query, "trace": True})
+        return out, embed, chain
+
+    def test_keyword_rules_decide_without_embedding(self):
+        out, embed, chain = self._route("How do I expose a port with docker run -p?", [0.0, 1.0])
+        self.assertEqual((out["route"], out["route_method"]), ("rag", "rules"))
+        out, _, _ = self._route("What is Docker?", [0.0, 1.0])
+        self.assertEqual((out["route"], out["route_method"]), ("direct", "rules"))
+        embed.assert_not_called()
+        chain.invoke.assert_not_called()
+
+    def test_centroid_decides_when_rules_inconclusive(self):
+        out, embed, chain = self._route("Czym różni się obraz od kontenera?", [0.9, 0.1])
+        self.assertEqual((out["route"], out["route_method"]), ("direct", "centroid"))
+        self.assertEqual(out["flow_log"][0]["route_method"], "centroid")
+        self.assertEqual(out["query_vector"], [0.9, 0.1])
+        embed.assert_called_once()
+        chain.invoke.assert_not_called()
+
+    def test_llm_only_when_centroid_uncertain(self):
+        out, _, chain = self._route("Czym różni się obraz od kontenera?", [0.7, 0.7], llm_answer="DIRECT")
+        self.assertEqual((out["route"], out["route_method"]), ("direct", "llm"))
+        chain.invoke.assert_called_once()
+
+    def test_query_vector_from_state_reused(self):
+        with patch("workflow._get_route_centroids", return_value=(self.CENTROIDS, 0)), patch("workflow.embed_queries") as embed:
+            out = route_query({"query": "Czym różni się obraz od kontenera?", "query_vector": [0.0, 1.0]})
+        self.assertEqual((out["route"], out["route_method"]), ("rag", "centroid"))
+        embed.assert_not_called()
+
+    def test_centroid_embedding_counted_once_under_concurrency(self):
+        """Pierwsze równoległe requesty liczą centroidy raz; wywołanie embeddings jest w trace requestu, który je wykonał."""
+        from concurrent.futures import ThreadPoolExecutor
+
+        import workflow
+
+        def embed(queries, stats=None):
+            time.sleep(0.05)
+            if stats is not None:
+                stats["api_calls"] = 1
+            return [[1.0, 0.0] if i < len(queries) // 2 else [0.0, 1.0] for i in range(len(queries))]  # direct, potem rag
+
+        with patch("workflow._route_centroids", None), patch("workflow.embed_queries", side_effect=embed) as mock_embed:
+            with ThreadPoolExecutor(4) as executor:
+                results = list(executor.map(lambda _: workflow._get_route_centroids(), range(4)))
+            self.assertEqual(mock_embed.call_count, 1)
+            self.assertEqual(sorted(calls for _, calls in results), [0, 0, 0, 1])
+            with patch("workflow._route_centroids", None):
+                out = route_query({"query": "Czym różni się obraz od kontenera?", "query_vector": [0.0, 1.0], "trace": True})
+        entry = out["flow_log"][0]
+        self.assertEqual((entry["calls"], entry["centroid_embedding_calls"]), (1, 1))
+
+    def test_direct_route_skips_retrieval(self):
+        chain = MagicMock()
+        chain.invoke.return_value = MagicMock(content="Docker is a container platform.")
+        with patch("workflow._generate_direct_chain", return_value=chain), patch("workflow.embed_queries") as embed:
+            result = build_rag_graph(route=True).invoke({"query": "What is Docker?", "trace": True, "flow_log": []})
+        self.assertEqual(result["answer"], "Docker is a container platform.")
+        self.assertEqual([e["node"] for e in result["flow_log"]], ["route_query", "generate_direct"])
+        embed.assert_not_called()
+
+
+class TestSpeculativeRetrieval(unittest.TestCase):
+    """pre_retrieval: wyszukiwanie dla oryginalnego zapytania równolegle z ekspansją; pewne wyniki → ekspansja pominięta."""
+
+    DOC = Document(id="c1", page_content="docker run -p 8080:80 publishes a port", metadata={"title": "Ports"})
+
+    def _patches(self, stored: list[float], search_delay: float = 0.0):
+        def search(vector, k=6, **kwargs):
+            time.sleep(search_delay)
+            return [(self.DOC, 0.1)]
+
+        return (
+            patch("workflow.embed_queries", return_value=[[1.0, 0.0]]),
+            patch("workflow.search_by_vector_with_scores", side_effect=search),
+            patch("workflow.lexical_search_with_scores", return_value=[(self.DOC, 3.0)]),
+            patch("workflow.get_chunk_embeddings", return_value={"c1": stored}),
+        )
+
+    def test_confident_raw_hits_skip_expansion(self):
+        chain = MagicMock()
+        state: RAGState = {"query": "How to expose ports?", "trace": True}
+        embed, search, lexical, stored = self._patches([1.0, 0.0])
+        with embed as mock_embed, search, lexical, stored, patch("workflow._pre_retrieval_chain", return_value=chain):
+            out = pre_retrieval(state)
+            self.assertEqual(out["expanded_queries"], ["How to expose ports?"])
+            entry = out["flow_log"][0]
+            self.assertEqual(entry["expansion"], "skipped")
+            self.assertEqual((entry["calls"], entry["expansion_call"]), (1, "discarded"))  # wywołanie LLM już wysłane
+            self.assertEqual(entry["embedding_calls"], 1)  # embedding oryginalnego zapytania
+            summary = _format_flow_trace_md(state["query"], out["flow_log"])
+            self.assertIn(f"**{EMBEDDING_MODEL}:** 1 call(s)", summary)
+            self.assertIn(f"**{SMART_LLM_MODEL}:** 1 call(s)", summary)
+            result = retrieval({**state, **out, "flow_log": []})
+        self.assertEqual(mock_embed.call_count, 1)  # retrieval reused the speculative raw-query search
+        self.assertEqual(result["raw_docs"], [self.DOC])
+
+    def test_expansion_used_and_overlap_traced(self):
+        """Ekspansja w wątku puli widzi kontekst wywołującego (rodzic runu LangGraph / LangSmith)."""
+        run_context: ContextVar[str] = ContextVar("run_context", default="none")
+        seen = []
+
+        def slow_expansion(inputs):
+            seen.append(run_context.get())
+            time.sleep(0.05)
+            return MagicMock(content="publish port\nHow to expose ports?")
+
+        chain = MagicMock()
+        chain.invoke.side_effect = slow_expansion
+        state: RAGState = {"query": "How to expose ports?", "trace": True}
+        embed, search, lexical, stored = self._patches([0.0, 1.0], search_delay=0.05)
+        with embed as mock_embed, search, lexical, stored, patch("workflow._pre_retrieval_chain", return_value=chain):
+            token = run_context.set("graph-run")
+            try:
+                out = pre_retrieval(state)
+            finally:
+                run_context.reset(token)
+            entry = out["flow_log"][0]
+            self.assertEqual(entry["expansion"], "used")
+            self.assertGreater(entry["overlap_ms"], 0)
+            retrieval({**state, **out, "flow_log": []})
+        self.assertEqual(seen, ["graph-run"])
+        self.assertEqual(mock_embed.call_args_list[-1].args[0], ["publish port"])  # raw query not searched twice
+
+    def test_vector_from_routing_not_counted(self):
+        chain = MagicMock()
+        embed, search, lexical, stored = self._patches([1.0, 0.0])
+        with embed as mock_embed, search, lexical, stored, patch("workflow._pre_retrieval_chain", return_value=chain):
+            out = pre_retrieval({"query": "How to expose ports?", "trace": True, "query_vector": [1.0, 0.0]})
+        mock_embed.assert_not_called()
+        self.assertEqual(out["flow_log"][0]["embedding_calls"], 0)
+
+    def test_discarded_expansions_do_not_delay_later_requests(self):
+        """Pominięte ekspansje kończą się w tle we własnych wątkach – nie zajmują miejsca kolejnym zapytaniom."""
+        release = threading.Event()
+        chain = MagicMock()
+        chain.invoke.side_effect = lambda inputs: release.wait(10) and MagicMock(content="unused")
+        embed, search, lexical, stored = self._patches([1.0, 0.0])
+        try:
+            with embed, search, lexical, stored, patch("workflow._pre_retrieval_chain", return_value=chain):
+                for _ in range(ASK_MANY_MAX_CONCURRENCY + 2):
+                    pre_retrieval({"query": "How to expose ports?"})
+            fast = MagicMock()
+            fast.invoke.return_value = MagicMock(content="publish port")
+            embed, search, lexical, stored = self._patches([0.0, 1.0])
+            with embed, search, lexical, stored, patch("workflow._pre_retrieval_chain", return_value=fast):
+                start = time.perf_counter()
+                out = pre_retrieval({"query": "How to expose ports?"})
+            self.assertLess(time.perf_counter() - start, 2)
+            self.assertEqual(out["expanded_queries"], ["publish port"])
+        finally:
+            release.set()
+
+    def test_async_confident_hits_cancel_expansion(self):
+        async def never(inputs):
+            await asyncio.sleep(10)
+
+        chain = MagicMock()
+        chain.ainvoke = AsyncMock(side_effect=never)
+        embed, search, lexical, stored = self._patches([1.0, 0.0])
+        with patch("workflow.aembed_queries", new=AsyncMock(return_value=[[1.0, 0.0]])), search, lexical, stored, \
+                patch("workflow._pre_retrieval_chain", return_value=chain):
+            start = time.perf_counter()
+            out = asyncio.run(apre_retrieval({"query": "How to expose ports?", "trace": True}))
+        self.assertLess(time.perf_counter() - start, 5)
+        self.assertEqual(out["expanded_queries"], ["How to expose ports?"])
+        self.assertEqual(out["flow_log"][0]["expansion_call"], "cancelled")
+
+
 class TestRouteAfterCheck(unittest.TestCase):
     """Test routingu po check_and_refine (retry vs post_retrieval)."""
 
@@ -88,6 +287,13 @@ class TestRouteAfterCheck(unittest.TestCase):
         self.assertEqual(_route_after_check(state), "post_retrieval")
 
 
+class _WordEncoder:
+    """Enkoder testowy: token = słowo (z poprzedzającym białym znakiem)."""
+
+    def encode(self, text: str) -> list[str]:
+        return re.findall(r"\s*\S+", text)
+
+
 class TestPostRetrieval(unittest.TestCase):
     """Test post_retrieval – budowanie kontekstu z dokumentów (bez LLM)."""
 
@@ -108,15 +314,68 @@ class TestPostRetrieval(unittest.TestCase):
         self.assertIn("Doc1", out["context"])
         self.assertIn("Doc2", out["context"])
 
-    def test_limits_to_6_chunks_in_context(self):
-        docs = [self._make_doc(f"Content {i}", f"Doc{i}") for i in range(10)]
-        state: RAGState = {"raw_docs": docs}
-        out = post_retrieval(state)
+    def test_context_limited_by_token_budget(self):
+        """Kontekst do wyczerpania budżetu tokenów (enkoder: 1 token = 1 słowo); liczba tokenów w trace."""
+        docs = [self._make_doc(f"Content {i} " + "word " * 20, f"Doc{i}") for i in range(10)]
+        state: RAGState = {"raw_docs": docs, "trace": True}
+        with patch("context_builder._encoder", _WordEncoder()), patch("workflow.CONTEXT_TOKEN_BUDGET", 100):
+            out = post_retrieval(state)
         self.assertEqual(len(out["reranked_docs"]), 8)  # reranked keeps 8
-        # context uses first 6
-        for i in range(6):
+        for i in range(3):
             self.assertIn(f"Content {i}", out["context"])
-        self.assertNotIn("Content 6", out["context"])
+        self.assertNotIn("Content 4", out["context"])
+        entry = out["flow_log"][0]
+        self.assertLessEqual(entry["context_tokens"], 100)
+        self.assertEqual(entry["context_tokens"], len(_WordEncoder().encode(out["context"])))
+
+    def test_adjacent_chunks_stitched_with_middle_fetched(self):
+        """Chunki 0 i 2 jednego dokumentu → jeden blok z dobranym chunkiem 1, nakładka raz; liczba sklejonych w trace."""
+        texts = [
+            "Step one installs the docker engine and",
+            "installs the docker engine and then step two starts the daemon",
+            "then step two starts the daemon, step three checks it.",
+        ]
+        chunks = [
+            Document(id=f"c{i}", page_content=t, metadata={"title": "Install", "source_id": "s", "chunk_index": i, "next_chunk_id": f"c{i + 1}"})
+            for i, t in enumerate(texts)
+        ]
+        other = self._make_doc("Unrelated page", "Other")
+        state: RAGState = {"raw_docs": [chunks[0], other, chunks[2]], "trace": True}
+        with patch("workflow.get_chunks", return_value=[chunks[1]]) as get_chunks, patch("workflow.MMR_ENABLED", False):
+            out = post_retrieval(state)
+        get_chunks.assert_called_once_with(["c1"])
+        self.assertEqual(len(out["reranked_docs"]), 2)
+        self.assertIn("Step one installs the docker engine and then step two starts the daemon, step three checks it.", out["context"])
+        self.assertEqual(out["flow_log"][0]["stitched_chunks"], 2)
+        self.assertEqual(out["flow_log"][0]["fetched_chunks"], 1)
+
+    def test_rrf_over_ranked_lists(self):
+        """Post-retrieval: chunk wysoko w kilku listach (także z retry) wygrywa z pierwszym z jednej listy."""
+        a, b, c = self._make_doc("A", "a"), self._make_doc("B", "b"), self._make_doc("C", "c")
+        state: RAGState = {
+            "raw_docs": [a],
+            "ranked_lists": [
+                {"query": "q1", "source": "dense", "docs": [a, b], "scores": [0.1, 0.2]},
+                {"query": "q2", "source": "dense", "docs": [c, b], "scores": [0.1, 0.3]},
+                {"query": "refined", "source": "bm25", "docs": [b], "scores": [5.0]},
+            ],
+        }
+        out = post_retrieval(state)
+        self.assertEqual([d.page_content for d in out["reranked_docs"]], ["B", "A", "C"])
+
+    def test_mmr_drops_near_duplicate_neighbour(self):
+        """MMR na zapisanych embeddingach: prawie-kopia sąsiedniego chunka spada za inny temat."""
+        docs = [
+            Document(id="a", page_content="Volumes persist data", metadata={"title": "Volumes"}),
+            Document(id="a2", page_content="Volumes persist data (overlap)", metadata={"title": "Volumes"}),
+            Document(id="b", page_content="Bind mounts map host dirs", metadata={"title": "Bind mounts"}),
+        ]
+        stored = {"a": [1.0, 0.0], "a2": [0.99, 0.05], "b": [0.0, 1.0]}
+        with patch("workflow.get_chunk_embeddings", return_value=stored) as mock_get, \
+                patch("workflow.MMR_LAMBDA", 0.5):
+            out = post_retrieval({"raw_docs": docs})
+        mock_get.assert_called_once_with(["a", "a2", "b"])
+        self.assertEqual([d.id for d in out["reranked_docs"]], ["a", "b", "a2"])
 
     def test_empty_docs_still_returns_context(self):
         state: RAGState = {"raw_docs": []}
@@ -125,6 +384,29 @@ class TestPostRetrieval(unittest.TestCase):
         self.assertEqual(out["context"], "")
 
 
+class TestCompressContext(unittest.TestCase):
+    """Opcjonalny węzeł compress_context między post_retrieval a generate."""
+
+    def test_wired_only_when_enabled(self):
+        self.assertNotIn("compress_context", build_rag_graph(compress=False).nodes)
+        self.assertIn("compress_context", build_rag_graph(use_async=True, compress=True).nodes)
+
+    def test_shrinks_context_and_logs_tokens(self):
+        doc = Document(
+            id="p",
+            page_content="Docker Desktop runs on Mac.\nPublish a port with docker run -p 8080:80.\nSwarm mode manages clusters.",
+            metadata={"title": "Ports"},
+        )
+        state: RAGState = {"query": "How to publish a port?", "reranked_docs": [doc], "context": doc.page_content, "trace": True}
+        with patch("workflow.get_term_weights", return_value={}), patch("context_builder._encoder", _WordEncoder()):
+            out = compress_context(state)
+        self.assertIn("Publish a port", out["context"])
+        self.assertNotIn("Swarm", out["context"])
+        entry = out["flow_log"][0]
+        self.assertEqual(entry["node"], "compress_context")
+        self.assertLess(entry["context_tokens"], entry["context_tokens_before"])
+
+
 class TestRelevanceThreshold(unittest.TestCase):
     """Stałe workflow."""
 
@@ -138,11 +420,11 @@ class TestRetrievalWorkers(unittest.TestCase):
     def test_retrieval_returns_raw_docs_with_workers(self):
         """Retrieval (orchestrator–workers) zwraca raw_docs z deduplikacją."""
         fake_doc = Document(page_content="Docker volume persist", metadata={"title": "Volumes"})
-        mock_retriever = MagicMock()
-        mock_retriever.invoke.return_value = [fake_doc]
 
         state: RAGState = {"expanded_queries": ["query1", "query2"]}
-        with patch("workflow.get_retriever", return_value=mock_retriever):
+        with patch("workflow.embed_queries", return_value=[[0.1], [0.2]]), \
+                patch("workflow.lexical_search_with_scores", return_value=[]), \
+                patch("workflow.search_by_vector_with_scores", return_value=[(fake_doc, 0.1)]) as mock_search:
             out = retrieval(state)
 
         self.assertIn("raw_docs", out)
@@ -150,7 +432,300 @@ class TestRetrievalWorkers(unittest.TestCase):
         # 2 queries × 1 doc each, deduplicated if same content
         self.assertGreaterEqual(len(out["raw_docs"]), 1)
         self.assertLessEqual(len(out["raw_docs"]), 2)
-        mock_retriever.invoke.assert_called()  # workers invoked
+        self.assertEqual(mock_search.call_count, 2)  # workers invoked
+
+    def test_retrieval_embeds_all_queries_in_one_call(self):
+        """Wszystkie expanded queries embedowane jednym wywołaniem; trace raportuje 1 call."""
+        state: RAGState = {"expanded_queries": ["q1", "q2", "q3"], "trace": True}
+        def fake_embed(queries, stats=None):
+            stats.update({"hits": 0, "misses": 3, "api_calls": 1})
+            return [[0.1], [0.2], [0.3]]
+
+        with patch("workflow.embed_queries", side_effect=fake_embed) as mock_embed, \
+                patch("workflow.lexical_search_with_scores", return_value=[]), \
+                patch("workflow.search_by_vector_with_scores", return_value=[]) as mock_search:
+            out = retrieval(state)
+
+        mock_embed.assert_called_once()
+        self.assertEqual(mock_embed.call_args.args[0], ["q1", "q2", "q3"])
+        searched = sorted(call.args[0] for call in mock_search.call_args_list)
+        self.assertEqual(searched, [[0.1], [0.2], [0.3]])
+        self.assertEqual(out["flow_log"][0]["calls"], 1)
+        self.assertEqual(out["flow_log"][0]["embedding_cache_misses"], 3)
+
+    def test_retrieval_fuses_dense_and_lexical(self):
+        """Hybrid: wyniki BM25 trafiają do raw_docs obok wyników dense."""
+        dense_doc = Document(page_content="Persist data with volumes", metadata={"title": "Volumes"})
+        lexical_doc = Document(page_content="docker run --network host", metadata={"title": "Networking"})
+        state: RAGState = {"expanded_queries": ["--network"]}
+        with patch("workflow.embed_queries", return_value=[[0.1]]), \
+                patch("workflow.lexical_search_with_scores", return_value=[(lexical_doc, 7.5)]) as mock_lexical, \
+                patch("workflow.search_by_vector_with_scores", return_value=[(dense_doc, 0.2)]):
+            out = retrieval(state)
+
+        mock_lexical.assert_called_once_with("--network", k=6)
+        contents = {d.page_content for d in out["raw_docs"]}
+        self.assertEqual(contents, {dense_doc.page_content, lexical_doc.page_content})
+        self.assertEqual([(r["source"], r["scores"]) for r in out["ranked_lists"]], [("dense", [0.2]), ("bm25", [7.5])])
+
+    def test_metadata_filter_restricts_both_searches(self):
+        """filters w stanie: dense dostaje id kandydatów, BM25 wiersze; trace podaje liczbę kandydatów."""
+        state: RAGState = {"expanded_queries": ["compose networks"], "filters": {"tags": "Compose"}, "trace": True}
+        with patch("workflow.resolve_filters", return_value=([0, 2], ["c0", "c2"])) as mock_resolve, \
+                patch("workflow.embed_queries", return_value=[[0.1]]), \
+                patch("workflow.lexical_search_with_scores", return_value=[]) as mock_lexical, \
+                patch("workflow.search_by_vector_with_scores", return_value=[]) as mock_search:
+            out = retrieval(state)
+
+        mock_resolve.assert_called_once_with({"tags": ["compose"]})
+        mock_search.assert_called_once_with([0.1], k=6, ids=["c0", "c2"])
+        mock_lexical.assert_called_once_with("compose networks", k=6, rows=[0, 2])
+        self.assertEqual(out["flow_log"][0]["filter_candidates"], 2)
+
+        with patch("workflow.resolve_filters", return_value=([], [])), \
+                patch("workflow.embed_queries", return_value=[[0.1]]), \
+                patch("workflow.lexical_search_with_scores", return_value=[]), \
+                patch("workflow.search_by_vector_with_scores", return_value=[]) as mock_search:
+            out = retrieval(state)
+        mock_search.assert_called_once_with([0.1], k=6)  # filtr bez dopasowań – cały indeks
+        self.assertIn("matched no chunks", out["flow_log"][0]["detail"])
+
+    def test_unknown_filter_field_rejected_before_graph_runs(self):
+        with patch("workflow.get_rag_graph") as graph, patch("workflow.get_async_rag_graph") as async_graph:
+            for call in (
+                lambda: ask("q", filters={"tag": ["compose"]}),
+                lambda: asyncio.run(aask("q", filters={"tag": ["compose"]})),
+                lambda: ask_many(["q1", "q2"], filters={"tag": ["compose"]}),
+                lambda: ask_stream("q", filters={"tag": ["compose"]}),  # już przy wywołaniu, nie przy pierwszym zdarzeniu
+            ):
+                with self.assertRaisesRegex(ValueError, "dostępne: tags, keywords, aliases"):
+                    call()
+        graph.assert_not_called()
+        async_graph.assert_not_called()
+
+    def test_ranked_lists_follow_query_order(self):
+        """Listy rankingowe w kolejności expanded_queries, niezależnie od kolejności kończenia wątków."""
+        import time
+
+        def slow_first(vector, k=6):
+            if vector == [0.0]:
+                time.sleep(0.05)
+            return [(Document(page_content=f"doc {vector[0]}"), 0.1)]
+
+        state: RAGState = {"expanded_queries": ["slow", "fast"]}
+        with patch("workflow.embed_queries", return_value=[[0.0], [1.0]]), \
+                patch("workflow.lexical_search_with_scores", return_value=[]), \
+                patch("workflow.search_by_vector_with_scores", side_effect=slow_first):
+            out = retrieval(state)
+
+        self.assertEqual([r["query"] for r in out["ranked_lists"]], ["slow", "fast"])
+        self.assertEqual(out["raw_docs"][0].page_content, "doc 0.0")
+
+
+class TestRRFFuse(unittest.TestCase):
+    """Reciprocal Rank Fusion list rankingowych."""
+
+    def _docs(self, *names: str) -> list[Document]:
+        return [Document(page_content=n) for n in names]
+
+    def test_doc_in_both_lists_ranks_first(self):
+        fused = _rrf_fuse([self._docs("a", "b", "c"), self._docs("c", "d")])
+        self.assertEqual(fused[0].page_content, "c")
+        self.assertEqual(len(fused), 4)
+
+    def test_deterministic_tie_break(self):
+        fused = _rrf_fuse([self._docs("a", "b"), self._docs("x", "y")])
+        self.assertEqual([d.page_content for d in fused], ["a", "x", "b", "y"])
+
+    def test_near_duplicates_merged_into_higher_ranked(self):
+        paragraph = "Use docker network create to add a user-defined bridge network so containers resolve each other by name."
+        copy = paragraph.replace("docker network create", "`docker network create`") + " See also."
+        fused = _rrf_fuse_with_scores([self._docs(paragraph, "b"), self._docs("c", copy)])
+        self.assertEqual([d.page_content for d, _ in fused], [paragraph, "c", "b"])
+        self.assertAlmostEqual(fused[0][1], 1 / 61 + 1 / 62)
+        exact = _rrf_fuse_with_scores([self._docs(paragraph, "b"), self._docs("c", copy)], near_duplicate_threshold=None)
+        self.assertEqual(len(exact), 4)
+
+
+class TestAskSemanticCache(unittest.TestCase):
+    """ask(use_cache=True): drugie, podobne pytanie obsłużone z cache bez uruchamiania grafu."""
+
+    def test_second_similar_query_served_from_cache(self):
+        from semantic_cache import SemanticCache
+
+        cache = SemanticCache(":memory:", "test", threshold=0.9)
+        graph = MagicMock()
+        graph.invoke.return_value = {
+            "answer": "Use volumes",
+            "flow_log": [{"node": "generate", "model": "m", "calls": 1, "detail": "Final answer generation"}],
+        }
+        vectors = {"How to persist data?": [1.0, 0.1], "How do I keep data in containers?": [0.97, 0.15]}
+        with patch("workflow.get_semantic_cache", return_value=cache), \
+                patch("workflow.get_rag_graph", return_value=graph), \
+                patch("workflow.embed_queries", side_effect=lambda qs, stats=None: [vectors[qs[0]]]):
+            first = ask("How to persist data?", use_cache=True)
+            answer_md, flow_md = ask("How do I keep data in containers?", trace=True, use_cache=True)
+
+        self.assertEqual(first, "Use volumes")
+        self.assertEqual(graph.invoke.call_count, 1)
+        self.assertIn("Use volumes", answer_md)
+        self.assertIn("semantic_cache", flow_md)
+        self.assertIn("Hit", flow_md)
+        self.assertIn("generate (cached)", flow_md)
+
+    def test_shared_cache_created_once_under_concurrency(self):
+        import workflow
+        from semantic_cache import SemanticCache
+
+        def slow_cache(*args, **kwargs):
+            time.sleep(0.05)  # okno, w którym drugi wątek bez blokady utworzyłby własną instancję
+            return SemanticCache(":memory:", args[1])
+
+        with patch.object(workflow, "_semantic_cache", None), \
+                patch("workflow.SemanticCache", side_effect=slow_cache) as factory, \
+                patch("workflow.get_index_version", return_value="v1"):
+            caches = []
+            threads = [threading.Thread(target=lambda: caches.append(workflow.get_semantic_cache())) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(factory.call_count, 1)
+        self.assertEqual(len({id(cache) for cache in caches}), 1)
+
+
+class TestAsyncPipeline(unittest.TestCase):
+    """Async węzły i aask() – chainy LLM i retriever zamockowane."""
+
+    @staticmethod
+    def _fake_chain(content: str) -> MagicMock:
+        chain = MagicMock()
+        chain.ainvoke = AsyncMock(return_value=MagicMock(content=content))
+        return chain
+
+    def test_async_graph_has_same_nodes(self):
+        sync_nodes = set(build_rag_graph().nodes)
+        async_nodes = set(build_rag_graph(use_async=True).nodes)
+        self.assertEqual(sync_nodes, async_nodes)
+
+    def test_aask_concurrent_requests_share_event_loop(self):
+        doc = Document(page_content="docker run -p 8080:80 publishes a port", metadata={"title": "Ports"})
+        with patch("workflow._pre_retrieval_chain", return_value=self._fake_chain("publish port\nEXPOSE")), \
+                patch("workflow._check_and_refine_chain", return_value=self._fake_chain("SCORE: 0.90\nREFINED: same")), \
+                patch("workflow._generate_chain", return_value=self._fake_chain("Use -p")), \
+                patch("workflow.SPECULATIVE_RETRIEVAL_ENABLED", False), \
+                patch("workflow.aembed_queries", new=AsyncMock(return_value=[[0.1], [0.2]])) as mock_embed, \
+                patch("workflow.search_by_vector_with_scores", return_value=[(doc, 0.1)]), \
+                patch("workflow.lexical_search_with_scores", return_value=[]), \
+                patch("workflow.get_chunk_embeddings", return_value={}):
+
+            async def run_two():
+                return await asyncio.gather(aask("How to expose ports?", trace=True), aask("Publish a port?"))
+
+            (answer_md, flow_md), plain = asyncio.run(run_two())
+
+        self.assertEqual(plain, "Use -p")
+        self.assertIn("Use -p", answer_md)
+        for node in ("pre_retrieval", "retrieval", "check_and_refine", "post_retrieval", "generate"):
+            self.assertIn(node, flow_md)
+        self.assertEqual(mock_embed.await_count, 2)
+
+
+class TestAskMany(unittest.TestCase):
+    """ask_many(): kolejność wyników, dedup zapytań i sub-queries w batchu, limit współbieżności."""
+
+    def test_dedup_and_order(self):
+        expansions = {
+            "How to persist data?": "docker volume mount\ndocker volume create",
+            "Keep data in containers?": "docker volume mount\nbind mount",
+            "Expose ports?": "docker run -p",
+        }
+        running = {"now": 0, "max": 0}
+
+        def pre_chain():
+            chain = MagicMock()
+            chain.ainvoke = AsyncMock(side_effect=lambda inputs: MagicMock(content=expansions[inputs["query"]]))
+            return chain
+
+        async def slow_generate(inputs):
+            running["now"] += 1
+            running["max"] = max(running["max"], running["now"])
+            await asyncio.sleep(0.01)
+            running["now"] -= 1
+            return MagicMock(content=f"answer: {inputs['query']}")
+
+        generate_chain = MagicMock()
+        generate_chain.ainvoke = AsyncMock(side_effect=slow_generate)
+        grader_chain = MagicMock()
+        grader_chain.ainvoke = AsyncMock(return_value=MagicMock(content="SCORE: 0.90\nREFINED: same"))
+        embedded: list[str] = []
+
+        async def fake_embed(queries, stats=None):
+            embedded.extend(queries)
+            stats.update({"hits": 0, "misses": len(queries), "api_calls": 1})
+            return [[float(len(q))] for q in queries]
+
+        doc = Document(page_content="volumes", metadata={"title": "Volumes"})
+        queries = ["How to persist data?", "Keep data in containers?", " How to persist  data?", "Expose ports?"]
+        with patch("workflow._pre_retrieval_chain", side_effect=pre_chain), \
+                patch("workflow._check_and_refine_chain", return_value=grader_chain), \
+                patch("workflow._generate_chain", return_value=generate_chain), \
+                patch("workflow.SPECULATIVE_RETRIEVAL_ENABLED", False), \
+                patch("workflow.aembed_queries", side_effect=fake_embed), \
+                patch("workflow.search_by_vector_with_scores", return_value=[(doc, 0.1)]) as mock_search, \
+                patch("workflow.lexical_search_with_scores", return_value=[]), \
+                patch("workflow.get_chunk_embeddings", return_value={}):
+            results = ask_many(queries, max_concurrency=2)
+
+        self.assertEqual(results, [
+            "answer: How to persist data?",
+            "answer: Keep data in containers?",
+            "answer: How to persist data?",
+            "answer: Expose ports?",
+        ])
+        self.assertEqual(generate_chain.ainvoke.await_count, 3)  # duplikat zapytania uruchomiony raz
+        self.assertEqual(sorted(embedded), sorted(["docker volume mount", "docker volume create", "bind mount", "docker run -p"]))
+        self.assertEqual(mock_search.call_count, 4)  # "docker volume mount" wyszukane raz dla całego batcha
+        self.assertLessEqual(running["max"], 2)
+
+
+class TestAskStream(unittest.TestCase):
+    """ask_stream(): progress dla etapów, tokeny z generate, trace na końcu."""
+
+    def test_streams_progress_then_generate_tokens(self):
+        from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+        from langchain_core.messages import AIMessage
+        from langchain_core.prompts import ChatPromptTemplate
+
+        def sync_chain(content: str) -> MagicMock:
+            chain = MagicMock()
+            chain.invoke.return_value = MagicMock(content=content)
+            return chain
+
+        generate_llm = GenericFakeChatModel(messages=iter([AIMessage(content="Use docker run -p")]))
+        generate_chain = ChatPromptTemplate.from_messages([("human", "{context} {query}")]) | generate_llm
+        doc = Document(page_content="docker run -p 8080:80", metadata={"title": "Ports"})
+        with patch("workflow._pre_retrieval_chain", return_value=sync_chain("publish port")), \
+                patch("workflow._check_and_refine_chain", return_value=sync_chain("SCORE: 0.90\nREFINED: same")), \
+                patch("workflow._generate_chain", return_value=generate_chain), \
+                patch("workflow.embed_queries", return_value=[[0.1]]), \
+                patch("workflow.search_by_vector_with_scores", return_value=[(doc, 0.1)]), \
+                patch("workflow.lexical_search_with_scores", return_value=[]), \
+                patch("workflow.get_chunk_embeddings", return_value={}), \
+                patch("workflow._graph", None):
+            events = list(ask_stream("How to expose ports?", trace=True))
+
+        progress = [e["node"] for e in events if e["type"] == "progress"]
+        tokens = [e["content"] for e in events if e["type"] == "token"]
+        self.assertEqual(progress[:4], ["pre_retrieval", "retrieval", "check_and_refine", "post_retrieval"])
+        self.assertGreater(len(tokens), 1)  # kilka chunków, nie jedna odpowiedź
+        self.assertEqual("".join(tokens), "Use docker run -p")
+        first_token = next(i for i, e in enumerate(events) if e["type"] == "token")
+        self.assertLess(events.index(next(e for e in events if e.get("node") == "post_retrieval")), first_token)
+        done = events[-1]
+        self.assertEqual(done["type"], "done")
+        self.assertEqual(done["answer"], "Use docker run -p")
+        self.assertIn("generate", done["flow_trace_md"])
 
 
 if __name__ == "__main__":
@@ -0,0 +1,247 @@
+"""
+Indeks wektorowy w procesie (NumPy) – alternatywa dla zapytań do Chroma (VECTOR_BACKEND="numpy").
+
+build_index eksportuje embeddingi chunków z Chroma do macierzy na dysku: wiersze znormalizowane
+(L2 = 1) i skwantyzowane do float16 albo int8 (skala na wiersz) – format zapisu, 2–4× mniejszy niż float32.
+Przy otwarciu macierz jest raz dekwantyzowana do float32 (skale już przemnożone) i trzymana w pamięci,
+więc zapytanie to jeden iloczyn macierz × wektor (BLAS) i wybór top-k przez argpartition; wyszukiwanie
+filtrowane – `matrix[rows] @ q`. Tabela chunków jak w lexical_index: JSONL czytany punktowo po offsetach,
+zmapowany (mmap) raz przy otwarciu indeksu.
+
+Każdy eksport trafia do nowego katalogu wersji (v<ns>), a plik CURRENT (podmieniany jednym os.replace)
+wskazuje aktualną – czytelnik nigdy nie łączy macierzy z jednej wersji z tabelą chunków z innej.
+Poprzednia wersja zostaje na dysku, starsze są usuwane; proces, który otworzył usuniętą wersję, dalej czyta
+chunki z jej mapowania (POSIX: plik znika z katalogu, dane – dopiero po zamknięciu mapowania).
+"""
+
+import json
+import mmap
+import os
+import re
+import shutil
+import time
+
+import numpy as np
+from langchain_core.documents import Document
+
+from lexical_index import _doc_line
+
+VECTORS_FILENAME = "vectors.npy"
+META_FILENAME = "meta.npz"
+DOCS_FILENAME = "docs.jsonl"
+CURRENT_FILENAME = "CURRENT"
+DTYPES = ("float16", "int8")
+_VERSION_RE = re.compile(r"^v\d+$")
+
+
+def metadata_matches(metadata: dict, where: dict | None) -> bool:
+    """Filtr metadanych: wszystkie pary klucz → wartość z `where` muszą być równe."""
+    return not where or all(metadata.get(key) == value for key, value in where.items())
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def quantize(vectors: np.ndarray, dtype: str) -> tuple[np.ndarray, np.ndarray | None]:
+    """Znormalizowane wektory → (macierz float16 / int8, skale int8 na wiersz albo None)."""
+    vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+    if dtype == "float16":
+        return vectors.astype(np.float16), None
+    if dtype == "int8":
+        scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+        return np.rint(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+    raise ValueError(f"Nieobsługiwany typ macierzy: {dtype!r} (dostępne: {', '.join(DTYPES)})")
+
+
+def dequantize(quantized: np.ndarray, scales: np.ndarray | None) -> np.ndarray:
+    """Macierz float16 / int8 z dysku → ciągła macierz float32 (int8: wiersze przemnożone przez skale)."""
+    matrix = np.ascontiguousarray(quantized, dtype=np.float32)
+    if scales is not None:
+        matrix *= scales[:, None]
+    return matrix
+
+
+def current_version_dir(directory: str) -> str:
+    """Katalog aktualnej wersji eksportu (wg CURRENT); starszy układ bez wersji – sam `directory`."""
+    try:
+        with open(os.path.join(directory, CURRENT_FILENAME), encoding="utf-8") as f:
+            return os.path.join(directory, f.read().strip())
+    except FileNotFoundError:
+        return directory
+
+
+class VectorIndex:
+    """Embeddingi chunków (float32 w pamięci, na dysku skwantyzowane) + tabela chunków; podobieństwo cosinusowe."""
+
+    def __init__(self, ids: list[str], matrix: np.ndarray, doc_offsets: np.ndarray, docs_path: str, dtype: str = "float32"):
+        self.ids = ids
+        self.matrix = matrix
+        self.doc_offsets = doc_offsets
+        self.docs_path = docs_path
+        self.dtype = dtype
+        self._docs = self._map(docs_path)
+        self._rows = {chunk_id: i for i, chunk_id in enumerate(ids)}
+        self._metadata: list[dict] | None = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @staticmethod
+    def _map(path: str) -> "mmap.mmap | bytes":
+        """Tabela chunków zmapowana raz – usunięcie pliku przez późniejszy eksport (_prune) jej nie unieważnia."""
+        with open(path, "rb") as f:
+            if not os.fstat(f.fileno()).st_size:
+                return b""  # pustego pliku nie da się zmapować
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _row(self, i: int) -> dict:
+        start = int(self.doc_offsets[i])
+        end = self._docs.find(b"\n", start)
+        return json.loads(self._docs[start : end if end >= 0 else len(self._docs)])
+
+    def row(self, chunk_id: str) -> int | None:
+        return self._rows.get(chunk_id)
+
+    @classmethod
+    def load(cls, directory: str) -> "VectorIndex | None":
+        """
+        Wczytuje aktualną wersję eksportu i dekwantyzuje macierz. Zwraca None, gdy indeks nie został
+        wyeksportowany albo pliki nie są spójne (różna liczba wierszy – np. eksport w starym układzie przerwany w połowie).
+        """
+        version_dir = current_version_dir(directory)
+        paths = [os.path.join(version_dir, name) for name in (VECTORS_FILENAME, META_FILENAME, DOCS_FILENAME)]
+        if not all(os.path.isfile(p) for p in paths):
+            return None
+        vectors_path, meta_path, docs_path = paths
+        with np.load(meta_path) as meta:
+            ids_blob = str(meta["ids"])
+            scales = meta["scales"] if meta["scales"].size else None
+            doc_offsets = meta["doc_offsets"]
+        ids = ids_blob.split("\n") if ids_blob else []
+        quantized = np.load(vectors_path)
+        if not len(quantized) == len(ids) == len(doc_offsets) or (scales is not None and len(scales) != len(ids)):
+            return None
+        return cls(ids, dequantize(quantized, scales), doc_offsets, docs_path, quantized.dtype.name)
+
+    def similarities(self, vector: list[float], rows: np.ndarray | None = None) -> np.ndarray:
+        """Cosinus zapytania z chunkami – jeden iloczyn macierz × wektor; `rows` – tylko te wiersze (w tej kolejności)."""
+        query = _normalize(np.asarray(vector, dtype=np.float32))
+        return self.matrix @ query if rows is None else self.matrix[rows] @ query
+
+    def search(
+        self, vector: list[float], k: int = 4, where: dict | None = None, rows: np.ndarray | None = None
+    ) -> list[tuple[Document, float]]:
+        """
+        Top-k chunków (argpartition); zwraca (chunk, dystans cosinusowy 1 - cos) – mniejszy = bliżej.
+        `rows` ogranicza kandydatów do tych wierszy (pre-filtr z metadata_index) – podobieństwo liczone
+        tylko dla nich; `where` – do chunków o pasujących metadanych (metadata_matches).
+        """
+        if not len(self):
+            return []
+        if rows is not None:
+            rows = np.asarray(rows, dtype=np.int64)
+        if where:
+            metadata = self.metadata()
+            candidates = range(len(self)) if rows is None else rows
+            rows = np.array([i for i in candidates if metadata_matches(metadata[i], where)], dtype=np.int64)
+        if rows is not None and not len(rows):
+            return []
+        sims = self.similarities(vector, rows)
+        k = min(k, len(sims))
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top], kind="stable")]
+        found = top if rows is None else rows[top]
+        return list(zip(self.get_documents([int(i) for i in found]), (float(1.0 - sims[i]) for i in top)))
+
+    def metadata(self) -> list[dict]:
+        """Metadane wszystkich chunków (jeden odczyt JSONL przy pierwszym filtrowanym wyszukiwaniu)."""
+        if self._metadata is None:
+            self._metadata = [self._row(i)["metadata"] for i in range(len(self))]
+        return self._metadata
+
+    def get_documents(self, rows: list[int]) -> list[Document]:
+        docs = []
+        for i in rows:
+            row = self._row(i)
+            docs.append(Document(id=row.get("id"), page_content=row["page_content"], metadata=row["metadata"]))
+        return docs
+
+    def get_embeddings(self, ids: list[str]) -> dict[str, list[float]]:
+        """Zdekwantyzowane (znormalizowane) embeddingi chunków po id – dla MMR."""
+        found = [(chunk_id, self._rows[chunk_id]) for chunk_id in ids if chunk_id in self._rows]
+        if not found:
+            return {}
+        vectors = self.matrix[[row for _, row in found]]
+        return {chunk_id: vector.tolist() for (chunk_id, _), vector in zip(found, vectors)}
+
+
+class VectorIndexWriter:
+    """
+    Eksport embeddingów partiami do nowego katalogu wersji: macierz zapisywana od razu do pliku .npy
+    (open_memmap, liczba wierszy znana z góry), chunki do JSONL. finish() przestawia CURRENT na nową wersję
+    (jeden os.replace) – czytelnicy widzą albo starą, albo nową wersję w całości.
+    """
+
+    def __init__(self, directory: str, count: int, dim: int, dtype: str = "float16"):
+        if dtype not in DTYPES:
+            raise ValueError(f"Nieobsługiwany typ macierzy: {dtype!r} (dostępne: {', '.join(DTYPES)})")
+        self.directory = directory
+        self.version = f"v{time.time_ns()}"
+        self.version_dir = os.path.join(directory, self.version)
+        os.makedirs(self.version_dir)
+        self.count = count
+        self.dtype = dtype
+        self._vectors_path = os.path.join(self.version_dir, VECTORS_FILENAME)
+        # Pustej macierzy nie da się zmapować (mmap o długości 0) – wtedy zwykła tablica zapisywana w finish()
+        if count:
+            self._vectors = np.lib.format.open_memmap(self._vectors_path, mode="w+", dtype=dtype, shape=(count, dim))
+        else:
+            self._vectors = np.zeros((0, dim), dtype=dtype)
+        self._scales = np.zeros(count if dtype == "int8" else 0, dtype=np.float32)
+        self._doc_offsets = np.zeros(count, dtype=np.int64)
+        self._ids: list[str] = []
+        self._file = open(os.path.join(self.version_dir, DOCS_FILENAME), "wb")
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add(self, docs: list[Document], vectors) -> None:
+        start, end = len(self._ids), len(self._ids) + len(docs)
+        if end > self.count:
+            raise ValueError(f"Więcej chunków niż zadeklarowano ({self.count})")
+        quantized, scales = quantize(vectors, self.dtype)
+        self._vectors[start:end] = quantized
+        if scales is not None:
+            self._scales[start:end] = scales
+        for i, doc in enumerate(docs, start):
+            self._doc_offsets[i] = self._file.tell()
+            self._file.write(_doc_line(doc))
+            self._ids.append(doc.id)
+
+    def finish(self) -> VectorIndex:
+        if len(self._ids) != self.count:
+            raise ValueError(f"Wyeksportowano {len(self._ids)} z {self.count} chunków")
+        self._file.close()
+        if isinstance(self._vectors, np.memmap):
+            self._vectors.flush()
+        else:
+            with open(self._vectors_path, "wb") as f:
+                np.save(f, self._vectors, allow_pickle=False)
+        del self._vectors
+        with open(os.path.join(self.version_dir, META_FILENAME), "wb") as f:
+            np.savez(f, ids=np.array("\n".join(self._ids)), scales=self._scales, doc_offsets=self._doc_offsets)
+        previous = os.path.basename(current_version_dir(self.directory))
+        pointer = os.path.join(self.directory, CURRENT_FILENAME)
+        with open(pointer + ".tmp", "w", encoding="utf-8") as f:
+            f.write(self.version)
+        os.replace(pointer + ".tmp", pointer)
+        self._prune(keep={self.version, previous})
+        return VectorIndex.load(self.directory)
+
+    def _prune(self, keep: set[str]) -> None:
+        """Usuwa wersje starsze niż poprzednia (także katalogi przerwanych eksportów)."""
+        for name in os.listdir(self.directory):
+            if _VERSION_RE.match(name) and name not in keep:
+                shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
@@ -0,0 +1,331 @@
+"""
+Backendy magazynu wektorów chunków – wspólny interfejs dla build_index.py i retriever.py.
+
+VectorStore: count, search (po wektorze, k, filtr metadanych, lista id kandydatów), get / get_embeddings (po id), upsert, delete,
+scan (stronicowany odczyt całości). Backend wybiera VECTOR_BACKEND w config.py, otwiera open_vector_store():
+- "chroma" (domyślny) – kolekcja Chroma w CHROMA_DIR,
+- "numpy" – indeks NumPy w procesie (vector_index.py), tylko do odczytu; build zapisuje do Chroma i eksportuje,
+- "memory" – słownik + macierz NumPy w pamięci procesu (testy, benchmarki).
+
+Filtr `where` to słownik {klucz metadanych: wartość} – chunk pasuje, gdy wszystkie wartości są równe
+(vector_index.metadata_matches). `ids` ogranicza wyszukiwanie do podanych chunków (pre-filtr
+z metadata_index.py – np. tylko chunki z tagiem "compose"); backendy NumPy liczą wtedy podobieństwo
+tylko dla tych wierszy. Chroma nie dostaje listy id w zapytaniu (każde filtrowane zapytanie to ~10–25 ms
+niezależnie od liczby kandydatów, wobec ~2 ms bez filtra): do CHROMA_EXACT_CANDIDATES kandydatów
+dystanse liczone są w procesie z ich embeddingów, większe zbiory – zapytanie HNSW bez filtra z nadmiarem
+wyników i odfiltrowanie w procesie; filtr `ids` w Chroma tylko, gdy nadmiar nie dał k kandydatów.
+Dystans w wynikach search: mniejszy = bliżej (Chroma: L2², pozostałe: 1 - cos); porównywalny tylko w obrębie backendu.
+"""
+
+import threading
+from abc import ABC, abstractmethod
+from collections.abc import Iterator
+
+import numpy as np
+from langchain_core.documents import Document
+
+from config import CHROMA_DIR, COLLECTION_NAME, VECTOR_BACKEND, VECTOR_INDEX_DIR
+from vector_index import VectorIndex, metadata_matches
+
+BACKENDS = ("chroma", "numpy", "memory")
+# Chroma + ids: do tylu kandydatów – dokładne dystanse z ich embeddingów (collection.get, ~2 ms za 20 id)
+CHROMA_EXACT_CANDIDATES = 64
+# Górna granica wyników zapytania bez filtra, odfiltrowywanych potem do kandydatów
+CHROMA_OVERFETCH_MAX = 300
+
+
+class VectorStore(ABC):
+    """Interfejs backendu. upsert zastępuje cały rekord (treść, metadane, wektor)."""
+
+    @abstractmethod
+    def count(self) -> int:
+        """Liczba chunków w magazynie."""
+
+    @abstractmethod
+    def search(
+        self, vector: list[float], k: int = 4, where: dict | None = None, ids: list[str] | None = None
+    ) -> list[tuple[Document, float]]:
+        """Top-k chunków najbliższych wektorowi (opcjonalnie tylko pasujące do `where` i spośród `ids`); (chunk, dystans)."""
+
+    @abstractmethod
+    def get(self, ids: list[str]) -> list[Document]:
+        """Chunki o podanych id (brakujące pominięte)."""
+
+    @abstractmethod
+    def get_embeddings(self, ids: list[str]) -> dict[str, list[float]]:
+        """Zapisane wektory chunków po id (brakujące pominięte)."""
+
+    @abstractmethod
+    def upsert(self, docs: list[Document], embeddings: list[list[float]]) -> None:
+        """Zapis chunków z wektorami (istniejące id – nadpisane)."""
+
+    @abstractmethod
+    def delete(self, ids: list[str]) -> None:
+        """Usunięcie chunków po id (brakujące pominięte)."""
+
+    @abstractmethod
+    def scan(self, page_size: int = 5000, include_embeddings: bool = False) -> Iterator[tuple[list[Document], list | None]]:
+        """Wszystkie chunki stronami: (chunki, wektory albo None)."""
+
+
+class ChromaVectorStore(VectorStore):
+    """Kolekcja Chroma (HNSW, L2) – ta sama, którą tworzył wcześniej langchain_chroma.Chroma."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    @classmethod
+    def open(cls, directory: str = CHROMA_DIR, collection_name: str = COLLECTION_NAME, client=None) -> "ChromaVectorStore":
+        if client is None:
+            import chromadb  # dopiero tutaj – backend "numpy" nie płaci za import Chroma przy starcie
+
+            client = chromadb.PersistentClient(path=directory)
+        return cls(client.get_or_create_collection(collection_name, embedding_function=None))
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    @staticmethod
+    def _where(where: dict | None) -> dict | None:
+        if not where:
+            return None
+        if len(where) == 1:
+            return dict(where)
+        return {"$and": [{key: value} for key, value in where.items()]}
+
+    @staticmethod
+    def _documents(ids, documents, metadatas) -> list[Document]:
+        return [Document(id=i, page_content=text or "", metadata=m or {}) for i, text, m in zip(ids, documents, metadatas)]
+
+    def search(
+        self, vector: list[float], k: int = 4, where: dict | None = None, ids: list[str] | None = None
+    ) -> list[tuple[Document, float]]:
+        if ids is None:
+            return self._results(self._query(vector, k, where, None))
+        ids = list(dict.fromkeys(ids))
+        if not ids:
+            return []
+        if len(ids) <= CHROMA_EXACT_CANDIDATES:
+            return self._search_exact(vector, k, where, ids)
+        # Nadmiar wyników bez filtra: najpierw 4k (filtr zwykle pasuje do pytania – kandydaci są najbliżej),
+        # potem tyle, by przy udziale len(ids) / count kandydatów w kolekcji oczekiwać ~2k z nich.
+        # Same id i dystanse – treść i metadane tylko dla top-k (ich odczyt z Chroma kosztuje więcej niż HNSW)
+        allowed = set(ids)
+        n_results = 4 * k
+        while True:
+            result = self._query(vector, n_results, where, None, include=["distances"])
+            found = [(i, d) for i, d in zip(result["ids"][0], result["distances"][0]) if i in allowed][:k]
+            if len(found) >= k or len(result["ids"][0]) < n_results:  # dość kandydatów albo cała kolekcja
+                docs = {doc.id: doc for doc in self.get([i for i, _ in found])}
+                return [(docs[i], d) for i, d in found if i in docs]
+            count = self.collection.count()
+            expected = min(count, CHROMA_OVERFETCH_MAX, -(-2 * k * count // len(ids)))
+            if expected <= n_results:
+                break
+            n_results = expected
+        from chromadb.errors import InternalError
+
+        try:
+            result = self._query(vector, k, where, ids)
+        except InternalError as exc:
+            # id spoza kolekcji (np. indeks metadanych z innego buildu) przerywa zapytanie – zostają tylko istniejące
+            if "Error finding id" not in str(exc):
+                raise
+            ids = self.collection.get(ids=ids, include=[])["ids"]
+            if not ids:
+                return []
+            result = self._query(vector, k, where, ids)
+        return self._results(result)
+
+    def _search_exact(self, vector: list[float], k: int, where: dict | None, ids: list[str]) -> list[tuple[Document, float]]:
+        """Dystanse L2² (jak w kolekcji) liczone w procesie z embeddingów kandydatów – bez filtrowanego zapytania."""
+        include = ["embeddings", "metadatas"] if where else ["embeddings"]
+        result = self.collection.get(ids=ids, include=include)
+        found = result["ids"]
+        if where:
+            found = [i for i, m in zip(found, result["metadatas"]) if metadata_matches(m or {}, where)]
+        if not found:
+            return []
+        embeddings = dict(zip(result["ids"], result["embeddings"]))
+        matrix = np.asarray([embeddings[i] for i in found], dtype=np.float32)
+        distances = np.sum((matrix - np.asarray(vector, dtype=np.float32)) ** 2, axis=1)
+        top = np.argsort(distances, kind="stable")[:k]
+        docs = {doc.id: doc for doc in self.get([found[i] for i in top])}
+        return [(docs[found[i]], float(distances[i])) for i in top]
+
+    def _results(self, result: dict) -> list[tuple[Document, float]]:
+        docs = self._documents(result["ids"][0], result["documents"][0], result["metadatas"][0])
+        return list(zip(docs, result["distances"][0]))
+
+    def _query(self, vector: list[float], k: int, where: dict | None, ids: list[str] | None, include: list[str] | None = None) -> dict:
+        return self.collection.query(
+            query_embeddings=[vector],
+            n_results=k,
+            where=self._where(where),
+            ids=list(ids) if ids is not None else None,
+            include=include or ["documents", "metadatas", "distances"],
+        )
+
+    def get(self, ids: list[str]) -> list[Document]:
+        if not ids:
+            return []
+        result = self.collection.get(ids=list(ids), include=["documents", "metadatas"])
+        return self._documents(result["ids"], result["documents"], result["metadatas"])
+
+    def get_embeddings(self, ids: list[str]) -> dict[str, list[float]]:
+        if not ids:
+            return {}
+        result = self.collection.get(ids=list(ids), include=["embeddings"])
+        return dict(zip(result["ids"], result["embeddings"]))
+
+    def upsert(self, docs: list[Document], embeddings: list[list[float]]) -> None:
+        # upsert/update w Chroma scalają metadane – usunięte klucze zostałyby ze starego rekordu
+        ids = [d.id for d in docs]
+        self.collection.delete(ids=ids)
+        self.collection.add(
+            ids=ids,
+            embeddings=embeddings,
+            metadatas=[d.metadata for d in docs],
+            documents=[d.page_content for d in docs],
+        )
+
+    def delete(self, ids: list[str]) -> None:
+        if ids:
+            self.collection.delete(ids=list(ids))
+
+    def scan(self, page_size: int = 5000, include_embeddings: bool = False) -> Iterator[tuple[list[Document], list | None]]:
+        include = ["documents", "metadatas"] + (["embeddings"] if include_embeddings else [])
+        offset = 0
+        while True:
+            page = self.collection.get(include=include, limit=page_size, offset=offset)
+            if page["ids"]:
+                yield self._documents(page["ids"], page["documents"], page["metadatas"]), page["embeddings"] if include_embeddings else None
+            if len(page["ids"]) < page_size:
+                return
+            offset += page_size
+
+
+class InMemoryVectorStore(VectorStore):
+    """Chunki i wektory w słownikach; znormalizowana macierz NumPy składana przy pierwszym search po zmianie."""
+
+    _shared: dict[str, "InMemoryVectorStore"] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self):
+        self._docs: dict[str, Document] = {}
+        self._vectors: dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+        self._matrix: tuple[list[Document], np.ndarray, dict[str, int]] | None = None
+
+    @classmethod
+    def open(cls, name: str = COLLECTION_NAME) -> "InMemoryVectorStore":
+        """Wspólna instancja na nazwę w obrębie procesu (jak kolekcja w kliencie Chroma)."""
+        with cls._shared_lock:
+            return cls._shared.setdefault(name, cls())
+
+    def count(self) -> int:
+        return len(self._docs)
+
+    def search(
+        self, vector: list[float], k: int = 4, where: dict | None = None, ids: list[str] | None = None
+    ) -> list[tuple[Document, float]]:
+        with self._lock:
+            if self._matrix is None:
+                docs = list(self._docs.values())
+                matrix = np.stack([self._vectors[d.id] for d in docs]) if docs else np.zeros((0, 0), dtype=np.float32)
+                matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+                self._matrix = (docs, matrix, {d.id: i for i, d in enumerate(docs)})
+            docs, matrix, row_of = self._matrix
+        rows = np.arange(len(docs))
+        if ids is not None:
+            rows = np.array(sorted(row_of[i] for i in set(ids) if i in row_of), dtype=np.int64)
+        if where:
+            rows = np.array([i for i in rows if metadata_matches(docs[i].metadata, where)], dtype=np.int64)
+        if ids is not None or where:
+            matrix = matrix[rows]
+        if not len(rows):
+            return []
+        query = np.asarray(vector, dtype=np.float32)
+        sims = matrix @ (query / max(float(np.linalg.norm(query)), 1e-12))
+        k = min(k, len(rows))
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top], kind="stable")]
+        return [(docs[rows[i]], float(1.0 - sims[i])) for i in top]
+
+    def get(self, ids: list[str]) -> list[Document]:
+        return [self._docs[i] for i in ids if i in self._docs]
+
+    def get_embeddings(self, ids: list[str]) -> dict[str, list[float]]:
+        return {i: self._vectors[i].tolist() for i in ids if i in self._vectors}
+
+    def upsert(self, docs: list[Document], embeddings: list[list[float]]) -> None:
+        with self._lock:
+            for doc, vector in zip(docs, embeddings):
+                self._docs[doc.id] = Document(id=doc.id, page_content=doc.page_content, metadata=dict(doc.metadata))
+                self._vectors[doc.id] = np.asarray(vector, dtype=np.float32)
+            self._matrix = None
+
+    def delete(self, ids: list[str]) -> None:
+        with self._lock:
+            for i in ids:
+                self._docs.pop(i, None)
+                self._vectors.pop(i, None)
+            self._matrix = None
+
+    def scan(self, page_size: int = 5000, include_embeddings: bool = False) -> Iterator[tuple[list[Document], list | None]]:
+        ids = list(self._docs)
+        for start in range(0, len(ids), page_size):
+            page = ids[start : start + page_size]
+            yield [self._docs[i] for i in page], [self._vectors[i].tolist() for i in page] if include_embeddings else None
+
+
+class NumpyVectorStore(VectorStore):
+    """Indeks NumPy z vector_index.py (float32 w pamięci) – tylko do odczytu, odświeżany eksportem w build_index."""
+
+    def __init__(self, index: VectorIndex):
+        self.index = index
+
+    def count(self) -> int:
+        return len(self.index)
+
+    def search(
+        self, vector: list[float], k: int = 4, where: dict | None = None, ids: list[str] | None = None
+    ) -> list[tuple[Document, float]]:
+        rows = None
+        if ids is not None:
+            rows = np.array(sorted(r for r in map(self.index.row, set(ids)) if r is not None), dtype=np.int64)
+        return self.index.search(vector, k=k, where=where, rows=rows)
+
+    def get(self, ids: list[str]) -> list[Document]:
+        return self.index.get_documents([self.index.row(i) for i in ids if self.index.row(i) is not None])
+
+    def get_embeddings(self, ids: list[str]) -> dict[str, list[float]]:
+        return self.index.get_embeddings(list(ids))
+
+    def upsert(self, docs: list[Document], embeddings: list[list[float]]) -> None:
+        raise PermissionError("Indeks NumPy jest tylko do odczytu – eksportuje go build_index.py z Chroma")
+
+    def delete(self, ids: list[str]) -> None:
+        raise PermissionError("Indeks NumPy jest tylko do odczytu – eksportuje go build_index.py z Chroma")
+
+    def scan(self, page_size: int = 5000, include_embeddings: bool = False) -> Iterator[tuple[list[Document], list | None]]:
+        for start in range(0, len(self.index), page_size):
+            ids = self.index.ids[start : start + page_size]
+            embeddings = self.index.get_embeddings(ids) if include_embeddings else None
+            yield self.index.get_documents(list(range(start, start + len(ids)))), [embeddings[i] for i in ids] if embeddings else None
+
+
+def open_vector_store(backend: str = VECTOR_BACKEND, writable: bool = False) -> VectorStore:
+    """
+    Otwiera backend wg nazwy. writable=True – magazyn, do którego pisze build_index (dla "numpy" to Chroma,
+    z której indeks NumPy jest eksportowany). Niewyeksportowany indeks NumPy → Chroma.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Nieznany VECTOR_BACKEND: {backend!r} (dostępne: {', '.join(BACKENDS)})")
+    if backend == "memory":
+        return InMemoryVectorStore.open()
+    if backend == "numpy" and not writable:
+        index = VectorIndex.load(VECTOR_INDEX_DIR)
+        if index is not None:
+            return NumpyVectorStore(index)
+    return ChromaVectorStore.open()
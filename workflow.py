@@ -3,13 +3,21 @@ Advanced RAG LangGraph workflow following the diagram:
   Pre-Retrieval (smart LLM) → Retrieval (cheap embeddings) → Post-Retrieval (smart LLM) → Generate (frozen LLM)
 
 Retrieval: orchestrator–workers pattern – równoległe workery dla każdego expanded query.
+Async: aask() uruchamia ten sam graf z węzłami async (chain.ainvoke, asyncio.gather w retrieval).
 """
 
 import argparse
+import asyncio
+import contextvars
 import operator
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from collections.abc import Iterator
+from contextvars import ContextVar
 from typing import Annotated, TypedDict
 
+import numpy as np
 from dotenv import load_dotenv
 
 load_dotenv(override=True)  # przed importem LangChain (LangSmith observability)
@@ -20,22 +28,65 @@ from langchain_openai import ChatOpenAI
 from langgraph.graph import END, START, StateGraph
 
 from config import (
+    CONTEXT_COMPRESSION_ENABLED,
+    CONTEXT_COMPRESSION_MIN_SCORE,
+    CONTEXT_STITCH_ENABLED,
+    CONTEXT_STITCH_FETCH_MIDDLE,
+    CONTEXT_TOKEN_BUDGET,
     EMBEDDING_MODEL,
     GRADER_LLM_MODEL,
+    MMR_ENABLED,
+    MMR_LAMBDA,
+    MMR_TOP_K,
+    NEAR_DUPLICATE_THRESHOLD,
     OPENROUTER_API_KEY,
     OPENROUTER_BASE_URL,
+    ASK_MANY_MAX_CONCURRENCY,
+    QUERY_ROUTING_ENABLED,
     RETRIEVAL_MAX_WORKERS,
+    ROUTER_CENTROID_MARGIN,
+    SEMANTIC_CACHE_ENABLED,
+    SEMANTIC_CACHE_MAX_ENTRIES,
+    SEMANTIC_CACHE_PATH,
+    SEMANTIC_CACHE_THRESHOLD,
+    SEMANTIC_CACHE_TTL_S,
     SMART_LLM_MODEL,
+    SPECULATIVE_RETRIEVAL_ENABLED,
+    SPECULATIVE_SKIP_SIMILARITY,
+)
+from chunk_stitching import stitch_adjacent
+from context_builder import build_context, count_tokens
+from context_compression import compress_documents, query_terms
+from embedding_cache import normalize_text
+from metadata_index import normalize_filters, validate_filters
+from near_duplicates import near_duplicate_of
+from query_router import ROUTE_EXAMPLES, build_centroids, keyword_route, nearest_centroid
+from rerank import minmax_normalize, mmr_select
+from semantic_cache import SemanticCache
+from retriever import (
+    aembed_queries,
+    embed_queries,
+    get_chunk_embeddings,
+    get_chunks,
+    get_index_version,
+    get_term_weights,
+    lexical_search_with_scores,
+    resolve_filters,
+    search_by_vector_with_scores,
 )
-from retriever import get_retriever
 
 
 # --- State ---
 class RAGState(TypedDict, total=False):
     query: str
+    filters: dict  # metadata pre-filter, e.g. {"tags": ["compose"]} (metadata_index.py); empty = whole index
     route: str  # "direct" | "rag"
+    route_method: str  # which stage decided the route: "rules" | "centroid" | "llm" | "filters"
+    speculative_lists: list[dict]  # raw-query ranked lists searched while pre_retrieval's LLM call ran
+    query_vector: list  # embedding of the original query (semantic cache / routing), reused when present
     expanded_queries: list[str]
     raw_docs: list
+    ranked_lists: Annotated[list[dict], operator.add]  # {"query", "source", "docs", "scores"} per query × source, all passes
     reranked_docs: list
     context: str
     answer: str
@@ -54,11 +105,11 @@ def _get_smart_llm():
     )
 
 
-def _log(state: RAGState, node: str, model: str | None, calls: int, detail: str) -> dict:
-    """Append flow trace entry when trace=True."""
+def _log(state: RAGState, node: str, model: str | None, calls: int, detail: str, **extra) -> dict:
+    """Append flow trace entry when trace=True. Extra keyword fields (e.g. cache counters) are kept in the entry."""
     if not state.get("trace"):
         return {}
-    return {"flow_log": [{"node": node, "model": model or "-", "calls": calls, "detail": detail}]}
+    return {"flow_log": [{"node": node, "model": model or "-", "calls": calls, "detail": detail, **extra}]}
 
 
 def _get_grader_llm():
@@ -82,19 +133,143 @@ Question: {query}
 Reply with exactly one word: DIRECT or RAG"""
 
 
+def _route_chain():
+    llm = _get_smart_llm()
+    prompt = ChatPromptTemplate.from_messages([("human", ROUTE_PROMPT)])
+    return prompt | llm
+
+
+_route_centroids = None
+_route_centroids_lock = threading.Lock()
+
+
+def _get_route_centroids() -> tuple[dict, int]:
+    """
+    Centroids of ROUTE_EXAMPLES embeddings – embedded once per process (and kept in the embedding cache),
+    under a lock so concurrent first requests share one embedding call. Returns (centroids, embedding API
+    calls made by this caller) – the call is counted in the route_query trace of the request that paid for it.
+    """
+    global _route_centroids
+    if _route_centroids is not None:
+        return _route_centroids, 0
+    with _route_centroids_lock:
+        if _route_centroids is not None:
+            return _route_centroids, 0
+        examples = [(route, q) for route, queries in ROUTE_EXAMPLES.items() for q in queries]
+        stats: dict = {}
+        vectors = embed_queries([q for _, q in examples], stats=stats)
+        _route_centroids = build_centroids(_group_vectors(examples, vectors))
+        return _route_centroids, stats.get("api_calls", 1)
+
+
+async def _aget_route_centroids() -> tuple[dict, int]:
+    """Async _get_route_centroids: the first (locked) computation runs in a worker thread, not on the event loop."""
+    if _route_centroids is not None:
+        return _route_centroids, 0
+    return await asyncio.to_thread(_get_route_centroids)
+
+
+def _group_vectors(examples: list[tuple[str, str]], vectors: list[list[float]]) -> dict[str, list[list[float]]]:
+    grouped: dict[str, list[list[float]]] = {}
+    for (route, _), vector in zip(examples, vectors):
+        grouped.setdefault(route, []).append(vector)
+    return grouped
+
+
+def _route_without_embedding(state: RAGState) -> dict | None:
+    """Zero-cost decisions: a metadata filter means the user wants documentation; otherwise keyword rules."""
+    if normalize_filters(state.get("filters")):
+        return _route_result(state, "rag", "filters", None, 0, "Metadata filter given → RAG (no classification)")
+    route, rules = keyword_route(state["query"])
+    if route is not None:
+        return _route_result(state, route, "rules", None, 0, f"Keyword rules {rules} → {route.upper()}")
+    return None
+
+
+def _route_by_centroid(
+    state: RAGState, vector: list[float], centroids, embed_calls: int, centroid_calls: int, rules: list[str]
+) -> dict | None:
+    """Nearest-centroid decision; None when the margin is below ROUTER_CENTROID_MARGIN (→ LLM)."""
+    route, margin = nearest_centroid(vector, centroids)
+    if margin < ROUTER_CENTROID_MARGIN:
+        print(f"[DEBUG route_query] centroid margin {margin:.3f} < {ROUTER_CENTROID_MARGIN} – uncertain, asking LLM")
+        return None
+    detail = f"Nearest centroid → {route.upper()} (margin {margin:.3f}; keyword rules {rules or 'none'} inconclusive)"
+    if centroid_calls:
+        detail += "; ROUTE_EXAMPLES embedded for the centroids (first request in this process)"
+    out = _route_result(
+        state, route, "centroid", EMBEDDING_MODEL, embed_calls + centroid_calls, detail,
+        route_margin=round(margin, 4), centroid_embedding_calls=centroid_calls,
+    )
+    out["query_vector"] = vector
+    return out
+
+
+def _route_by_llm(state: RAGState, content: str | None, vector: list[float], embed_calls: int, centroid_calls: int) -> dict:
+    route = _parse_route(content)
+    out = _route_result(
+        state, route, "llm", SMART_LLM_MODEL, 1, f"Local classifier uncertain → LLM: {route.upper()}",
+        embedding_calls=embed_calls + centroid_calls, centroid_embedding_calls=centroid_calls,
+    )
+    out["query_vector"] = vector
+    return out
+
+
+def _route_result(state: RAGState, route: str, method: str, model: str | None, calls: int, detail: str, **extra) -> dict:
+    print("[DEBUG route_query] OUT: route =", route, "| decided by", method)
+    out = {"route": route, "route_method": method}
+    out.update(_log(state, "route_query", model, calls, detail, route=route, route_method=method, **extra))
+    return out
+
+
+def _parse_route(content: str | None) -> str:
+    return "direct" if content and "direct" in content.strip().lower() else "rag"
+
+
 def route_query(state: RAGState) -> dict:
-    """LLM decides: answer directly (no retrieval) or run RAG pipeline."""
+    """
+    Decide: answer directly (no retrieval) or run the RAG pipeline. Local first – keyword rules, then
+    nearest centroid on the query embedding; the LLM is asked only when the centroid margin is too small.
+    """
     query = state["query"]
     print("\n[DEBUG route_query] IN:  query =", repr(query))
-    llm = _get_smart_llm()
-    prompt = ChatPromptTemplate.from_messages([("human", ROUTE_PROMPT)])
-    chain = prompt | llm
-    response = chain.invoke({"query": query})
-    route = "rag"
-    if response.content and "direct" in response.content.strip().lower():
-        route = "direct"
-    print("[DEBUG route_query] OUT: route =", route)
-    return {"route": route}
+    out = _route_without_embedding(state)
+    if out is not None:
+        return out
+    _, rules = keyword_route(query)
+    vector = state.get("query_vector")
+    embed_calls = 0
+    if vector is None:
+        stats: dict = {}
+        vector = embed_queries([query], stats=stats)[0]
+        embed_calls = stats.get("api_calls", 1)
+    centroids, centroid_calls = _get_route_centroids()
+    out = _route_by_centroid(state, vector, centroids, embed_calls, centroid_calls, rules)
+    if out is not None:
+        return out
+    return _route_by_llm(state, _route_chain().invoke({"query": query}).content, vector, embed_calls, centroid_calls)
+
+
+async def aroute_query(state: RAGState) -> dict:
+    """Async route_query (aembed_queries, chain.ainvoke for the LLM fallback)."""
+    query = state["query"]
+    print("\n[DEBUG route_query] IN:  query =", repr(query))
+    out = _route_without_embedding(state)
+    if out is not None:
+        return out
+    _, rules = keyword_route(query)
+    vector = state.get("query_vector")
+    embed_calls = 0
+    if vector is None:
+        stats: dict = {}
+        vector = (await aembed_queries([query], stats=stats))[0]
+        embed_calls = stats.get("api_calls", 1)
+    centroids, centroid_calls = await _aget_route_centroids()
+    out = _route_by_centroid(state, vector, centroids, embed_calls, centroid_calls, rules)
+    if out is not None:
+        return out
+    content = (await _route_chain().ainvoke({"query": query})).content
+    return _route_by_llm(state, content, vector, embed_calls, centroid_calls)
 
 
 def _route_to_direct_or_rag(state: RAGState) -> str:
@@ -112,54 +287,434 @@ Given the user query, produce 1-3 optimized search queries that will retrieve th
 - Output ONLY the queries, one per line, no numbering or bullets"""
 
 
-def pre_retrieval(state: RAGState) -> dict:
-    """Query rewriting and expansion using smart LLM."""
-    print("\n[DEBUG pre_retrieval] IN:  query =", repr(state["query"]))
+def _pre_retrieval_chain():
     llm = _get_smart_llm()
     prompt = ChatPromptTemplate.from_messages([("human", PRE_RETRIEVAL_PROMPT + "\n\nUser query: {query}")])
-    chain = prompt | llm
-    response = chain.invoke({"query": state["query"]})
-    lines = [q.strip() for q in response.content.strip().split("\n") if q.strip()]
-    queries = lines[:3] if lines else [state["query"]]
+    return prompt | llm
+
+
+def _start_expansion(chain, inputs: dict) -> Future:
+    """
+    Expansion call in its own daemon thread, in a copy of the caller's context (the LLM run stays a child
+    of pre_retrieval in LangGraph / LangSmith). Not a shared pool: a discarded expansion runs to completion,
+    and in a pool it would hold a worker that a later request's expansion has to wait for.
+    """
+    future: Future = Future()
+    context = contextvars.copy_context()
+
+    def run():
+        try:
+            future.set_result(context.run(_timed_invoke, chain, inputs))
+        except BaseException as exc:
+            future.set_exception(exc)
+
+    threading.Thread(target=run, name="pre_retrieval_expansion", daemon=True).start()
+    return future
+
+
+def pre_retrieval(state: RAGState) -> dict:
+    """
+    Query rewriting and expansion using smart LLM. With SPECULATIVE_RETRIEVAL_ENABLED the hybrid search
+    for the original query runs while the expansion call is in flight; confident raw-query hits skip
+    the expansion, otherwise the speculative lists are merged by retrieval. A running thread cannot be
+    stopped, so a skipped expansion call still completes (and is paid for) – the trace records it as discarded.
+    """
+    print("\n[DEBUG pre_retrieval] IN:  query =", repr(state["query"]))
+    started = time.perf_counter()
+    if not SPECULATIVE_RETRIEVAL_ENABLED:
+        response = _pre_retrieval_chain().invoke({"query": state["query"]})
+        return _pre_retrieval_result(state, response)
+    expansion = _start_expansion(_pre_retrieval_chain(), {"query": state["query"]})
+    embed_stats: dict = {}
+    speculative = _speculative_retrieval(state, embed_stats)
+    embed_calls = embed_stats.get("api_calls", 0)
+    if speculative is not None and speculative["confident"]:
+        return _pre_retrieval_result(state, None, speculative, None, started, skipped="discarded", embedding_calls=embed_calls)
+    response, timing = expansion.result()
+    return _pre_retrieval_result(state, response, speculative, timing, started, embedding_calls=embed_calls)
+
+
+async def apre_retrieval(state: RAGState) -> dict:
+    """Async pre_retrieval (chain.ainvoke); the speculative search runs while the expansion task is pending."""
+    print("\n[DEBUG pre_retrieval] IN:  query =", repr(state["query"]))
+    started = time.perf_counter()
+    if not SPECULATIVE_RETRIEVAL_ENABLED:
+        response = await _pre_retrieval_chain().ainvoke({"query": state["query"]})
+        return _pre_retrieval_result(state, response)
+    expansion = asyncio.create_task(_atimed_invoke(_pre_retrieval_chain(), {"query": state["query"]}))
+    embed_stats: dict = {}
+    try:
+        speculative = await _aspeculative_retrieval(state, embed_stats)
+    except BaseException:
+        expansion.cancel()
+        raise
+    embed_calls = embed_stats.get("api_calls", 0)
+    if speculative is not None and speculative["confident"]:
+        expansion.cancel()  # drops the in-flight HTTP request
+        return _pre_retrieval_result(state, None, speculative, None, started, skipped="cancelled", embedding_calls=embed_calls)
+    response, timing = await expansion
+    return _pre_retrieval_result(state, response, speculative, timing, started, embedding_calls=embed_calls)
+
+
+def _timed_invoke(chain, inputs: dict):
+    start = time.perf_counter()
+    response = chain.invoke(inputs)
+    return response, (start, time.perf_counter())
+
+
+async def _atimed_invoke(chain, inputs: dict):
+    start = time.perf_counter()
+    response = await chain.ainvoke(inputs)
+    return response, (start, time.perf_counter())
+
+
+def _speculative_retrieval(state: RAGState, embed_stats: dict) -> dict | None:
+    """
+    Hybrid search for the original query (vector from routing / semantic cache when present). Errors → None.
+    `embed_stats` receives the embedding call stats (api_calls) – also when the search itself fails.
+    """
+    start = time.perf_counter()
+    try:
+        vector = state.get("query_vector") or _embed_raw_query(state["query"], embed_stats)
+        candidates, _ = _filter_candidates(state)
+        ranked = _retrieval_worker(state["query"], vector, candidates)
+        return _speculative_result(ranked, vector, start)
+    except Exception as exc:
+        print(f"[DEBUG pre_retrieval] speculative retrieval failed ({type(exc).__name__}: {exc}) – expansion only")
+        return None
+
+
+async def _aspeculative_retrieval(state: RAGState, embed_stats: dict) -> dict | None:
+    start = time.perf_counter()
+    try:
+        vector = state.get("query_vector") or await _aembed_raw_query(state["query"], embed_stats)
+        candidates, _ = _filter_candidates(state)
+        ranked = await _aretrieval_worker(state["query"], vector, candidates)
+        return _speculative_result(ranked, vector, start)
+    except Exception as exc:
+        print(f"[DEBUG pre_retrieval] speculative retrieval failed ({type(exc).__name__}: {exc}) – expansion only")
+        return None
+
+
+def _embed_raw_query(query: str, embed_stats: dict) -> list[float]:
+    vector = embed_queries([query], stats=embed_stats)[0]
+    embed_stats.setdefault("api_calls", 1)
+    return vector
+
+
+async def _aembed_raw_query(query: str, embed_stats: dict) -> list[float]:
+    vector = (await aembed_queries([query], stats=embed_stats))[0]
+    embed_stats.setdefault("api_calls", 1)
+    return vector
+
+
+def _speculative_result(ranked: list[dict], vector: list[float], start: float) -> dict:
+    """
+    Confidence of the raw-query hits: cosine similarity of the top dense chunk (its stored embedding,
+    comparable across backends) ≥ SPECULATIVE_SKIP_SIMILARITY, and the same chunk found by BM25.
+    """
+    dense = next((r["docs"] for r in ranked if r["source"] == "dense"), [])
+    lexical = next((r["docs"] for r in ranked if r["source"] == "bm25"), [])
+    similarity = None
+    if dense and dense[0].id:
+        stored = get_chunk_embeddings([dense[0].id]).get(dense[0].id)
+        if stored is not None:
+            a, b = np.asarray(vector, dtype=np.float32), np.asarray(stored, dtype=np.float32)
+            similarity = float(a @ b / max(float(np.linalg.norm(a) * np.linalg.norm(b)), 1e-12))
+    agree = bool(dense) and any(_doc_key(d) == _doc_key(dense[0]) for d in lexical)
+    confident = similarity is not None and similarity >= SPECULATIVE_SKIP_SIMILARITY and agree
+    return {"lists": ranked, "similarity": similarity, "agree": agree, "confident": confident, "interval": (start, time.perf_counter())}
+
+
+def _ms(seconds: float) -> int:
+    return round(seconds * 1000)
+
+
+def _pre_retrieval_result(
+    state: RAGState,
+    response,
+    speculative: dict | None = None,
+    timing: tuple[float, float] | None = None,
+    started: float | None = None,
+    skipped: str | None = None,
+    embedding_calls: int = 0,
+) -> dict:
+    """
+    skipped – what happened to the issued expansion call: "discarded" (sync, ran to completion) or "cancelled" (async).
+    embedding_calls – API calls embedding the raw query for the speculative search (0: vector reused or cached).
+    """
+    embedding = {"embedding_calls": embedding_calls} if embedding_calls else {}
+    if response is None:
+        queries = [state["query"]]  # expansion skipped – the speculative lists are the retrieval result
+    else:
+        lines = [q.strip() for q in response.content.strip().split("\n") if q.strip()]
+        queries = lines[:3] if lines else [state["query"]]
     print("[DEBUG pre_retrieval] OUT: expanded_queries =", queries)
     out = {"expanded_queries": queries}
-    out.update(_log(state, "pre_retrieval", SMART_LLM_MODEL, 1, f"Expanded to {len(queries)} search queries"))
+    if speculative is None:
+        out.update(_log(state, "pre_retrieval", SMART_LLM_MODEL, 1, f"Expanded to {len(queries)} search queries", **embedding))
+        return out
+
+    out["speculative_lists"] = speculative["lists"]
+    spec_start, spec_end = speculative["interval"]
+    similarity = "n/a" if speculative["similarity"] is None else f"{speculative['similarity']:.2f}"
+    confidence = f"top similarity {similarity}, dense/BM25 {'agree' if speculative['agree'] else 'differ'}"
+    stage_ms = _ms(time.perf_counter() - started)
+    if response is None:
+        detail = (
+            f"Speculative retrieval on the raw query ({_ms(spec_end - spec_start)} ms) confident ({confidence}) "
+            f"→ expansion skipped (its LLM call was already issued, {skipped}), stage took {stage_ms} ms"
+        )
+        timings = {
+            "speculative_ms": _ms(spec_end - spec_start), "expansion_ms": None, "overlap_ms": 0, "expansion_call": skipped,
+        }
+    else:
+        exp_start, exp_end = timing
+        overlap = max(0.0, min(spec_end, exp_end) - max(spec_start, exp_start))
+        detail = (
+            f"Expansion LLM ({_ms(exp_end - exp_start)} ms) overlapped with speculative retrieval on the raw query "
+            f"({_ms(spec_end - spec_start)} ms, {_ms(overlap)} ms in parallel; {confidence}); "
+            f"expanded to {len(queries)} search queries, stage took {stage_ms} ms"
+        )
+        timings = {"speculative_ms": _ms(spec_end - spec_start), "expansion_ms": _ms(exp_end - exp_start), "overlap_ms": _ms(overlap)}
+    out.update(_log(
+        state, "pre_retrieval", SMART_LLM_MODEL, 1, detail,
+        expansion="skipped" if response is None else "used",
+        stage_ms=stage_ms,
+        embedding_calls=embedding_calls,
+        **timings,
+    ))
     return out
 
 
-# --- Retrieval: Orchestrator–Workers (parallel embeddings + vector search) ---
-def _retrieval_worker(query: str) -> list[Document]:
-    """Worker: pojedynczy retriever.invoke dla jednego query. Wywoływany równolegle."""
-    retriever = get_retriever(k=6)
-    return retriever.invoke(query)
+# --- Retrieval: Orchestrator–Workers (one batched embedding call + parallel hybrid search) ---
+RRF_K = 60  # stała Reciprocal Rank Fusion (Cormack et al.)
+
+
+def _doc_key(d: Document) -> int:
+    """Klucz deduplikacji chunków (pierwsze 200 znaków treści)."""
+    return hash(d.page_content[:200])
+
+
+def _rrf_fuse_with_scores(
+    ranked_lists: list[list[Document]], k: int = RRF_K, near_duplicate_threshold: float | None = NEAR_DUPLICATE_THRESHOLD
+) -> list[tuple[Document, float]]:
+    """
+    Reciprocal Rank Fusion: score(d) = Σ 1 / (k + rank). Remisy – kolejność pierwszego wystąpienia.
+    Prawie-duplikaty (sygnatury MinHash, podobieństwo ≥ near_duplicate_threshold; None – wyłączone) są scalane:
+    zostaje chunk z wyższym score, a score duplikatu jest do niego dodawany.
+    """
+    scores: dict[int, float] = {}
+    docs: dict[int, Document] = {}
+    for ranked in ranked_lists:
+        for rank, d in enumerate(ranked, 1):
+            key = _doc_key(d)
+            docs.setdefault(key, d)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    order = sorted(docs, key=lambda key: -scores[key])
+    fused = [(docs[key], scores[key]) for key in order]
+    if near_duplicate_threshold is None or len(fused) < 2:
+        return fused
+    owner = near_duplicate_of([d for d, _ in fused], near_duplicate_threshold)
+    merged = {i: score for i, (_, score) in enumerate(fused) if owner[i] == i}
+    for i, (_, score) in enumerate(fused):
+        if owner[i] != i:
+            merged[owner[i]] += score
+    return [(fused[i][0], merged[i]) for i in sorted(merged, key=lambda i: -merged[i])]
+
+
+def _rrf_fuse(ranked_lists: list[list[Document]], k: int = RRF_K) -> list[Document]:
+    return [d for d, _ in _rrf_fuse_with_scores(ranked_lists, k=k)]
+
+
+def _to_ranked_lists(query: str, dense: list[tuple[Document, float]], lexical: list[tuple[Document, float]]) -> list[dict]:
+    ranked = []
+    for source, hits in (("dense", dense), ("bm25", lexical)):
+        if hits:
+            ranked.append({
+                "query": query,
+                "source": source,
+                "docs": [d for d, _ in hits],
+                "scores": [float(score) for _, score in hits],
+            })
+    return ranked
+
+
+def _candidate_kwargs(candidates: tuple[list[int], list[str]] | None) -> tuple[dict, dict]:
+    """(wiersze BM25, id chunków) z resolve_filters → kwargs dla wyszukiwania dense i BM25 (puste bez filtra)."""
+    if candidates is None:
+        return {}, {}
+    rows, ids = candidates
+    return {"ids": ids}, {"rows": rows}
+
+
+def _retrieval_worker(query: str, vector: list[float], candidates: tuple[list[int], list[str]] | None = None) -> list[dict]:
+    """
+    Worker: hybrid search dla jednego query – dense (similarity_search_by_vector) + BM25.
+    Zwraca osobne listy rankingowe (z score) – fuzja RRF w post_retrieval.
+    Wywoływany równolegle (współdzielony indeks z retriever.py). `candidates` – pre-filtr metadanych.
+    """
+    dense_kwargs, lexical_kwargs = _candidate_kwargs(candidates)
+    return _to_ranked_lists(
+        query,
+        search_by_vector_with_scores(vector, k=6, **dense_kwargs),
+        lexical_search_with_scores(query, k=6, **lexical_kwargs),
+    )
+
+
+async def _aretrieval_worker(query: str, vector: list[float], candidates: tuple[list[int], list[str]] | None = None) -> list[dict]:
+    """Async worker: magazyn wektorów (synchroniczne API) w domyślnym executorze pętli, BM25 bezpośrednio (ms, in-process)."""
+    dense_kwargs, lexical_kwargs = _candidate_kwargs(candidates)
+    dense = await asyncio.to_thread(search_by_vector_with_scores, vector, 6, **dense_kwargs)
+    return _to_ranked_lists(query, dense, lexical_search_with_scores(query, k=6, **lexical_kwargs))
+
+
+def _filter_candidates(state: RAGState) -> tuple[tuple[list[int], list[str]] | None, dict]:
+    """
+    Metadata pre-filter for this request: (BM25 rows, chunk ids) of the matching chunks, plus trace fields.
+    No filter / no metadata index → None (whole index). A filter matching nothing is ignored (noted in
+    the trace) rather than returning no context at all.
+    """
+    filters = {field: list(values) for field, values in normalize_filters(state.get("filters")).items()}
+    if not filters:
+        return None, {}
+    candidates = resolve_filters(filters)
+    if candidates is None:
+        return None, {"filters": filters, "filter_candidates": None}
+    if not candidates[1]:
+        return None, {"filters": filters, "filter_candidates": 0}
+    return candidates, {"filters": filters, "filter_candidates": len(candidates[1])}
 
 
 def retrieval(state: RAGState) -> dict:
     """
-    Orchestrator: uruchamia równoległe workery – każdy worker wykonuje
-    retriever.invoke(q) dla jednego expanded query. Przyspiesza retrieval.
+    Orchestrator: embeduje wszystkie expanded queries jednym batchowym wywołaniem,
+    a następnie uruchamia równoległe workery – każdy wykonuje similarity_search_by_vector
+    + BM25 dla jednego query. Jeden round-trip embeddings na przebieg retrieval.
+    Listy rankingowe każdego query trafiają do ranked_lists (kolejność wg expanded_queries, deterministyczna).
     """
     queries = state["expanded_queries"]
-    print("\n[DEBUG retrieval] IN:  expanded_queries =", queries, "| workers =", min(len(queries), RETRIEVAL_MAX_WORKERS))
-
-    all_docs: list[Document] = []
-    seen_ids: set[int] = set()
-    max_workers = min(len(queries), RETRIEVAL_MAX_WORKERS)
-
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = {executor.submit(_retrieval_worker, q): q for q in queries}
-        for future in as_completed(futures):
-            docs = future.result()
-            for d in docs:
-                cid = hash(d.page_content[:200])
-                if cid not in seen_ids:
-                    seen_ids.add(cid)
-                    all_docs.append(d)
+    speculative, to_search = _speculative_reuse(state, queries)
+    print("\n[DEBUG retrieval] IN:  expanded_queries =", queries, "| workers =", min(len(to_search), RETRIEVAL_MAX_WORKERS))
+
+    embed_stats: dict = {"hits": 0, "misses": 0, "api_calls": 0}
+    candidates, filter_info = _filter_candidates(state)
+    per_query = [speculative] if speculative else []
+    if to_search:
+        vectors = embed_queries(to_search, stats=embed_stats)
+        with ThreadPoolExecutor(max_workers=min(len(to_search), RETRIEVAL_MAX_WORKERS)) as executor:
+            per_query += executor.map(_retrieval_worker, to_search, vectors, [candidates] * len(to_search))
+    return _retrieval_result(state, queries, per_query, embed_stats, filter_info, len(queries) - len(to_search))
+
+
+def _speculative_reuse(state: RAGState, queries: list[str]) -> tuple[list[dict], list[str]]:
+    """
+    Ranked lists of the speculative raw-query search (first pass only – a refine retry searches anew)
+    and the expanded queries still to search (the raw query is not searched twice).
+    """
+    speculative = [] if state.get("retrieval_attempt") else (state.get("speculative_lists") or [])
+    done = {normalize_text(r["query"]) for r in speculative}
+    return speculative, [q for q in queries if normalize_text(q) not in done]
+
+
+# ask_many(): wspólna (na batch) mapa sub-query → Future z listami rankingowymi; None poza batchem
+_batch_retrieval_memo: ContextVar[dict | None] = ContextVar("_batch_retrieval_memo", default=None)
+
+
+async def aretrieval(state: RAGState) -> dict:
+    """Async retrieval: aembed_queries + asyncio.gather po workerach (bez ThreadPoolExecutor per request)."""
+    queries = state["expanded_queries"]
+    speculative, to_search = _speculative_reuse(state, queries)
+    print("\n[DEBUG retrieval] IN:  expanded_queries =", queries, "| async workers =", len(to_search))
+
+    embed_stats: dict = {"hits": 0, "misses": 0, "api_calls": 0}
+    candidates, filter_info = _filter_candidates(state)
+    memo = _batch_retrieval_memo.get()
+    per_query = [speculative] if speculative else []
+    if not to_search:
+        pass
+    elif memo is not None:
+        per_query += await _aretrieve_shared(to_search, memo, embed_stats, candidates, filter_info.get("filters"))
+    else:
+        vectors = await aembed_queries(to_search, stats=embed_stats)
+        per_query += await asyncio.gather(*(_aretrieval_worker(q, v, candidates) for q, v in zip(to_search, vectors)))
+    return _retrieval_result(state, queries, per_query, embed_stats, filter_info, len(queries) - len(to_search))
+
+
+async def _aretrieve_shared(
+    queries: list[str],
+    memo: dict,
+    embed_stats: dict,
+    candidates: tuple[list[int], list[str]] | None = None,
+    filters: dict | None = None,
+) -> list[list[dict]]:
+    """
+    Retrieval w ramach ask_many(): każde (znormalizowane) sub-query jest embedowane i wyszukiwane
+    raz na cały batch (osobno dla każdego filtra metadanych). Nowe sub-queries tego requestu idą
+    jednym batchowym embeddingiem; te już obsługiwane przez inne requesty – czekają na ich Future.
+    """
+    loop = asyncio.get_running_loop()
+    owned: list[tuple[str, asyncio.Future]] = []
+    futures = []
+    filter_key = tuple((field, tuple(values)) for field, values in (filters or {}).items())
+    for q in queries:
+        key = (normalize_text(q), filter_key)
+        future = memo.get(key)
+        if future is None:
+            future = memo[key] = loop.create_future()
+            owned.append((q, future))
+        futures.append(future)
+
+    embed_stats.update({"hits": 0, "misses": 0, "api_calls": 0})
+    if owned:
+        try:
+            vectors = await aembed_queries([q for q, _ in owned], stats=embed_stats)
+            results = await asyncio.gather(*(_aretrieval_worker(q, v, candidates) for (q, _), v in zip(owned, vectors)))
+        except BaseException as exc:
+            for _, future in owned:
+                if not future.done():
+                    future.set_exception(exc)
+            raise
+        for (_, future), ranked in zip(owned, results):
+            future.set_result(ranked)
+    embed_stats["batch_shared"] = len(queries) - len(owned)
+    return [await future for future in futures]
+
+
+def _retrieval_result(
+    state: RAGState,
+    queries: list[str],
+    per_query: list[list[dict]],
+    embed_stats: dict,
+    filter_info: dict | None = None,
+    speculative_reused: int = 0,
+) -> dict:
+    api_calls = embed_stats.get("api_calls", 1)
+    ranked_lists = [ranked for lists in per_query for ranked in lists]
+    all_docs = _rrf_fuse([r["docs"] for r in ranked_lists])
 
     titles = [d.metadata.get("title", "?") for d in all_docs[:6]]
     print("[DEBUG retrieval] OUT: raw_docs count =", len(all_docs), "| titles (first 6) =", titles)
-    out = {"raw_docs": all_docs}
-    out.update(_log(state, "retrieval", EMBEDDING_MODEL, len(queries), f"Vector search for {len(queries)} queries, {len(all_docs)} docs after dedup"))
+    out = {"raw_docs": all_docs, "ranked_lists": ranked_lists}
+    searched = len(queries) - speculative_reused
+    detail = f"Batched embedding of {searched} queries ({api_calls} call), hybrid search (dense + BM25) for {searched} queries, {len(all_docs)} docs after dedup"
+    if speculative_reused:
+        detail += "; raw-query results reused from speculative retrieval"
+    if filter_info:
+        count = filter_info["filter_candidates"]
+        if count is None:
+            detail += f"; filter {filter_info['filters']} ignored (no metadata index)"
+        elif count == 0:
+            detail += f"; filter {filter_info['filters']} matched no chunks, searched the whole index"
+        else:
+            detail += f"; pre-filtered to {count} chunks by {filter_info['filters']}"
+    out.update(_log(
+        state, "retrieval", EMBEDDING_MODEL, api_calls, detail,
+        embedding_cache_hits=embed_stats.get("hits", 0),
+        embedding_cache_misses=embed_stats.get("misses", searched),
+        **({"batch_shared_queries": embed_stats["batch_shared"]} if "batch_shared" in embed_stats else {}),
+        **(filter_info or {}),
+    ))
     return out
 
 
@@ -206,10 +761,9 @@ def _parse_grader_response(response_text: str) -> tuple[float, str]:
     return score, refined
 
 
-def check_and_refine_query(state: RAGState) -> dict:
-    """Grader 0–1: if score < threshold, LLM refines the query."""
+def _check_and_refine_skip(state: RAGState) -> dict | None:
+    """Skip the grader (no docs or retry limit reached). Returns the node output or None."""
     raw_docs = state.get("raw_docs", [])
-    query = state["query"]
     attempt = state.get("retrieval_attempt", 0)
     print("\n[DEBUG check_and_refine] IN:  raw_docs count =", len(raw_docs), "| retrieval_attempt =", attempt)
 
@@ -218,14 +772,42 @@ def check_and_refine_query(state: RAGState) -> dict:
         out = {"retrieval_attempt": 0}
         out.update(_log(state, "check_and_refine", None, 0, "Skipped (no docs or retry limit)"))
         return out
+    return None
 
-    chunk_preview = "\n".join(
-        f"- {d.metadata.get('title', '?')}: {d.page_content[:80]}..." for d in raw_docs[:3]
-    )
+
+def _check_and_refine_chain():
     llm = _get_grader_llm()
     prompt = ChatPromptTemplate.from_messages([("human", CHECK_AND_REFINE_PROMPT)])
-    chain = prompt | llm
-    response = chain.invoke({"query": query, "chunk_preview": chunk_preview})
+    return prompt | llm
+
+
+def _check_and_refine_inputs(state: RAGState) -> dict:
+    chunk_preview = "\n".join(
+        f"- {d.metadata.get('title', '?')}: {d.page_content[:80]}..." for d in state["raw_docs"][:3]
+    )
+    return {"query": state["query"], "chunk_preview": chunk_preview}
+
+
+def check_and_refine_query(state: RAGState) -> dict:
+    """Grader 0–1: if score < threshold, LLM refines the query."""
+    skipped = _check_and_refine_skip(state)
+    if skipped is not None:
+        return skipped
+    response = _check_and_refine_chain().invoke(_check_and_refine_inputs(state))
+    return _check_and_refine_result(state, response)
+
+
+async def acheck_and_refine_query(state: RAGState) -> dict:
+    """Async check_and_refine_query (chain.ainvoke)."""
+    skipped = _check_and_refine_skip(state)
+    if skipped is not None:
+        return skipped
+    response = await _check_and_refine_chain().ainvoke(_check_and_refine_inputs(state))
+    return _check_and_refine_result(state, response)
+
+
+def _check_and_refine_result(state: RAGState, response) -> dict:
+    query = state["query"]
     score, refined = _parse_grader_response(response.content)
     docs_ok = score >= RELEVANCE_THRESHOLD
 
@@ -249,22 +831,102 @@ def _route_after_check(state: RAGState) -> str:
     if state.get("retrieval_attempt") == 1:
         return "retrieval"
     return "post_retrieval"
+
+
+def _mmr_rerank(fused: list[tuple[Document, float]], k: int, lambda_mult: float) -> list[Document]:
+    """MMR nad kandydatami z RRF: relewancja = znormalizowany score RRF, różnorodność = cosinus zapisanych embeddingów."""
+    docs = [d for d, _ in fused]
+    ids = [d.id for d in docs if d.id]
+    stored = get_chunk_embeddings(ids) if ids else {}
+    if not stored:
+        return docs[:k]
+    dim = len(next(iter(stored.values())))
+    embeddings = np.zeros((len(docs), dim), dtype=np.float32)
+    for i, d in enumerate(docs):
+        if d.id in stored:
+            embeddings[i] = stored[d.id]
+    order = mmr_select(minmax_normalize([score for _, score in fused]), embeddings, k, lambda_mult)
+    return [docs[i] for i in order]
+
+
 def post_retrieval(state: RAGState) -> dict:
-    """Rerank and prepare context. Use smart LLM to compress if needed."""
-    docs = state["raw_docs"]
-    print("\n[DEBUG post_retrieval] IN:  raw_docs count =", len(docs))
-    # RRF: treat each query's results as a list (simplified: we merged already, so just take top by diversity)
-    # Keep top 6 most relevant
-    reranked = docs[:8]
-    context = "\n\n---\n\n".join(
-        f"[{i+1}] (from: {d.metadata.get('title', '?')})\n{d.page_content}" for i, d in enumerate(reranked[:6])
+    """
+    Rerank and prepare context. Reciprocal Rank Fusion over every ranked list
+    (each expanded query × dense/BM25, including the refined-query retry),
+    then MMR diversity selection over the candidates' stored embeddings.
+    Consecutive chunks of one source document are stitched into a single block with the splitter
+    overlap removed (a missing middle chunk is fetched by id when CONTEXT_STITCH_FETCH_MIDDLE is on).
+    The context takes ranked blocks until CONTEXT_TOKEN_BUDGET tokens (the last one trimmed at a sentence boundary).
+    """
+    ranked_lists = state.get("ranked_lists") or []
+    fused = _rrf_fuse_with_scores([r["docs"] for r in ranked_lists] if ranked_lists else [state["raw_docs"]])
+    print("\n[DEBUG post_retrieval] IN:  raw_docs count =", len(state.get("raw_docs", [])), "| ranked lists =", len(ranked_lists))
+    if MMR_ENABLED:
+        reranked = _mmr_rerank(fused, MMR_TOP_K, MMR_LAMBDA)
+    else:
+        reranked = [d for d, _ in fused[:MMR_TOP_K]]
+    stitch_stats = {"stitched": 0, "fetched": 0, "overlap_chars": 0}
+    if CONTEXT_STITCH_ENABLED:
+        reranked, stitch_stats = stitch_adjacent(reranked, get_chunks if CONTEXT_STITCH_FETCH_MIDDLE else None)
+    context, stats = build_context(reranked, CONTEXT_TOKEN_BUDGET)
+    print(
+        "[DEBUG post_retrieval] OUT: reranked count =", len(reranked), "| context =", stats["chunks"], "chunks,",
+        stats["tokens"], "tokens,", len(context), "chars",
     )
-    print("[DEBUG post_retrieval] OUT: reranked count =", len(reranked), "| context length =", len(context), "chars")
     out = {"reranked_docs": reranked, "context": context}
-    out.update(_log(state, "post_retrieval", None, 0, f"Built context from {len(reranked)} chunks ({len(context)} chars)"))
+    rerank_detail = f"MMR λ={MMR_LAMBDA} over {len(fused)} candidates" if MMR_ENABLED else "no MMR"
+    if stitch_stats["stitched"]:
+        rerank_detail += (
+            f", stitched {stitch_stats['stitched']} adjacent chunks ({stitch_stats['fetched']} fetched, "
+            f"{stitch_stats['overlap_chars']} overlap chars removed)"
+        )
+    out.update(_log(
+        state, "post_retrieval", None, 0,
+        f"RRF over {len(ranked_lists)} ranked lists, {rerank_detail}, built context from {stats['chunks']} of {len(reranked)} chunks "
+        f"({stats['tokens']}/{stats['budget']} tokens{', last chunk trimmed' if stats['trimmed'] else ''}, {len(context)} chars)",
+        context_tokens=stats["tokens"],
+        context_token_budget=stats["budget"],
+        context_chunks=stats["chunks"],
+        stitched_chunks=stitch_stats["stitched"],
+        fetched_chunks=stitch_stats["fetched"],
+    ))
+    return out
+
+
+async def apost_retrieval(state: RAGState) -> dict:
+    """Async post_retrieval: CPU + odczyt embeddingów z magazynu wektorów w domyślnym executorze pętli."""
+    return await asyncio.to_thread(post_retrieval, state)
+
+
+# --- Compress context (optional): extractive, no LLM call ---
+def compress_context(state: RAGState) -> dict:
+    """
+    Keep only the sentences and code blocks of the reranked chunks that share terms with the query
+    (original + expanded, IDF-weighted from the BM25 index), then rebuild the context in the same token budget.
+    """
+    docs = state.get("reranked_docs") or []
+    queries = [state["query"]] + list(state.get("expanded_queries") or [])
+    weights = get_term_weights(query_terms(queries))
+    compressed, stats = compress_documents(docs, queries, weights, CONTEXT_COMPRESSION_MIN_SCORE)
+    context, context_stats = build_context([d for d in compressed if d.page_content], CONTEXT_TOKEN_BUDGET)
+    tokens_before = count_tokens(state.get("context") or "")
+    print("[DEBUG compress_context] OUT: context tokens", tokens_before, "→", context_stats["tokens"])
+    out = {"context": context}
+    out.update(_log(
+        state, "compress_context", None, 0,
+        f"Kept {stats['kept_units']}/{stats['units']} sentences/code blocks, context from {context_stats['chunks']} chunks, "
+        f"{tokens_before} → {context_stats['tokens']} tokens",
+        context_tokens_before=tokens_before,
+        context_tokens=context_stats["tokens"],
+    ))
     return out
 
 
+async def acompress_context(state: RAGState) -> dict:
+    """Async compress_context (CPU + BM25 IDF lookup in the default executor)."""
+    return await asyncio.to_thread(compress_context, state)
+
+
 # --- Generate: Frozen LLM ---
 GENERATE_PROMPT = """You are a helpful Docker documentation assistant. Answer the user's question based ONLY on the provided context.
 
@@ -282,32 +944,95 @@ User question: {query}
 Answer:"""
 
 
-def generate(state: RAGState) -> dict:
-    """Generate final answer using frozen smart LLM."""
+def _generate_chain():
     llm = _get_smart_llm()
     prompt = ChatPromptTemplate.from_messages([("human", GENERATE_PROMPT)])
-    chain = prompt | llm
-    response = chain.invoke({"context": state["context"], "query": state["query"]})
+    return prompt | llm
+
+
+def generate(state: RAGState) -> dict:
+    """Generate final answer using frozen smart LLM."""
+    response = _generate_chain().invoke({"context": state["context"], "query": state["query"]})
+    return _generate_result(state, response)
+
+
+async def agenerate(state: RAGState) -> dict:
+    """Async generate (chain.ainvoke)."""
+    response = await _generate_chain().ainvoke({"context": state["context"], "query": state["query"]})
+    return _generate_result(state, response)
+
+
+def _generate_result(state: RAGState, response) -> dict:
     out = {"answer": response.content}
     out.update(_log(state, "generate", SMART_LLM_MODEL, 1, "Final answer generation"))
     return out
 
 
+# --- Generate direct: general questions answered without documentation ---
+DIRECT_PROMPT = """You are a Docker expert. Answer this general question about Docker and containers from your own knowledge.
+Be concise and accurate; answer in the language of the question.
+
+Question: {query}"""
+
+
+def _generate_direct_chain():
+    llm = _get_smart_llm()
+    prompt = ChatPromptTemplate.from_messages([("human", DIRECT_PROMPT)])
+    return prompt | llm
+
+
+def generate_direct(state: RAGState) -> dict:
+    """Answer a general question (route = direct) without retrieval."""
+    response = _generate_direct_chain().invoke({"query": state["query"]})
+    return _generate_direct_result(state, response)
+
+
+async def agenerate_direct(state: RAGState) -> dict:
+    response = await _generate_direct_chain().ainvoke({"query": state["query"]})
+    return _generate_direct_result(state, response)
+
+
+def _generate_direct_result(state: RAGState, response) -> dict:
+    out = {"answer": response.content}
+    out.update(_log(state, "generate_direct", SMART_LLM_MODEL, 1, "Direct answer without documentation"))
+    return out
+
+
 # --- Build graph ---
-def build_rag_graph():
+def build_rag_graph(use_async: bool = False, compress: bool | None = None, route: bool | None = None):
+    """
+    Compile the RAG graph. use_async=True wires the async node implementations (for ainvoke / aask).
+    compress (default CONTEXT_COMPRESSION_ENABLED) adds compress_context between post_retrieval and generate.
+    route (default QUERY_ROUTING_ENABLED) starts with route_query: general questions go to generate_direct.
+    """
+    compress = CONTEXT_COMPRESSION_ENABLED if compress is None else compress
+    route = QUERY_ROUTING_ENABLED if route is None else route
     builder = StateGraph(RAGState)
 
-    builder.add_node("pre_retrieval", pre_retrieval)
-    builder.add_node("retrieval", retrieval)
-    builder.add_node("check_and_refine", check_and_refine_query)
-    builder.add_node("post_retrieval", post_retrieval)
-    builder.add_node("generate", generate)
-
-    builder.add_edge(START, "pre_retrieval")
+    builder.add_node("pre_retrieval", apre_retrieval if use_async else pre_retrieval)
+    builder.add_node("retrieval", aretrieval if use_async else retrieval)
+    builder.add_node("check_and_refine", acheck_and_refine_query if use_async else check_and_refine_query)
+    builder.add_node("post_retrieval", apost_retrieval if use_async else post_retrieval)
+    builder.add_node("generate", agenerate if use_async else generate)
+    if compress:
+        builder.add_node("compress_context", acompress_context if use_async else compress_context)
+
+    if route:
+        builder.add_node("route_query", aroute_query if use_async else route_query)
+        builder.add_node("generate_direct", agenerate_direct if use_async else generate_direct)
+        builder.add_edge(START, "route_query")
+        builder.add_conditional_edges("route_query", _route_to_direct_or_rag, ["generate_direct", "pre_retrieval"])
+        builder.add_edge("generate_direct", END)
+    else:
+        builder.add_edge(START, "pre_retrieval")
     builder.add_edge("pre_retrieval", "retrieval")
     builder.add_edge("retrieval", "check_and_refine")
     builder.add_conditional_edges("check_and_refine", _route_after_check, ["retrieval", "post_retrieval"])
-    builder.add_edge("post_retrieval", "generate")
+    if compress:
+        builder.add_edge("post_retrieval", "compress_context")
+        builder.add_edge("compress_context", "generate")
+    else:
+        builder.add_edge("post_retrieval", "generate")
     builder.add_edge("generate", END)
 
     return builder.compile()
@@ -315,6 +1040,7 @@ def build_rag_graph():
 
 # --- Entry point ---
 _graph = None
+_async_graph = None
 
 
 def get_rag_graph():
@@ -324,6 +1050,14 @@ def get_rag_graph():
     return _graph
 
 
+def get_async_rag_graph():
+    """Compiled graph with async nodes – shared by all aask() calls on the event loop."""
+    global _async_graph
+    if _async_graph is None:
+        _async_graph = build_rag_graph(use_async=True)
+    return _async_graph
+
+
 def _format_answer_md(query: str, answer: str) -> str:
     """Format answer as markdown document."""
     return f"""# Answer
@@ -356,9 +1090,14 @@ def _format_flow_trace_md(query: str, flow_log: list[dict]) -> str:
         lines.append(f"- **Model:** {model}")
         lines.append(f"- **API calls:** {calls}")
         lines.append(f"- **Detail:** {detail}")
+        for key, value in entry.items():
+            if key not in ("node", "model", "calls", "detail"):
+                lines.append(f"- **{key}:** {value}")
         lines.append("")
         if model and model != "-" and calls > 0:
             model_totals[model] = model_totals.get(model, 0) + calls
+        if model != EMBEDDING_MODEL and entry.get("embedding_calls"):  # embedding alongside an LLM step
+            model_totals[EMBEDDING_MODEL] = model_totals.get(EMBEDDING_MODEL, 0) + entry["embedding_calls"]
 
     lines.append("## Model Call Summary")
     lines.append("")
@@ -369,25 +1108,263 @@ def _format_flow_trace_md(query: str, flow_log: list[dict]) -> str:
     return "\n".join(lines)
 
 
-def ask(query: str, trace: bool = False) -> str | tuple[str, str]:
+# --- Semantic answer cache (opt-in) ---
+_semantic_cache: SemanticCache | None = None
+_semantic_cache_lock = threading.Lock()
+
+
+def get_semantic_cache() -> SemanticCache:
     """
-    Run the RAG workflow and return the answer.
-    When trace=True, returns (answer_md, flow_trace_md) – two markdown documents.
+    Shared semantic cache; namespace = embedding model + index version (a rebuild invalidates it).
+    Created once under a lock – concurrent first requests (aask / ask_many) must not each build their own matrix.
     """
-    graph = get_rag_graph()
+    global _semantic_cache
+    namespace = f"{EMBEDDING_MODEL}:{get_index_version()}"
+    if _semantic_cache is None:
+        with _semantic_cache_lock:
+            if _semantic_cache is None:
+                _semantic_cache = SemanticCache(
+                    SEMANTIC_CACHE_PATH,
+                    namespace,
+                    threshold=SEMANTIC_CACHE_THRESHOLD,
+                    ttl_s=SEMANTIC_CACHE_TTL_S,
+                    max_entries=SEMANTIC_CACHE_MAX_ENTRIES,
+                )
+                return _semantic_cache
+    _semantic_cache.set_namespace(namespace)
+    return _semantic_cache
+
+
+def _semantic_cache_lookup(query: str) -> tuple[list[float], dict | None, dict]:
+    """Embed the query (embedding cache applies) and look it up. Returns (vector, cached_entry, flow_log entry)."""
+    embed_stats: dict = {}
+    vector = embed_queries([query], stats=embed_stats)[0]
+    return _semantic_cache_check(vector, embed_stats)
+
+
+async def _asemantic_cache_lookup(query: str) -> tuple[list[float], dict | None, dict]:
+    embed_stats: dict = {}
+    vector = (await aembed_queries([query], stats=embed_stats))[0]
+    return _semantic_cache_check(vector, embed_stats)
+
+
+def _semantic_cache_check(vector: list[float], embed_stats: dict) -> tuple[list[float], dict | None, dict]:
+    cache = get_semantic_cache()
+    cached = cache.lookup(vector)
+    entry = {"node": "semantic_cache", "model": EMBEDDING_MODEL, "calls": embed_stats.get("api_calls", 1)}
+    if cached is None:
+        entry["detail"] = f"Miss (no cached query with similarity >= {cache.threshold}), running full pipeline"
+    else:
+        entry["detail"] = f"Hit (similarity {cached['similarity']} >= {cache.threshold}) for cached query {cached['query']!r}"
+    entry.update({"cache_hits": cache.hits, "cache_misses": cache.misses})
+    return vector, cached, entry
+
+
+def _cached_flow_log(cached: dict) -> list[dict]:
+    """Steps of the cached run, marked as cached (0 calls now; original call count kept)."""
+    return [
+        {**step, "node": f"{step.get('node', '?')} (cached)", "calls": 0, "original_calls": step.get("calls", 0)}
+        for step in cached["flow_log"]
+    ]
+
+
+def _format_result(query: str, answer: str, flow_log: list[dict], trace: bool) -> str | tuple[str, str]:
+    if not trace:
+        return answer
+    return _format_answer_md(query, answer), _format_flow_trace_md(query, flow_log)
+
+
+def _use_semantic_cache(use_cache: bool | None, filters: dict | None) -> bool:
+    """Cached answers come from unfiltered runs – a filtered query never reads or writes the semantic cache."""
+    use_cache = SEMANTIC_CACHE_ENABLED if use_cache is None else use_cache
+    return bool(use_cache) and not normalize_filters(filters)
+
+
+def _initial_state(query: str, trace: bool, filters: dict | None = None, query_vector: list | None = None) -> RAGState:
     initial_state: RAGState = {"query": query, "trace": trace}
+    if filters:
+        initial_state["filters"] = filters
+    if query_vector is not None:
+        initial_state["query_vector"] = query_vector  # already embedded for the semantic cache – routing reuses it
     if trace:
         initial_state["flow_log"] = []
-    result = graph.invoke(initial_state)
+    return initial_state
+
+
+def ask(
+    query: str, trace: bool = False, use_cache: bool | None = None, filters: dict | None = None
+) -> str | tuple[str, str]:
+    """
+    Run the RAG workflow and return the answer.
+    When trace=True, returns (answer_md, flow_trace_md) – two markdown documents.
+    use_cache=True (or SEMANTIC_CACHE=1) returns a cached answer for a semantically similar earlier query.
+    filters restricts retrieval to chunks with matching tags/keywords/aliases, e.g. {"tags": ["compose", "networking"]}
+    (any value within a field, all fields); filtered queries bypass the semantic cache.
+    An unknown filter field raises ValueError before the graph runs.
+    """
+    validate_filters(filters)
+    use_cache = _use_semantic_cache(use_cache, filters)
+    cache_log: list[dict] = []
+    query_vector = None
+    if use_cache:
+        query_vector, cached, cache_entry = _semantic_cache_lookup(query)
+        if cached is not None:
+            return _format_result(query, cached["answer"], [cache_entry] + _cached_flow_log(cached), trace)
+        cache_log = [cache_entry]
+
+    # With the cache on, the trace is always collected so it can be stored next to the answer
+    result = get_rag_graph().invoke(_initial_state(query, trace or use_cache, filters, query_vector))
     answer = result.get("answer", "")
+    flow_log = result.get("flow_log") or []
 
-    if not trace:
-        return answer
+    if use_cache and answer.strip():
+        get_semantic_cache().store(query, query_vector, answer, flow_log)
 
+    return _format_result(query, answer, cache_log + flow_log, trace)
+
+
+async def aask(
+    query: str, trace: bool = False, use_cache: bool | None = None, filters: dict | None = None
+) -> str | tuple[str, str]:
+    """
+    Async ask(): same contract, runs the async graph (ainvoke on every LLM chain, asyncio.gather
+    for the retrieval fan-out). Concurrent aask() calls share one event loop.
+    """
+    validate_filters(filters)
+    use_cache = _use_semantic_cache(use_cache, filters)
+    cache_log: list[dict] = []
+    query_vector = None
+    if use_cache:
+        query_vector, cached, cache_entry = await _asemantic_cache_lookup(query)
+        if cached is not None:
+            return _format_result(query, cached["answer"], [cache_entry] + _cached_flow_log(cached), trace)
+        cache_log = [cache_entry]
+
+    result = await get_async_rag_graph().ainvoke(_initial_state(query, trace or use_cache, filters, query_vector))
+    answer = result.get("answer", "")
     flow_log = result.get("flow_log") or []
-    answer_md = _format_answer_md(query, answer)
-    flow_md = _format_flow_trace_md(query, flow_log)
-    return answer_md, flow_md
+
+    if use_cache and answer.strip():
+        get_semantic_cache().store(query, query_vector, answer, flow_log)
+
+    return _format_result(query, answer, cache_log + flow_log, trace)
+
+
+async def aask_many(
+    queries: list[str],
+    max_concurrency: int = ASK_MANY_MAX_CONCURRENCY,
+    trace: bool = False,
+    use_cache: bool | None = None,
+    filters: dict | None = None,
+) -> list[str | tuple[str, str]]:
+    """
+    Async ask_many(): identical queries run once, up to max_concurrency graphs run at a time, and
+    identical expanded sub-queries are embedded/searched once for the whole batch.
+    Results follow the input order; each has the same shape as ask() (per-query trace with trace=True).
+    filters (as in ask()) apply to every query of the batch.
+    """
+    validate_filters(filters)
+    unique: dict[str, str] = {}
+    for q in queries:
+        unique.setdefault(normalize_text(q), q)
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def run(query: str):
+        async with semaphore:
+            return await aask(query, trace=trace, use_cache=use_cache, filters=filters)
+
+    token = _batch_retrieval_memo.set({})
+    try:
+        results = await asyncio.gather(*(run(q) for q in unique.values()))
+    finally:
+        _batch_retrieval_memo.reset(token)
+    by_key = dict(zip(unique, results))
+    return [by_key[normalize_text(q)] for q in queries]
+
+
+def ask_many(
+    queries: list[str],
+    max_concurrency: int = ASK_MANY_MAX_CONCURRENCY,
+    trace: bool = False,
+    use_cache: bool | None = None,
+    filters: dict | None = None,
+) -> list[str | tuple[str, str]]:
+    """Bulk ask() for offline jobs (FAQ refresh, evaluation). Sync wrapper around aask_many()."""
+    validate_filters(filters)
+    return asyncio.run(aask_many(queries, max_concurrency=max_concurrency, trace=trace, use_cache=use_cache, filters=filters))
+
+
+def ask_stream(
+    query: str, trace: bool = False, use_cache: bool | None = None, filters: dict | None = None
+) -> Iterator[dict]:
+    """
+    Streaming ask(): yields events while the graph runs (LangGraph stream_mode "updates" + "messages").
+
+    - {"type": "progress", "node", "detail"} – after each stage finishes (route_query, pre_retrieval, retrieval, ...),
+    - {"type": "token", "content"}         – generate / generate_direct tokens as they arrive from the LLM,
+    - {"type": "done", "answer", "answer_md", "flow_trace_md"} – last event; markdown only when trace=True.
+
+    Filters are validated on the call (ValueError), not on the first event.
+    """
+    validate_filters(filters)
+    return _ask_stream(query, trace, use_cache, filters)
+
+
+def _ask_stream(query: str, trace: bool, use_cache: bool | None, filters: dict | None) -> Iterator[dict]:
+    use_cache = _use_semantic_cache(use_cache, filters)
+    flow_log: list[dict] = []
+    query_vector = None
+    if use_cache:
+        query_vector, cached, cache_entry = _semantic_cache_lookup(query)
+        yield {"type": "progress", "node": "semantic_cache", "detail": cache_entry["detail"]}
+        flow_log.append(cache_entry)
+        if cached is not None:
+            flow_log += _cached_flow_log(cached)
+            yield {"type": "token", "content": cached["answer"]}
+            yield _stream_done(query, cached["answer"], flow_log, trace)
+            return
+
+    answer = ""
+    # Trace always collected here: its entries are the progress details
+    for mode, chunk in get_rag_graph().stream(_initial_state(query, True, filters, query_vector), stream_mode=["updates", "messages"]):
+        if mode == "messages":
+            message, metadata = chunk
+            if metadata.get("langgraph_node") in ("generate", "generate_direct") and message.content:
+                yield {"type": "token", "content": message.content}
+            continue
+        for node, update in chunk.items():
+            update = update or {}
+            entries = update.get("flow_log") or []
+            flow_log += entries
+            if "answer" in update:
+                answer = update["answer"]
+            detail = entries[-1]["detail"] if entries else ""
+            yield {"type": "progress", "node": node, "detail": detail}
+
+    if use_cache and answer.strip():
+        get_semantic_cache().store(query, query_vector, answer, flow_log)
+    yield _stream_done(query, answer, flow_log, trace)
+
+
+def _stream_done(query: str, answer: str, flow_log: list[dict], trace: bool) -> dict:
+    event = {"type": "done", "answer": answer, "answer_md": None, "flow_trace_md": None}
+    if trace:
+        event["answer_md"], event["flow_trace_md"] = _format_result(query, answer, flow_log, True)
+    return event
+
+
+def _save_or_print_md(answer_md: str, flow_md: str, out_dir: str | None) -> None:
+    if out_dir:
+        import os
+        os.makedirs(out_dir, exist_ok=True)
+        with open(os.path.join(out_dir, "answer.md"), "w", encoding="utf-8") as f:
+            f.write(answer_md)
+        with open(os.path.join(out_dir, "flow_trace.md"), "w", encoding="utf-8") as f:
+            f.write(flow_md)
+        print(f"\nSaved to {out_dir}/answer.md and {out_dir}/flow_trace.md")
+    else:
+        print("\n--- Answer (MD) ---\n", answer_md)
+        print("\n--- Flow Trace (MD) ---\n", flow_md)
 
 
 if __name__ == "__main__":
@@ -395,23 +1372,32 @@ if __name__ == "__main__":
     parser.add_argument("--trace", action="store_true", help="Generate answer + flow trace as two markdown docs")
     parser.add_argument("--query", "-q", default="How can I persist data in Docker containers?", help="Query to ask")
     parser.add_argument("--out-dir", "-o", help="Output directory for answer.md and flow_trace.md (requires --trace)")
+    parser.add_argument("--cache", action="store_true", help="Use the semantic answer cache (same as SEMANTIC_CACHE=1)")
+    parser.add_argument("--stream", action="store_true", help="Stream answer tokens as they arrive (progress for earlier stages)")
+    parser.add_argument("--tag", action="append", default=[], help="Only retrieve chunks with this tag (repeatable: any of them)")
+    parser.add_argument("--keyword", action="append", default=[], help="Only retrieve chunks with this keyword (repeatable: any of them)")
     args = parser.parse_args()
+    filters = {field: values for field, values in (("tags", args.tag), ("keywords", args.keyword)) if values} or None
 
     q = args.query
     print("Query:", q)
 
-    if args.trace:
-        answer_md, flow_md = ask(q, trace=True)
-        if args.out_dir:
-            import os
-            os.makedirs(args.out_dir, exist_ok=True)
-            with open(os.path.join(args.out_dir, "answer.md"), "w", encoding="utf-8") as f:
-                f.write(answer_md)
-            with open(os.path.join(args.out_dir, "flow_trace.md"), "w", encoding="utf-8") as f:
-                f.write(flow_md)
-            print(f"\nSaved to {args.out_dir}/answer.md and {args.out_dir}/flow_trace.md")
-        else:
-            print("\n--- Answer (MD) ---\n", answer_md)
-            print("\n--- Flow Trace (MD) ---\n", flow_md)
+    if args.stream:
+        printed_header = False
+        for event in ask_stream(q, trace=args.trace, use_cache=args.cache or None, filters=filters):
+            if event["type"] == "progress":
+                print(f"[progress] {event['node']}: {event['detail']}", flush=True)
+            elif event["type"] == "token":
+                if not printed_header:
+                    print("\nAnswer:\n", end="", flush=True)
+                    printed_header = True
+                print(event["content"], end="", flush=True)
+            elif event["type"] == "done":
+                print()
+                if args.trace:
+                    _save_or_print_md(event["answer_md"], event["flow_trace_md"], args.out_dir)
+    elif args.trace:
+        answer_md, flow_md = ask(q, trace=True, use_cache=args.cache or None, filters=filters)
+        _save_or_print_md(answer_md, flow_md, args.out_dir)
     else:
-        print("\nAnswer:\n", ask(q))
+        print("\nAnswer:\n", ask(q, use_cache=args.cache or None, filters=filters))